@@ -14,14 +14,25 @@ This API provides endpoints for managing:
 Environment Variables:
 - MONGODB_URI: MongoDB connection string (default: mongodb://localhost:27017)
 - MONGODB_DATABASE: Database name (default: alpha)
+- MONGODB_MAX_POOL_SIZE / MONGODB_MIN_POOL_SIZE: Connection pool bounds (default: 100 / 0)
+- MONGODB_WAIT_QUEUE_TIMEOUT_MS: Max wait for a pooled connection (default: no limit)
+- MONGODB_LIST_READ_PREFERENCE: Read preference of list endpoints (default: primary)
+- MONGODB_SLOW_QUERY_MS: Log MongoDB commands slower than this (default: 100, 0 disables)
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional, Dict, Any
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from typing import List, Literal, Optional, Dict, Any, Union
 from datetime import datetime
 from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorClient
+from pydantic import ValidationError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from contextlib import aclosing, asynccontextmanager
+import asyncio
+import logging
+import orjson
 import os
 import sys
 from pathlib import Path
@@ -30,15 +41,216 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
 from model import (
-    User, Session, Chat, Message, State, App, Plan, Agent, Flow, Integration, Run,
-    MessageRole, StateType, AppStatus, PlanStatus, AgentType, RunStatus, PyObjectId
+    User, Session, Chat, Message, State, App, Plan, Agent, Flow, Integration, Run, RunLogEntry, RunLease, RunFinish,
+    MessageRole, StateType, AppStatus, PlanStatus, AgentType, RunStatus, PyObjectId, CHARS_PER_TOKEN,
+    INDEXES, SUMMARY_EXCLUDES, list_adapter
 )
+from cache import DocumentCache, TTLCache, watch_invalidations
+from streams import MessageBroker, MessageTail
+from serialization import BSONResponse, BSONRoute, dumps
+from code_store import CodeStore, InvalidRange, parse_range
+from database import Database
+from loader import DocumentLoader
+from plan_graph import PlanGraphError, compile_plan, ready_tasks
+from leases import claim_run, finish_run, reclaim_expired, renew_lease
+from sessions import ActivityBuffer, SessionCache, session_valid
+from state_patch import PatchError, parse_patch, to_conditions, to_update
+from search import InvalidCursor, decode_cursor, encode_cursor, search_pipeline, search_terms
+from embeddings import Embedder, load_embedder
+from vector_index import SEMANTIC_SOURCES, IndexUpdater, VectorIndex
+from compression import (
+    EXTENSIONS, MEDIA_TYPES, CorruptData, UnsupportedCodec, accepted_encoding, check_codec, compress_stream, decompress_lines,
+    encode_body
+)
+from conditional import content_tag, not_modified, validator_headers, version_tag
+from archive import ArchiveMissing, ChatArchiver
+from overview import overview_pipeline, shape_overview
+from write_buffer import InsertBuffer, parse_write_concern
+from monitoring import CommandMetrics, PoolMetrics, RouteMetrics, RouteMetricsMiddleware, render_prometheus
+
+logger = logging.getLogger(__name__)
 
 # Database connection
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 MONGODB_DATABASE = os.getenv("MONGODB_DATABASE", "alpha")
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "0")) or None
+MONGODB_LIST_READ_PREFERENCE = os.getenv("MONGODB_LIST_READ_PREFERENCE", "primary")
+MONGODB_SLOW_QUERY_MS = float(os.getenv("MONGODB_SLOW_QUERY_MS", "100"))
+
+# Pagination
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_BATCH_SIZE = 500
+
+# Bulk writes
+MAX_BULK_SIZE = 1000
+
+# Group commit of single message and run inserts; WRITE_BUFFER_DELAY_MS=0 writes each insert on its own
+WRITE_BUFFER_MAX_DOCS = int(os.getenv("WRITE_BUFFER_MAX_DOCS", "500"))
+WRITE_BUFFER_DELAY_MS = float(os.getenv("WRITE_BUFFER_DELAY_MS", "0"))
+WRITE_CONCERNS = {
+    "messages": parse_write_concern(os.getenv("WRITE_CONCERN_MESSAGES", "")),
+    "runs": parse_write_concern(os.getenv("WRITE_CONCERN_RUNS", "")),
+}
+
+# Chat context assembly
+MAX_CONTEXT_MESSAGES = int(os.getenv("MAX_CONTEXT_MESSAGES", "1000"))
+
+# Semantic search, enabled by setting SEMANTIC_INDEX_DIR. Only the one process with
+# SEMANTIC_INDEX_WRITER set (or index_vectors.py) writes the index; the others read it.
+SEMANTIC_INDEX_DIR = os.getenv("SEMANTIC_INDEX_DIR", "")
+SEMANTIC_INDEX_WRITER = os.getenv("SEMANTIC_INDEX_WRITER", "false").lower() in ("1", "true", "yes")
+SEMANTIC_EMBEDDER = os.getenv("SEMANTIC_EMBEDDER", "hashing")
+SEMANTIC_FLUSH_SECONDS = float(os.getenv("SEMANTIC_FLUSH_SECONDS", "2"))
+SEMANTIC_IVF_PROBES = int(os.getenv("SEMANTIC_IVF_PROBES", "8"))
+MAX_SEMANTIC_RESULTS = 100
+SEMANTIC_MAX_CANDIDATES = 4 * MAX_SEMANTIC_RESULTS
+
+# Chat archival; the archiver runs when ARCHIVE_IDLE_DAYS is set
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_CODEC = os.getenv("ARCHIVE_CODEC", "gzip")
+ARCHIVE_IDLE_DAYS = float(os.getenv("ARCHIVE_IDLE_DAYS", "0"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+# Compressed NDJSON export/import
+MAX_IMPORT_ERRORS = 100
+
+# Run execution logs
+RUN_LOG_TAIL_SIZE = int(os.getenv("RUN_LOG_TAIL_SIZE", "20"))
+
+# State history: the newest writes kept in each state's `history` array
+STATE_HISTORY_SIZE = int(os.getenv("STATE_HISTORY_SIZE", "100"))
+
+# Run leases
+RUN_LEASE_SECONDS = float(os.getenv("RUN_LEASE_SECONDS", "60"))
+RUN_MAX_ATTEMPTS = int(os.getenv("RUN_MAX_ATTEMPTS", "3"))
+
+# Configuration document cache
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTLS = {
+    "apps": float(os.getenv("CACHE_TTL_APPS", "60")),
+    "agents": float(os.getenv("CACHE_TTL_AGENTS", "60")),
+    "flows": float(os.getenv("CACHE_TTL_FLOWS", "60")),
+    "integrations": float(os.getenv("CACHE_TTL_INTEGRATIONS", "300")),
+}
+CACHE_CHANGE_STREAMS = os.getenv("CACHE_CHANGE_STREAMS", "false").lower() in ("1", "true", "yes")
+
+# App overviews; OVERVIEW_CACHE_TTL=0 disables their cache
+OVERVIEW_MAX_ITEMS = int(os.getenv("OVERVIEW_MAX_ITEMS", "50"))
+OVERVIEW_CACHE_TTL = float(os.getenv("OVERVIEW_CACHE_TTL", "5"))
+OVERVIEW_CACHE_MAX_ENTRIES = int(os.getenv("OVERVIEW_CACHE_MAX_ENTRIES", "256"))
+
+# Configuration document responses larger than this are compressed
+CONFIG_COMPRESS_MIN_BYTES = int(os.getenv("CONFIG_COMPRESS_MIN_BYTES", "1024"))
+
+# Session token validation
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30"))
+SESSION_ACTIVITY_FLUSH_SECONDS = float(os.getenv("SESSION_ACTIVITY_FLUSH_SECONDS", "5"))
+
+# MongoDB client, opened per process by `lifespan`
+database = Database(
+    MONGODB_URI,
+    MONGODB_DATABASE,
+    list_read_preference=MONGODB_LIST_READ_PREFERENCE,
+    maxPoolSize=MONGODB_MAX_POOL_SIZE,
+    minPoolSize=MONGODB_MIN_POOL_SIZE,
+    waitQueueTimeoutMS=MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+)
+pool_metrics = PoolMetrics()
+command_metrics = CommandMetrics(slow_query_ms=MONGODB_SLOW_QUERY_MS)
+route_metrics = RouteMetrics()
+
+# Collections
+users_collection = database["users"]
+sessions_collection = database["sessions"]
+chats_collection = database["chats"]
+messages_collection = database["messages"]
+states_collection = database["states"]
+apps_collection = database["apps"]
+plans_collection = database["plans"]
+agents_collection = database["agents"]
+flows_collection = database["flows"]
+integrations_collection = database["integrations"]
+runs_collection = database["runs"]
+run_logs_collection = database["run_logs"]
+
+document_cache = DocumentCache(CACHE_TTLS, CACHE_MAX_ENTRIES)
+session_cache = SessionCache(SESSION_CACHE_MAX_ENTRIES, SESSION_CACHE_TTL)
+overview_cache = TTLCache(OVERVIEW_CACHE_MAX_ENTRIES, OVERVIEW_CACHE_TTL)
+insert_buffers = {
+    collection_name: InsertBuffer(database[collection_name], WRITE_BUFFER_MAX_DOCS, WRITE_BUFFER_DELAY_MS / 1000, write_concern)
+    for collection_name, write_concern in WRITE_CONCERNS.items()
+}
+session_activity = ActivityBuffer(sessions_collection)
+chat_archiver = ChatArchiver(chats_collection, messages_collection, Path(ARCHIVE_DIR), ARCHIVE_CODEC, ARCHIVE_IDLE_DAYS)
+code_store: Optional[CodeStore] = None
+semantic_embedder: Optional[Embedder] = None
+semantic_indexes: Dict[str, VectorIndex] = {}
+semantic_updaters: Dict[str, IndexUpdater] = {}
+background_tasks: List[asyncio.Task] = []
+
+message_broker = MessageBroker()
+tail_messages = MessageTail(messages_collection, message_broker)
+
+async def ensure_indexes():
+    """Create the indexes one at a time; one that existing data breaks is logged and skipped."""
+    for collection_name, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await database[collection_name].create_indexes([index])
+            except (DuplicateKeyError, OperationFailure) as error:
+                logger.warning("Could not create index %s on %s: %s", index.document["name"], collection_name, error)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global code_store, semantic_embedder
+    database.connect(event_listeners=[pool_metrics, command_metrics])
+    code_store = CodeStore(database.db)
+    await ensure_indexes()
+    if CACHE_CHANGE_STREAMS:
+        background_tasks.append(asyncio.create_task(
+            watch_invalidations(database.db, document_cache, CACHE_TTLS.keys())
+        ))
+    background_tasks.append(asyncio.create_task(session_activity.run(SESSION_ACTIVITY_FLUSH_SECONDS)))
+    background_tasks.append(asyncio.create_task(tail_messages.follow()))
+    if ARCHIVE_IDLE_DAYS > 0:
+        background_tasks.append(asyncio.create_task(chat_archiver.run(ARCHIVE_INTERVAL_SECONDS)))
+    if SEMANTIC_INDEX_DIR:
+        semantic_embedder = load_embedder(SEMANTIC_EMBEDDER)
+        for collection_name in SEMANTIC_SOURCES:
+            index = VectorIndex(Path(SEMANTIC_INDEX_DIR) / collection_name, semantic_embedder.dim, read_only=not SEMANTIC_INDEX_WRITER)
+            semantic_indexes[collection_name] = index
+            if SEMANTIC_INDEX_WRITER:
+                updater = semantic_updaters[collection_name] = IndexUpdater(index, semantic_embedder)
+                text_of, fields = SEMANTIC_SOURCES[collection_name]
+                background_tasks.append(asyncio.create_task(
+                    updater.follow(database[collection_name], text_of, fields, SEMANTIC_FLUSH_SECONDS)
+                ))
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        background_tasks.clear()
+        for buffer in insert_buffers.values():
+            await buffer.flush()
+        await session_activity.flush()
+        for updater in semantic_updaters.values():
+            await updater.flush()
+        semantic_updaters.clear()
+        semantic_indexes.clear()
+        document_cache.clear()
+        session_cache.clear()
+        overview_cache.clear()
+        database.close()
 
-app = FastAPI(title="Alpha Database API", version="1.0.0")
+app = FastAPI(title="Alpha Database API", version="1.0.0", default_response_class=BSONResponse, lifespan=lifespan)
+app.router.route_class = BSONRoute
 
 # CORS middleware
 app.add_middleware(
@@ -48,23 +260,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# MongoDB client
-client = AsyncIOMotorClient(MONGODB_URI)
-db = client[MONGODB_DATABASE]
-
-# Collections
-users_collection = db.users
-sessions_collection = db.sessions
-chats_collection = db.chats
-messages_collection = db.messages
-states_collection = db.states
-apps_collection = db.apps
-plans_collection = db.plans
-agents_collection = db.agents
-flows_collection = db.flows
-integrations_collection = db.integrations
-runs_collection = db.runs
+app.add_middleware(RouteMetricsMiddleware, metrics=route_metrics)
 
 # Helper function to parse ObjectId
 def parse_object_id(id_str: str) -> ObjectId:
@@ -73,6 +269,289 @@ def parse_object_id(id_str: str) -> ObjectId:
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid ID format: {str(e)}")
 
+def split_fields(value: str) -> List[str]:
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    if any(field.startswith("$") for field in fields):
+        raise HTTPException(status_code=400, detail="Invalid field name")
+    return fields
+
+def projection_for(collection_name: str, default_view: str = "full"):
+    """
+    Dependency building a Mongo projection from `?fields=`, `?exclude=` and `?view=`.
+
+    `view=summary` leaves out the collection's SUMMARY_EXCLUDES blob fields;
+    explicit `fields` or `exclude` take precedence over the view. `_id` is
+    always returned since it is the pagination cursor.
+    """
+    def dependency(
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+        exclude: Optional[str] = Query(None, description="Comma-separated fields to leave out"),
+        view: Literal["summary", "full"] = Query(default_view),
+    ) -> Optional[Dict[str, int]]:
+        if fields and exclude:
+            raise HTTPException(status_code=400, detail="Use either fields or exclude, not both")
+        if fields:
+            return {field: 1 for field in split_fields(fields) if field != "_id"} or None
+        if exclude:
+            return {field: 0 for field in split_fields(exclude) if field != "_id"} or None
+        if view == "summary" and SUMMARY_EXCLUDES.get(collection_name):
+            return {field: 0 for field in SUMMARY_EXCLUDES[collection_name]}
+        return None
+    return dependency
+
+def parse_ids(ids: Optional[str] = Query(None, description="Comma-separated ids to fetch; results follow this order")) -> Optional[List[ObjectId]]:
+    if ids is None:
+        return None
+    object_ids = [parse_object_id(value) for value in split_fields(ids)]
+    if not object_ids:
+        raise HTTPException(status_code=400, detail="No ids given")
+    if len(object_ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} ids can be fetched at once")
+    return object_ids
+
+def document_loader() -> DocumentLoader:
+    """A DocumentLoader per request (FastAPI caches dependencies per request)."""
+    return DocumentLoader(database, document_cache)
+
+async def multi_get(loader: DocumentLoader, collection_name: str, object_ids: List[ObjectId], projection: Optional[Dict[str, int]], label: str):
+    """Documents in `object_ids` order; missing ones are replaced by {"_id", "error"} markers."""
+    docs = await loader.load_many(collection_name, object_ids, projection)
+    return [
+        doc if doc is not None else {"_id": object_id, "error": f"{label} not found"}
+        for object_id, doc in zip(object_ids, docs)
+    ]
+
+def versioned(projection: Optional[Dict[str, int]]):
+    """`projection` widened to return `updated_at`, and whether to drop it from the response."""
+    if not projection:
+        return projection, False
+    if any(projection.values()):
+        return {**projection, "updated_at": 1}, "updated_at" not in projection
+    if "updated_at" in projection:
+        return {field: value for field, value in projection.items() if field != "updated_at"} or None, True
+    return projection, False
+
+async def config_response(request: Request, collection_name: str, object_id: ObjectId, projection: Optional[Dict[str, int]], label: str) -> Response:
+    """
+    A configuration document with ETag and Last-Modified validators.
+
+    Conditional requests are checked against the cached copy or a lookup of
+    `updated_at` alone, so a 304 neither loads nor serializes the document.
+    Bodies of at least CONFIG_COMPRESS_MIN_BYTES are sent br- or
+    gzip-encoded when the client accepts it.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    conditional = if_none_match is not None or if_modified_since is not None
+    collection = database[collection_name]
+    cached = collection_name in document_cache
+    doc = document_cache.lookup(collection_name, object_id) if cached and (conditional or not projection) else None
+    if conditional:
+        current = doc or await collection.find_one({"_id": object_id}, {"updated_at": 1})
+        if current is None:
+            raise HTTPException(status_code=404, detail=f"{label} not found")
+        etag = version_tag(current.get("updated_at"), projection)
+        if etag and not_modified(if_none_match, if_modified_since, etag, current["updated_at"]):
+            headers = validator_headers(etag, current["updated_at"])
+            headers["Vary"] = "Accept-Encoding"
+            return Response(status_code=304, headers=headers)
+
+    drop_updated_at = False
+    if doc is None or projection:
+        read_projection, drop_updated_at = versioned(projection)
+        doc = await collection.find_one({"_id": object_id}, read_projection)
+        if doc is None:
+            raise HTTPException(status_code=404, detail=f"{label} not found")
+        if cached and not projection:
+            document_cache.store(collection_name, object_id, doc)
+    updated_at = doc.get("updated_at")
+    if drop_updated_at:
+        doc.pop("updated_at", None)
+    body = dumps(doc)
+    # Documents written before `updated_at` was maintained are tagged by content.
+    etag = version_tag(updated_at, projection) or content_tag(body)
+    headers = validator_headers(etag, updated_at)
+    headers["Vary"] = "Accept-Encoding"
+    if not_modified(if_none_match, if_modified_since, etag, updated_at):
+        return Response(status_code=304, headers=headers)
+    encoding = accepted_encoding(request.headers.get("accept-encoding")) if len(body) >= CONFIG_COMPRESS_MIN_BYTES else None
+    if encoding:
+        body = encode_body(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+async def offload_code(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Move an inline `code` string into the code store, leaving a `code_ref` behind."""
+    if doc.get("code"):
+        doc["code_ref"] = await code_store.put(doc["code"])
+        doc["code"] = None
+    return doc
+
+async def code_response(collection_name: str, object_id: ObjectId, range_header: Optional[str], label: str):
+    """Stream a document's code, honouring a single byte range."""
+    doc = await database[collection_name].find_one({"_id": object_id}, {"code": 1, "code_ref": 1})
+    if doc is None:
+        raise HTTPException(status_code=404, detail=f"{label} not found")
+    code_ref = doc.get("code_ref")
+    if code_ref:
+        size, etag = code_ref["size"], f'"{code_ref["sha256"]}"'
+    elif doc.get("code"):
+        # Documents written before code moved to GridFS keep it inline.
+        inline = doc["code"].encode("utf-8")
+        size, etag = len(inline), None
+    else:
+        raise HTTPException(status_code=404, detail=f"{label} has no code")
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except InvalidRange:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    start, end = byte_range or (0, size - 1)
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start + 1)}
+    if etag:
+        headers["ETag"] = etag
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    if code_ref:
+        body = code_store.read(code_ref["sha256"], start, end)
+    else:
+        body = iter([inline[start:end + 1]])
+    return StreamingResponse(
+        body,
+        status_code=206 if byte_range else 200,
+        media_type="text/plain",
+        headers=headers,
+    )
+
+def index_semantic(collection_name: str, doc: Dict[str, Any]) -> None:
+    """
+    Queue a document written by this process for embedding right away (writer
+    process only); IndexUpdater.follow picks up those of other processes.
+    """
+    updater = semantic_updaters.get(collection_name)
+    if updater is not None:
+        text_of, _ = SEMANTIC_SOURCES[collection_name]
+        updater.enqueue(doc["_id"], text_of(doc))
+
+def on_message_insert(message: Dict[str, Any]) -> None:
+    if tail_messages.local_publish:
+        message_broker.publish(message)
+    index_semantic("messages", message)
+
+async def stream_ndjson(cursor):
+    async for doc in cursor:
+        yield dumps(doc, option=orjson.OPT_APPEND_NEWLINE)
+
+async def paginate(
+    request: Request,
+    collection,
+    query: Dict[str, Any],
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    sort_field: str = "_id",
+    projection: Optional[Dict[str, int]] = None,
+    primary: bool = False,
+):
+    """
+    Keyset pagination over `sort_field` with `_id` as tie-breaker.
+
+    `after` is the `_id` of the last document of the previous page. JSON
+    responses are capped at MAX_PAGE_SIZE and carry the next cursor in the
+    `X-Next-Cursor` header; `Accept: application/x-ndjson` streams the
+    matching documents straight from the cursor instead. Pages are read
+    with the list read preference unless `primary` is set.
+    """
+    if after:
+        anchor_id = parse_object_id(after)
+        if sort_field == "_id":
+            keyset = {"_id": {"$gt": anchor_id}}
+        else:
+            anchor = await (collection if primary else collection.for_lists).find_one({"_id": anchor_id}, {sort_field: 1})
+            if anchor is None or sort_field not in anchor:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            keyset = {"$or": [
+                {sort_field: {"$gt": anchor[sort_field]}},
+                {sort_field: anchor[sort_field], "_id": {"$gt": anchor_id}},
+            ]}
+        query = {"$and": [query, keyset]} if query else keyset
+    sort = [("_id", 1)] if sort_field == "_id" else [(sort_field, 1), ("_id", 1)]
+    return await cursor_response(request, collection, query, sort, limit, projection=projection, primary=primary)
+
+async def cursor_response(
+    request: Request,
+    collection,
+    query: Dict[str, Any],
+    sort: List[tuple],
+    limit: Optional[int] = None,
+    cursor_field: str = "_id",
+    projection: Optional[Dict[str, int]] = None,
+    primary: bool = False,
+):
+    """Return one page of `query` as JSON, or stream it as NDJSON when the client asks for it."""
+    source = collection if primary else collection.for_lists
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        cursor = source.find(query, projection).sort(sort).batch_size(NDJSON_BATCH_SIZE)
+        if limit:
+            cursor = cursor.limit(limit)
+        return StreamingResponse(stream_ndjson(cursor), media_type=NDJSON_MEDIA_TYPE)
+
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    docs = await source.find(query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers["X-Next-Cursor"] = str(docs[-1][cursor_field])
+    return BSONResponse(docs, headers=headers)
+
+def validate_bulk(model: type, items: List[Dict[str, Any]]):
+    """Validate each item against `model`, returning (index, model) pairs and per-item errors."""
+    if len(items) > MAX_BULK_SIZE:
+        raise HTTPException(status_code=413, detail=f"Bulk requests are limited to {MAX_BULK_SIZE} items")
+    try:
+        return list(enumerate(list_adapter(model).validate_python(items))), []
+    except ValidationError as e:
+        failed: Dict[int, List[Dict[str, Any]]] = {}
+        for error in e.errors(include_url=False, include_context=False):
+            index, *loc = error["loc"]
+            failed.setdefault(index, []).append({**error, "loc": tuple(loc)})
+    # One pass over the whole batch found the invalid items; validate the rest on their own.
+    valid = [(index, model.model_validate(item)) for index, item in enumerate(items) if index not in failed]
+    return valid, [{"index": index, "error": failed[index]} for index in sorted(failed)]
+
+def bulk_write_errors(e: BulkWriteError, indexes: List[int]) -> List[Dict[str, Any]]:
+    return [
+        {"index": indexes[error["index"]], "error": error.get("errmsg", "Write failed")}
+        for error in e.details.get("writeErrors", [])
+    ]
+
+def bulk_response(count: int, results: List[Dict[str, Any]], errors: List[Dict[str, Any]]):
+    results = sorted(results + errors, key=lambda item: item["index"])
+    return {"count": count, "failed": len(errors), "results": results}
+
+async def bulk_insert(collection, model: type, items: List[Dict[str, Any]], on_insert=None):
+    """Validate `items` and write the valid ones with a single unordered insert_many."""
+    valid, errors = validate_bulk(model, items)
+    if not valid:
+        return bulk_response(0, [], errors)
+    indexes = [index for index, _ in valid]
+    docs = list_adapter(model).dump_python([item for _, item in valid], by_alias=True)
+    failed = set()
+    try:
+        await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        write_errors = bulk_write_errors(e, indexes)
+        failed = {error["index"] for error in write_errors}
+        errors.extend(write_errors)
+    results = []
+    for index, doc in zip(indexes, docs):
+        if index in failed:
+            continue
+        results.append({"index": index, "_id": doc["_id"]})
+        if on_insert is not None:
+            on_insert(doc)
+    return bulk_response(len(results), results, errors)
+
 # User endpoints
 @app.post("/users")
 async def create_user(user: User):
@@ -82,13 +561,14 @@ async def create_user(user: User):
     return user_dict
 
 @app.get("/users")
-async def list_users():
-    users = await users_collection.find().to_list(length=100)
-    return users
+async def list_users(request: Request, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), ids: Optional[List[ObjectId]] = Depends(parse_ids), loader: DocumentLoader = Depends(document_loader), projection: Optional[Dict[str, int]] = Depends(projection_for("users"))):
+    if ids:
+        return await multi_get(loader, "users", ids, projection, "User")
+    return await paginate(request, users_collection, {}, after, limit, projection=projection)
 
 @app.get("/users/{user_id}")
-async def get_user(user_id: str):
-    user = await users_collection.find_one({"_id": parse_object_id(user_id)})
+async def get_user(user_id: str, projection: Optional[Dict[str, int]] = Depends(projection_for("users"))):
+    user = await users_collection.find_one({"_id": parse_object_id(user_id)}, projection)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -105,53 +585,129 @@ async def update_user(user_id: str, user_update: Dict[str, Any]):
 
 @app.delete("/users/{user_id}")
 async def delete_user(user_id: str):
-    result = await users_collection.delete_one({"_id": parse_object_id(user_id)})
-    if result.deleted_count == 0:
+    """Delete a user with their sessions and chats (see `delete_chats`)."""
+    object_id = parse_object_id(user_id)
+    if await users_collection.find_one({"_id": object_id}, {"_id": 1}) is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"message": "User deleted successfully"}
+    # Dependents go first so that a failed delete can be retried.
+    deleted = await delete_chats({"user_id": object_id})
+    session_ids = [session["_id"] async for session in sessions_collection.find({"user_id": object_id}, {"_id": 1})]
+    for start in range(0, len(session_ids), MAX_BULK_SIZE):
+        await sessions_collection.delete_many({"_id": {"$in": session_ids[start:start + MAX_BULK_SIZE]}})
+    for session_id in session_ids:
+        session_cache.invalidate(session_id)
+    await users_collection.delete_one({"_id": object_id})
+    return {"message": "User deleted successfully", "deleted": {**deleted, "sessions": len(session_ids)}}
 
 # Session endpoints
 @app.post("/sessions")
 async def create_session(session: Session):
     session_dict = session.model_dump(by_alias=True)
-    result = await sessions_collection.insert_one(session_dict)
+    try:
+        result = await sessions_collection.insert_one(session_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Session token already in use")
     session_dict["_id"] = result.inserted_id
     return session_dict
 
 @app.get("/sessions")
-async def list_sessions(user_id: Optional[str] = None, is_active: Optional[bool] = None):
+async def list_sessions(request: Request, user_id: Optional[str] = None, is_active: Optional[bool] = None, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), ids: Optional[List[ObjectId]] = Depends(parse_ids), loader: DocumentLoader = Depends(document_loader), projection: Optional[Dict[str, int]] = Depends(projection_for("sessions"))):
+    if ids:
+        return await multi_get(loader, "sessions", ids, projection, "Session")
     query = {}
     if user_id:
         query["user_id"] = parse_object_id(user_id)
     if is_active is not None:
         query["is_active"] = is_active
-    sessions = await sessions_collection.find(query).to_list(length=100)
-    return sessions
+    return await paginate(request, sessions_collection, query, after, limit, projection=projection)
+
+@app.get("/sessions/by-token/{token}")
+async def get_session_by_token(token: str, touch: bool = True):
+    """
+    Validate a session token: the active, unexpired session or 404.
+
+    Served from the session cache when possible. Unless `touch=false`, the
+    session's `last_activity` is bumped through the activity buffer, which
+    writes it within SESSION_ACTIVITY_FLUSH_SECONDS.
+    """
+    now = datetime.utcnow()
+    session = session_cache.get(token)
+    if session is None:
+        session = await sessions_collection.find_one({"session_token": token})
+        if session is None or not session_valid(session, now):
+            raise HTTPException(status_code=404, detail="Session not found")
+        session_cache.set(session)
+    if touch:
+        session["last_activity"] = now
+        session_activity.touch(session["_id"], now)
+    return session
 
 @app.get("/sessions/{session_id}")
-async def get_session(session_id: str):
-    session = await sessions_collection.find_one({"_id": parse_object_id(session_id)})
+async def get_session(session_id: str, projection: Optional[Dict[str, int]] = Depends(projection_for("sessions"))):
+    session = await sessions_collection.find_one({"_id": parse_object_id(session_id)}, projection)
     if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
     return session
 
 @app.put("/sessions/{session_id}")
 async def update_session(session_id: str, session_update: Dict[str, Any]):
+    object_id = parse_object_id(session_id)
     result = await sessions_collection.update_one(
-        {"_id": parse_object_id(session_id)},
+        {"_id": object_id},
         {"$set": session_update}
     )
+    session_cache.invalidate(object_id)
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Session not found")
     return {"message": "Session updated successfully"}
 
 @app.delete("/sessions/{session_id}")
 async def delete_session(session_id: str):
-    result = await sessions_collection.delete_one({"_id": parse_object_id(session_id)})
+    object_id = parse_object_id(session_id)
+    result = await sessions_collection.delete_one({"_id": object_id})
+    session_cache.invalidate(object_id)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Session not found")
     return {"message": "Session deleted successfully"}
 
+async def delete_chats(query: Dict[str, Any]) -> Dict[str, int]:
+    """Delete the chats matching `query` with their messages, chat States, State history and archives."""
+    deleted = {"chats": 0, "messages": 0, "states": 0}
+    cursor = chats_collection.find(query, {"_id": 1}).batch_size(MAX_BULK_SIZE)
+    batch: List[ObjectId] = []
+    async for chat in cursor:
+        batch.append(chat["_id"])
+        if len(batch) >= MAX_BULK_SIZE:
+            await delete_chat_batch(batch, deleted)
+            batch = []
+    if batch:
+        await delete_chat_batch(batch, deleted)
+    return deleted
+
+async def delete_chat_batch(chat_ids: List[ObjectId], deleted: Dict[str, int]) -> None:
+    messages = await messages_collection.delete_many({"chat_id": {"$in": chat_ids}})
+    state_ids = [state["_id"] async for state in states_collection.find(
+        {"reference_id": {"$in": chat_ids}, "type": StateType.CHAT}, {"_id": 1}
+    )]
+    if state_ids:
+        await states_collection.delete_many({"_id": {"$in": state_ids}})
+    for chat_id in chat_ids:
+        chat_archiver.discard(chat_id)
+    chats = await chats_collection.delete_many({"_id": {"$in": chat_ids}})
+    deleted["chats"] += chats.deleted_count
+    deleted["messages"] += messages.deleted_count
+    deleted["states"] += len(state_ids)
+
+async def restore_archived(chat_id: ObjectId) -> bool:
+    """Bring back the messages of an archived chat before they are read; True if it was archived."""
+    if await chats_collection.find_one({"_id": chat_id, "archived_at": {"$ne": None}}, {"_id": 1}) is None:
+        return False
+    try:
+        await chat_archiver.restore(chat_id)
+    except ArchiveMissing as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return True
+
 # Chat endpoints
 @app.post("/chats")
 async def create_chat(chat: Chat):
@@ -161,7 +717,9 @@ async def create_chat(chat: Chat):
     return chat_dict
 
 @app.get("/chats")
-async def list_chats(user_id: Optional[str] = None, session_id: Optional[str] = None, app_id: Optional[str] = None, agent_id: Optional[str] = None, flow_id: Optional[str] = None):
+async def list_chats(request: Request, user_id: Optional[str] = None, session_id: Optional[str] = None, app_id: Optional[str] = None, agent_id: Optional[str] = None, flow_id: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), ids: Optional[List[ObjectId]] = Depends(parse_ids), loader: DocumentLoader = Depends(document_loader), projection: Optional[Dict[str, int]] = Depends(projection_for("chats"))):
+    if ids:
+        return await multi_get(loader, "chats", ids, projection, "Chat")
     query = {}
     if user_id:
         query["user_id"] = parse_object_id(user_id)
@@ -173,28 +731,237 @@ async def list_chats(user_id: Optional[str] = None, session_id: Optional[str] =
         query["agent_id"] = parse_object_id(agent_id)
     if flow_id:
         query["flow_id"] = parse_object_id(flow_id)
-    chats = await chats_collection.find(query).to_list(length=100)
-    return chats
+    return await paginate(request, chats_collection, query, after, limit, projection=projection)
 
 @app.get("/chats/{chat_id}")
-async def get_chat(chat_id: str):
-    chat = await chats_collection.find_one({"_id": parse_object_id(chat_id)})
+async def get_chat(chat_id: str, projection: Optional[Dict[str, int]] = Depends(projection_for("chats"))):
+    chat = await chats_collection.find_one({"_id": parse_object_id(chat_id)}, projection)
     if chat is None:
         raise HTTPException(status_code=404, detail="Chat not found")
     return chat
 
+@app.delete("/chats/{chat_id}")
+async def delete_chat(chat_id: str):
+    deleted = await delete_chats({"_id": parse_object_id(chat_id)})
+    if deleted["chats"] == 0:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return {"message": "Chat deleted successfully", "deleted": deleted}
+
+# Token count of messages stored before `token_count` was computed on insert.
+MESSAGE_TOKENS = {"$ifNull": ["$token_count", {"$max": [1, {"$ceil": {"$divide": [
+    {"$strLenCP": {"$ifNull": ["$text", ""]}}, CHARS_PER_TOKEN,
+]}}]}]}
+
+@app.get("/chats/{chat_id}/context")
+async def get_chat_context(chat_id: str, budget: int = Query(..., ge=1), include_state: bool = True):
+    """
+    The newest messages of a chat that fit in `budget` tokens, oldest first,
+    with the chat and (optionally) its `chat` State, in one aggregation.
+
+    Messages are walked newest first keeping a running token total; the
+    first message that does not fit ends the window, so the result is
+    always a contiguous tail of the conversation. `truncated` tells
+    whether older messages were left out. Requires MongoDB 5.0+.
+    """
+    max_messages = min(budget, MAX_CONTEXT_MESSAGES)
+    newest_first = {"created_at": -1, "_id": -1}
+    pipeline = [
+        {"$match": {"_id": parse_object_id(chat_id)}},
+        {"$lookup": {
+            "from": "messages",
+            "localField": "_id",
+            "foreignField": "chat_id",
+            "pipeline": [
+                {"$sort": newest_first},
+                {"$limit": max_messages + 1},
+                {"$set": {"token_count": MESSAGE_TOKENS}},
+                {"$setWindowFields": {
+                    "sortBy": newest_first,
+                    "output": {"context_tokens": {"$sum": "$token_count", "window": {"documents": ["unbounded", "current"]}}},
+                }},
+                # Keep the messages that fit plus the first one that does not, to detect truncation.
+                {"$match": {"$expr": {"$lte": [{"$subtract": ["$context_tokens", "$token_count"]}, budget]}}},
+            ],
+            "as": "messages",
+        }},
+    ]
+    if include_state:
+        pipeline.append({"$lookup": {
+            "from": "states",
+            "localField": "_id",
+            "foreignField": "reference_id",
+            "pipeline": [{"$match": {"type": StateType.CHAT.value}}, {"$limit": 1}],
+            "as": "state",
+        }})
+    docs = await chats_collection.aggregate(pipeline).to_list(length=1)
+    if docs and docs[0].get("archived_at"):
+        await restore_archived(docs[0]["_id"])
+        docs = await chats_collection.aggregate(pipeline).to_list(length=1)
+    if not docs:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    chat = docs[0]
+    candidates = chat.pop("messages")
+    messages = [message for message in candidates if message["context_tokens"] <= budget][:max_messages]
+    for message in messages:
+        del message["context_tokens"]
+    messages.reverse()
+    states = chat.pop("state", None)
+    context = {
+        "chat": chat,
+        "messages": messages,
+        "token_count": sum(message["token_count"] for message in messages),
+        "budget": budget,
+        "truncated": len(messages) < len(candidates),
+    }
+    if include_state:
+        context["state"] = states[0] if states else None
+    return context
+
+async def chat_events(chat_id: str, last_event_id: Optional[str]):
+    async with aclosing(tail_messages(parse_object_id(chat_id), last_event_id)) as events:
+        async for event_id, message in events:
+            if message is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {event_id}\nevent: message\ndata: {dumps(message).decode()}\n\n"
+
+@app.get("/chats/{chat_id}/stream")
+async def stream_chat(chat_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events stream of messages inserted into the chat from now on.
+
+    Reconnect with `Last-Event-ID` (browsers do this automatically) to resume
+    after the last received event without replaying history.
+    """
+    parse_object_id(chat_id)
+    return StreamingResponse(
+        chat_events(chat_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/chats/{chat_id}/ws")
+async def stream_chat_ws(websocket: WebSocket, chat_id: str, last_event_id: Optional[str] = None):
+    """WebSocket variant of /chats/{chat_id}/stream; resume with ?last_event_id=."""
+    if not ObjectId.is_valid(chat_id):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    async def forward():
+        async with aclosing(tail_messages(ObjectId(chat_id), last_event_id)) as events:
+            async for event_id, message in events:
+                if message is not None:
+                    await websocket.send_text(dumps({"id": event_id, "message": message}).decode())
+
+    async def until_disconnect():
+        # Frames sent by the client are ignored; reading them notices a disconnect on an idle chat.
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = {asyncio.create_task(forward()), asyncio.create_task(until_disconnect())}
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
 # Message endpoints
 @app.post("/messages")
 async def create_message(message: Message):
     message_dict = message.model_dump(by_alias=True)
-    result = await messages_collection.insert_one(message_dict)
-    message_dict["_id"] = result.inserted_id
+    try:
+        message_dict["_id"] = await insert_buffers["messages"].insert(message_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Message already exists")
+    on_message_insert(message_dict)
     return message_dict
 
+@app.post("/messages/bulk")
+async def create_messages_bulk(messages: List[Dict[str, Any]]):
+    return await bulk_insert(insert_buffers["messages"].target(), Message, messages, on_insert=on_message_insert)
+
+@app.get("/messages/search")
+async def search_messages(
+    q: str = Query(..., min_length=1),
+    user_id: Optional[str] = None,
+    chat_id: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """
+    Messages matching `q` (MongoDB `$text` syntax: words, "phrases", -excluded),
+    most relevant first, as `{_id, chat_id, role, created_at, score, snippet}`.
+    The next page's cursor is in `X-Next-Cursor`.
+    """
+    query: Dict[str, Any] = {"$text": {"$search": q}}
+    if chat_id:
+        query["chat_id"] = parse_object_id(chat_id)
+    owner = parse_object_id(user_id) if user_id else None
+    try:
+        anchor = decode_cursor(after) if after else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    try:
+        docs = await messages_collection.for_lists.aggregate(search_pipeline(query, anchor, limit + 1, search_terms(q), owner)).to_list(length=limit + 1)
+    except OperationFailure as e:
+        raise HTTPException(status_code=400, detail=f"Invalid search: {e}")
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(docs[-1]["score"], docs[-1]["_id"])
+    return BSONResponse(docs, headers=headers)
+
+@app.get("/search/semantic")
+async def semantic_search(
+    q: str = Query(..., min_length=1),
+    collection: Literal["messages", "agents"] = "messages",
+    k: int = Query(10, ge=1, le=MAX_SEMANTIC_RESULTS),
+    mode: Literal["auto", "exact", "ivf"] = "auto",
+    loader: DocumentLoader = Depends(document_loader),
+):
+    """
+    The `k` messages or agents most similar to `q` by cosine similarity of
+    their embeddings, best first, each with its `score`. `auto` uses the IVF
+    lists when the index has been partitioned (see index_vectors.py).
+
+    Rows of deleted or archived documents stay in the index; their hits are
+    dropped and more candidates fetched so up to `k` documents are returned.
+    """
+    index = semantic_indexes.get(collection)
+    if index is None:
+        raise HTTPException(status_code=503, detail="Semantic search is disabled")
+    if index.read_only:
+        await asyncio.to_thread(index.refresh)
+    if mode == "ivf" and not index.trained:
+        raise HTTPException(status_code=400, detail="Index has no IVF lists; run index_vectors.py --lists N")
+    n_probe = SEMANTIC_IVF_PROBES if mode != "exact" else None
+    query = await asyncio.to_thread(semantic_embedder.embed, [q])
+    excludes = SUMMARY_EXCLUDES.get(collection)
+    projection = {field: 0 for field in excludes} if excludes else None
+    candidates = k
+    while True:
+        hits = (await asyncio.to_thread(index.search, query, candidates, n_probe))[0]
+        docs = await loader.load_many(collection, [ObjectId(doc_id) for doc_id, _ in hits], projection)
+        results = [{**doc, "score": score} for doc, (_, score) in zip(docs, hits) if doc is not None]
+        if len(results) >= k or len(hits) < candidates or candidates >= SEMANTIC_MAX_CANDIDATES:
+            return results[:k]
+        candidates = min(candidates * 4, SEMANTIC_MAX_CANDIDATES)
+
 @app.get("/messages")
-async def list_messages(chat_id: str):
-    messages = await messages_collection.find({"chat_id": parse_object_id(chat_id)}).to_list(length=100)
-    return messages
+async def list_messages(request: Request, chat_id: str, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), projection: Optional[Dict[str, int]] = Depends(projection_for("messages"))):
+    query = {"chat_id": parse_object_id(chat_id)}
+    # Later pages follow a first page that already restored the chat.
+    restored = after is None and await restore_archived(query["chat_id"])
+    # Secondaries may not have the restored messages yet.
+    return await paginate(request, messages_collection, query, after, limit, sort_field="created_at", projection=projection, primary=restored)
 
 # State endpoints
 @app.post("/states")
@@ -204,129 +971,373 @@ async def create_state(state: State):
     state_dict["_id"] = result.inserted_id
     return state_dict
 
+def history_push(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """`$push` of one write to a state's `history`, keeping the newest STATE_HISTORY_SIZE."""
+    return {"$each": [entry], "$slice": -STATE_HISTORY_SIZE}
+
+@app.put("/states/bulk")
+async def upsert_states_bulk(states: List[Dict[str, Any]]):
+    """Upsert states keyed by (reference_id, type) with a single unordered bulk_write."""
+    valid, errors = validate_bulk(State, states)
+    if not valid:
+        return bulk_response(0, [], errors)
+    indexes = [index for index, _ in valid]
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"reference_id": state.reference_id, "type": state.type},
+            {
+                "$set": {"state_data": state.state_data, "updated_at": now},
+                "$setOnInsert": {"_id": state.id, "created_at": state.created_at},
+                "$inc": {"version": 1},
+                "$push": {"history": history_push({"op": "put", "paths": ["state_data"], "at": now})},
+            },
+            upsert=True,
+        )
+        for _, state in valid
+    ]
+    failed = set()
+    try:
+        await states_collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        write_errors = bulk_write_errors(e, indexes)
+        failed = {error["index"] for error in write_errors}
+        errors.extend(write_errors)
+    results = [
+        {"index": index, "reference_id": state.reference_id, "type": state.type}
+        for index, state in valid
+        if index not in failed
+    ]
+    return bulk_response(len(results), results, errors)
+
 @app.get("/states/{reference_id}")
 async def get_state(reference_id: str, state_type: StateType):
     state = await states_collection.find_one({
         "reference_id": parse_object_id(reference_id),
         "type": state_type
-    })
+    }, {"history": 0})
     if state is None:
         raise HTTPException(status_code=404, detail="State not found")
     return state
 
 @app.put("/states/{state_id}")
 async def update_state(state_id: str, state_update: Dict[str, Any]):
-    result = await states_collection.update_one(
+    """Replace fields of a state, bumping `version`; the changed field names are kept in `history`."""
+    for field in ("_id", "version", "history"):
+        state_update.pop(field, None)
+    now = datetime.utcnow()
+    state = await states_collection.find_one_and_update(
         {"_id": parse_object_id(state_id)},
-        {"$set": state_update}
+        {
+            "$set": {**state_update, "updated_at": now},
+            "$inc": {"version": 1},
+            "$push": {"history": history_push({"op": "put", "paths": sorted(state_update), "at": now})},
+        },
+        projection={"version": 1},
+        return_document=ReturnDocument.AFTER,
     )
-    if result.modified_count == 0:
+    if state is None:
+        raise HTTPException(status_code=404, detail="State not found")
+    return {"message": "State updated successfully", "version": state["version"]}
+
+def parse_if_match(value: Optional[str]) -> Optional[int]:
+    """The state version required by an `If-Match` header; None for no precondition."""
+    if value is None or value.strip() == "*":
+        return None
+    tag = value.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    if not tag.isdigit():
+        raise HTTPException(status_code=412, detail="State version does not match If-Match")
+    return int(tag)
+
+@app.patch("/states/{state_id}")
+async def patch_state(state_id: str, patch: Union[List[Dict[str, Any]], Dict[str, Any]], if_match: Optional[str] = Header(None)):
+    """
+    Apply a JSON Patch array or dotted-path operations (see state_patch.py)
+    to `state_data` in one targeted update, bumping `version`.
+
+    `If-Match: "<version>"` makes the patch conditional (412 on mismatch) and
+    a failing JSON Patch `test` returns 409. The new version is returned and
+    sent as the ETag; the deltas are kept in the state's `history`.
+    """
+    object_id = parse_object_id(state_id)
+    try:
+        deltas, tests = parse_patch(patch)
+        update = to_update(deltas)
+    except PatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query = {"_id": object_id, **to_conditions(tests)}
+    expected = parse_if_match(if_match)
+    if expected is not None:
+        # States written before versioning have no version field.
+        query["version"] = expected if expected else {"$in": [0, None]}
+    now = datetime.utcnow()
+    update.setdefault("$set", {})["updated_at"] = now
+    update.setdefault("$inc", {})["version"] = 1
+    update.setdefault("$push", {})["history"] = history_push({"op": "patch", "deltas": deltas, "at": now})
+    try:
+        state = await states_collection.find_one_and_update(
+            query, update, projection={"version": 1}, return_document=ReturnDocument.AFTER
+        )
+    except OperationFailure as e:
+        raise HTTPException(status_code=400, detail=f"Patch cannot be applied: {e}")
+    if state is None:
+        current = await states_collection.find_one({"_id": object_id}, {"version": 1})
+        if current is None:
+            raise HTTPException(status_code=404, detail="State not found")
+        if expected is not None and current.get("version", 0) != expected:
+            raise HTTPException(status_code=412, detail="State version does not match If-Match")
+        raise HTTPException(status_code=409, detail="JSON Patch test failed")
+    return BSONResponse({"_id": object_id, "version": state["version"]}, headers={"ETag": f'"{state["version"]}"'})
+
+@app.get("/states/{state_id}/history")
+async def get_state_history(state_id: str, after: Optional[int] = Query(None, ge=0), limit: Optional[int] = Query(None, ge=1)):
+    """
+    The newest STATE_HISTORY_SIZE writes in `version` order; `after` is the
+    last version already read. PATCH entries hold the applied `deltas`, PUT
+    and bulk upserts the `paths` they replaced.
+    """
+    state = await states_collection.find_one({"_id": parse_object_id(state_id)}, {"version": 1, "history": 1})
+    if state is None:
         raise HTTPException(status_code=404, detail="State not found")
-    return {"message": "State updated successfully"}
+    history = state.get("history", [])
+    # Every write bumps `version` and pushes one entry, so the last entry is the current version.
+    first = state.get("version", 0) - len(history) + 1
+    entries = [{"version": first + offset, **entry} for offset, entry in enumerate(history)]
+    if after is not None:
+        entries = [entry for entry in entries if entry["version"] > after]
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    headers = {}
+    if len(entries) > limit:
+        entries = entries[:limit]
+        headers["X-Next-Cursor"] = str(entries[-1]["version"])
+    return BSONResponse(entries, headers=headers)
 
 # App endpoints
 @app.post("/apps")
 async def create_app(app: App):
-    app_dict = app.model_dump(by_alias=True)
+    app_dict = await offload_code(app.model_dump(by_alias=True))
     result = await apps_collection.insert_one(app_dict)
     app_dict["_id"] = result.inserted_id
     return app_dict
 
 @app.get("/apps")
-async def list_apps(app_parent_id: Optional[str] = None):
+async def list_apps(request: Request, app_parent_id: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), ids: Optional[List[ObjectId]] = Depends(parse_ids), loader: DocumentLoader = Depends(document_loader), projection: Optional[Dict[str, int]] = Depends(projection_for("apps", "summary"))):
+    if ids:
+        return await multi_get(loader, "apps", ids, projection, "App")
     query = {}
     if app_parent_id:
         query["app_parent_id"] = parse_object_id(app_parent_id)
-    apps = await apps_collection.find(query).to_list(length=100)
-    return apps
+    return await paginate(request, apps_collection, query, after, limit, projection=projection)
 
 @app.get("/apps/{app_id}")
-async def get_app(app_id: str):
-    app = await apps_collection.find_one({"_id": parse_object_id(app_id)})
-    if app is None:
-        raise HTTPException(status_code=404, detail="App not found")
-    return app
+async def get_app(request: Request, app_id: str, projection: Optional[Dict[str, int]] = Depends(projection_for("apps"))):
+    return await config_response(request, "apps", parse_object_id(app_id), projection, "App")
+
+@app.get("/apps/{app_id}/code")
+async def get_app_code(app_id: str, range: Optional[str] = Header(None)):
+    return await code_response("apps", parse_object_id(app_id), range, "App")
+
+@app.get("/apps/{app_id}/overview")
+async def get_app_overview(app_id: str):
+    """
+    The app (without `code`) with its newest OVERVIEW_MAX_ITEMS plans, agents
+    and flows, their totals, and run counts by status for the returned
+    plans, from a single aggregation (see overview.py). Results are cached
+    for OVERVIEW_CACHE_TTL seconds.
+    """
+    object_id = parse_object_id(app_id)
+    overview = overview_cache.get(object_id)
+    if overview is None:
+        docs = await apps_collection.aggregate(overview_pipeline(object_id, OVERVIEW_MAX_ITEMS)).to_list(length=1)
+        if not docs:
+            raise HTTPException(status_code=404, detail="App not found")
+        overview = shape_overview(docs[0])
+        overview_cache.set(object_id, overview)
+    return overview
 
 @app.put("/apps/{app_id}")
 async def update_app(app_id: str, app_update: Dict[str, Any]):
+    object_id = parse_object_id(app_id)
+    if "code" in app_update:
+        app_update = await offload_code(app_update)
+        app_update.setdefault("code_ref", None)
     result = await apps_collection.update_one(
-        {"_id": parse_object_id(app_id)},
-        {"$set": app_update}
+        {"_id": object_id},
+        {"$set": {**app_update, "updated_at": datetime.utcnow()}}
     )
+    document_cache.invalidate("apps", object_id)
+    overview_cache.invalidate(object_id)
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="App not found")
     return {"message": "App updated successfully"}
 
 # Plan endpoints
+def compiled_graph(tasks: List[Dict[str, Any]], dependencies: Dict[str, List[str]]) -> Dict[str, Any]:
+    try:
+        return compile_plan(tasks, dependencies)
+    except PlanGraphError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
 @app.post("/plans")
 async def create_plan(plan: Plan):
     plan_dict = plan.model_dump(by_alias=True)
+    plan_dict["graph"] = compiled_graph(plan_dict["tasks"], plan_dict["dependencies"])
     result = await plans_collection.insert_one(plan_dict)
     plan_dict["_id"] = result.inserted_id
     return plan_dict
 
 @app.get("/plans")
-async def list_plans(app_id: Optional[str] = None):
+async def list_plans(request: Request, app_id: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), ids: Optional[List[ObjectId]] = Depends(parse_ids), loader: DocumentLoader = Depends(document_loader), projection: Optional[Dict[str, int]] = Depends(projection_for("plans"))):
+    if ids:
+        return await multi_get(loader, "plans", ids, projection, "Plan")
     query = {}
     if app_id:
         query["app_id"] = parse_object_id(app_id)
-    plans = await plans_collection.find(query).to_list(length=100)
-    return plans
+    return await paginate(request, plans_collection, query, after, limit, projection=projection)
 
 @app.get("/plans/{plan_id}")
-async def get_plan(plan_id: str):
-    plan = await plans_collection.find_one({"_id": parse_object_id(plan_id)})
+async def get_plan(request: Request, plan_id: str, projection: Optional[Dict[str, int]] = Depends(projection_for("plans"))):
+    return await config_response(request, "plans", parse_object_id(plan_id), projection, "Plan")
+
+@app.put("/plans/{plan_id}")
+async def update_plan(plan_id: str, plan_update: Dict[str, Any]):
+    """
+    Update a plan, recompiling its `graph` when `tasks` or `dependencies`
+    change. The new graph is only written if the field it was compiled
+    from without being in the update is unchanged; otherwise 409.
+    """
+    query = {"_id": parse_object_id(plan_id)}
+    plan_update.pop("graph", None)
+    if "tasks" in plan_update or "dependencies" in plan_update:
+        current = await plans_collection.find_one(query, {"tasks": 1, "dependencies": 1})
+        if current is None:
+            raise HTTPException(status_code=404, detail="Plan not found")
+        plan_update["graph"] = compiled_graph(
+            plan_update.get("tasks", current.get("tasks") or []),
+            plan_update.get("dependencies", current.get("dependencies") or {}),
+        )
+        for field in ("tasks", "dependencies"):
+            if field not in plan_update:
+                query[field] = current.get(field)
+    result = await plans_collection.update_one(query, {"$set": {**plan_update, "updated_at": datetime.utcnow()}})
+    if result.matched_count == 0 and len(query) > 1:
+        raise HTTPException(status_code=409, detail="Plan changed while updating, retry")
+    if result.modified_count == 0:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    return {"message": "Plan updated successfully"}
+
+@app.put("/plans/{plan_id}/tasks/{task_id}")
+async def update_plan_task(plan_id: str, task_id: str, task_update: Dict[str, Any]):
+    """
+    Set fields of one task, typically `{"status": "completed"}`. Changes to
+    `id` or `estimated_duration` go through PUT /plans/{plan_id} so the graph
+    is recompiled.
+    """
+    if not task_update:
+        raise HTTPException(status_code=400, detail="No task fields given")
+    if "id" in task_update or "estimated_duration" in task_update:
+        raise HTTPException(status_code=400, detail="Update id and estimated_duration through PUT /plans/{plan_id}")
+    if any(field.startswith("$") or "." in field for field in task_update):
+        raise HTTPException(status_code=400, detail="Invalid field name")
+    if "status" in task_update:
+        try:
+            task_update["status"] = RunStatus(task_update["status"])
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid task status: {task_update['status']}")
+    result = await plans_collection.update_one(
+        {"_id": parse_object_id(plan_id), "tasks.id": task_id},
+        {"$set": {**{f"tasks.$.{field}": value for field, value in task_update.items()}, "updated_at": datetime.utcnow()}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Plan task not found")
+    return {"message": "Task updated successfully"}
+
+@app.get("/plans/{plan_id}/ready")
+async def get_ready_tasks(plan_id: str):
+    """
+    Tasks that can be dispatched now: pending, with every dependency
+    completed, in topological order. Uses the plan's compiled graph, so
+    polling costs one document read and a pass over the tasks.
+    """
+    object_id = parse_object_id(plan_id)
+    plan = await plans_collection.find_one({"_id": object_id}, {"tasks": 1, "dependencies": 1, "graph": 1})
     if plan is None:
         raise HTTPException(status_code=404, detail="Plan not found")
-    return plan
+    tasks = plan.get("tasks") or []
+    dependencies = plan.get("dependencies") or {}
+    graph = plan.get("graph")
+    if graph is None:
+        # Plans stored before graphs were compiled get one on first use.
+        graph = compiled_graph(tasks, dependencies)
+        await plans_collection.update_one({"_id": object_id, "graph": None}, {"$set": {"graph": graph, "updated_at": datetime.utcnow()}})
+    counts = {status.value: 0 for status in RunStatus}
+    for task in tasks:
+        # Graphs compiled before statuses were checked may sit next to non-string ones.
+        status = str(task.get("status", RunStatus.PENDING.value))
+        counts[status] = counts.get(status, 0) + 1
+    return {
+        "plan_id": object_id,
+        "ready": ready_tasks(tasks, dependencies, graph["order"]),
+        "counts": counts,
+        "total": len(tasks),
+        "done": counts[RunStatus.COMPLETED.value] == len(tasks),
+    }
 
 # Agent endpoints
 @app.post("/agents")
 async def create_agent(agent: Agent):
-    agent_dict = agent.model_dump(by_alias=True)
+    agent_dict = await offload_code(agent.model_dump(by_alias=True))
     result = await agents_collection.insert_one(agent_dict)
     agent_dict["_id"] = result.inserted_id
+    index_semantic("agents", agent_dict)
     return agent_dict
 
 @app.get("/agents")
-async def list_agents(app_id: Optional[str] = None, agent_type: Optional[AgentType] = None):
+async def list_agents(request: Request, app_id: Optional[str] = None, agent_type: Optional[AgentType] = None, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), ids: Optional[List[ObjectId]] = Depends(parse_ids), loader: DocumentLoader = Depends(document_loader), projection: Optional[Dict[str, int]] = Depends(projection_for("agents", "summary"))):
+    if ids:
+        return await multi_get(loader, "agents", ids, projection, "Agent")
     query = {}
     if app_id:
         query["app_id"] = parse_object_id(app_id)
     if agent_type:
         query["type"] = agent_type
-    agents = await agents_collection.find(query).to_list(length=100)
-    return agents
+    return await paginate(request, agents_collection, query, after, limit, projection=projection)
 
 @app.get("/agents/{agent_id}")
-async def get_agent(agent_id: str):
-    agent = await agents_collection.find_one({"_id": parse_object_id(agent_id)})
-    if agent is None:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    return agent
+async def get_agent(request: Request, agent_id: str, projection: Optional[Dict[str, int]] = Depends(projection_for("agents"))):
+    return await config_response(request, "agents", parse_object_id(agent_id), projection, "Agent")
+
+@app.get("/agents/{agent_id}/code")
+async def get_agent_code(agent_id: str, range: Optional[str] = Header(None)):
+    return await code_response("agents", parse_object_id(agent_id), range, "Agent")
 
 # Flow endpoints
 @app.post("/flows")
 async def create_flow(flow: Flow):
-    flow_dict = flow.model_dump(by_alias=True)
+    flow_dict = await offload_code(flow.model_dump(by_alias=True))
     result = await flows_collection.insert_one(flow_dict)
     flow_dict["_id"] = result.inserted_id
     return flow_dict
 
 @app.get("/flows")
-async def list_flows(app_id: Optional[str] = None):
+async def list_flows(request: Request, app_id: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), ids: Optional[List[ObjectId]] = Depends(parse_ids), loader: DocumentLoader = Depends(document_loader), projection: Optional[Dict[str, int]] = Depends(projection_for("flows", "summary"))):
+    if ids:
+        return await multi_get(loader, "flows", ids, projection, "Flow")
     query = {}
     if app_id:
         query["app_id"] = parse_object_id(app_id)
-    flows = await flows_collection.find(query).to_list(length=100)
-    return flows
+    return await paginate(request, flows_collection, query, after, limit, projection=projection)
 
 @app.get("/flows/{flow_id}")
-async def get_flow(flow_id: str):
-    flow = await flows_collection.find_one({"_id": parse_object_id(flow_id)})
-    if flow is None:
-        raise HTTPException(status_code=404, detail="Flow not found")
-    return flow
+async def get_flow(request: Request, flow_id: str, projection: Optional[Dict[str, int]] = Depends(projection_for("flows"))):
+    return await config_response(request, "flows", parse_object_id(flow_id), projection, "Flow")
+
+@app.get("/flows/{flow_id}/code")
+async def get_flow_code(flow_id: str, range: Optional[str] = Header(None)):
+    return await code_response("flows", parse_object_id(flow_id), range, "Flow")
 
 # Integration endpoints
 @app.post("/integrations")
@@ -337,36 +1348,64 @@ async def create_integration(integration: Integration):
     return integration_dict
 
 @app.get("/integrations")
-async def list_integrations():
-    integrations = await integrations_collection.find().to_list(length=100)
-    return integrations
+async def list_integrations(request: Request, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), ids: Optional[List[ObjectId]] = Depends(parse_ids), loader: DocumentLoader = Depends(document_loader), projection: Optional[Dict[str, int]] = Depends(projection_for("integrations"))):
+    if ids:
+        return await multi_get(loader, "integrations", ids, projection, "Integration")
+    return await paginate(request, integrations_collection, {}, after, limit, projection=projection)
 
 @app.get("/integrations/{integration_id}")
-async def get_integration(integration_id: str):
-    integration = await integrations_collection.find_one({"_id": parse_object_id(integration_id)})
-    if integration is None:
-        raise HTTPException(status_code=404, detail="Integration not found")
-    return integration
+async def get_integration(request: Request, integration_id: str, projection: Optional[Dict[str, int]] = Depends(projection_for("integrations"))):
+    return await config_response(request, "integrations", parse_object_id(integration_id), projection, "Integration")
 
 # Run endpoints
 @app.post("/runs")
 async def create_run(run: Run):
     run_dict = run.model_dump(by_alias=True)
-    result = await runs_collection.insert_one(run_dict)
-    run_dict["_id"] = result.inserted_id
+    try:
+        run_dict["_id"] = await insert_buffers["runs"].insert(run_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Run already exists")
     return run_dict
 
+@app.post("/runs/bulk")
+async def create_runs_bulk(runs: List[Dict[str, Any]]):
+    return await bulk_insert(insert_buffers["runs"].target(), Run, runs)
+
+@app.post("/runs/claim")
+async def claim_next_run(lease: RunLease):
+    """
+    Atomically lease the oldest PENDING run (or one whose lease expired) to
+    `worker`, moving it to RUNNING. Returns 204 when there is nothing to run.
+    """
+    run = await claim_run(runs_collection, lease.worker, lease.lease_seconds or RUN_LEASE_SECONDS, RUN_MAX_ATTEMPTS)
+    if run is None:
+        return Response(status_code=204)
+    return run
+
+@app.post("/runs/reclaim")
+async def reclaim_runs():
+    """Requeue runs whose lease expired, failing those out of attempts."""
+    return await reclaim_expired(runs_collection, RUN_MAX_ATTEMPTS)
+
 @app.get("/runs")
-async def list_runs(plan_id: Optional[str] = None):
+async def list_runs(request: Request, plan_id: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), ids: Optional[List[ObjectId]] = Depends(parse_ids), loader: DocumentLoader = Depends(document_loader), projection: Optional[Dict[str, int]] = Depends(projection_for("runs", "summary"))):
+    if ids:
+        return await multi_get(loader, "runs", ids, projection, "Run")
     query = {}
     if plan_id:
         query["plan_id"] = parse_object_id(plan_id)
-    runs = await runs_collection.find(query).to_list(length=100)
-    return runs
+    return await paginate(request, runs_collection, query, after, limit, sort_field="created_at", projection=projection)
 
 @app.get("/runs/{run_id}")
-async def get_run(run_id: str):
-    run = await runs_collection.find_one({"_id": parse_object_id(run_id)})
+async def get_run(run_id: str, include_log: bool = False, projection: Optional[Dict[str, int]] = Depends(projection_for("runs"))):
+    """
+    Return the run with its `log_count` and the last RUN_LOG_TAIL_SIZE entries
+    in `log_tail`. The legacy embedded `execution_log` is only returned with
+    `?include_log=true`; appended entries are read from /runs/{run_id}/log.
+    """
+    if projection is None and not include_log:
+        projection = {"execution_log": 0}
+    run = await runs_collection.find_one({"_id": parse_object_id(run_id)}, projection)
     if run is None:
         raise HTTPException(status_code=404, detail="Run not found")
     return run
@@ -381,6 +1420,173 @@ async def update_run(run_id: str, run_update: Dict[str, Any]):
         raise HTTPException(status_code=404, detail="Run not found")
     return {"message": "Run updated successfully"}
 
+@app.post("/runs/{run_id}/heartbeat")
+async def heartbeat_run(run_id: str, lease: RunLease):
+    """Renew the lease held by `worker`; 409 when it has expired and been claimed by another worker."""
+    expires_at = await renew_lease(runs_collection, parse_object_id(run_id), lease.worker, lease.lease_seconds or RUN_LEASE_SECONDS)
+    if expires_at is None:
+        raise HTTPException(status_code=409, detail="Run is not leased to this worker")
+    return {"lease_expires_at": expires_at}
+
+@app.post("/runs/{run_id}/finish")
+async def finish_leased_run(run_id: str, outcome: RunFinish):
+    """Record a leased run as COMPLETED or FAILED; 409 when the lease was lost."""
+    finished = await finish_run(
+        runs_collection, parse_object_id(run_id), outcome.worker, outcome.status,
+        output_data=outcome.output_data, error_message=outcome.error_message,
+    )
+    if not finished:
+        raise HTTPException(status_code=409, detail="Run is not leased to this worker")
+    return {"message": "Run finished successfully"}
+
+@app.post("/runs/{run_id}/log")
+async def append_run_log(run_id: str, entries: Union[List[Dict[str, Any]], Dict[str, Any]]):
+    """
+    Append one entry or a batch to the run's execution log.
+
+    Sequence numbers are reserved with a single `$inc` on the run, and the
+    entries are written to `run_logs`, so the cost of an append does not
+    grow with the length of the log.
+    """
+    if isinstance(entries, dict):
+        entries = [entries]
+    if not entries:
+        raise HTTPException(status_code=400, detail="No log entries given")
+    if len(entries) > MAX_BULK_SIZE:
+        raise HTTPException(status_code=413, detail=f"Bulk requests are limited to {MAX_BULK_SIZE} items")
+    object_id = parse_object_id(run_id)
+    run = await runs_collection.find_one_and_update(
+        {"_id": object_id},
+        {
+            "$inc": {"log_count": len(entries)},
+            "$push": {"log_tail": {"$each": entries, "$slice": -RUN_LOG_TAIL_SIZE}},
+        },
+        projection={"log_count": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    first_seq = run["log_count"] - len(entries)
+    docs = [
+        RunLogEntry(run_id=object_id, seq=first_seq + offset, data=entry).model_dump(by_alias=True)
+        for offset, entry in enumerate(entries)
+    ]
+    await run_logs_collection.insert_many(docs)
+    return {"run_id": object_id, "first_seq": first_seq, "count": len(docs)}
+
+@app.get("/runs/{run_id}/log")
+async def get_run_log(request: Request, run_id: str, after: Optional[int] = Query(None, ge=-1), limit: Optional[int] = Query(None, ge=1)):
+    """Log entries in `seq` order; `after` is the last seq already read (see `X-Next-Cursor`)."""
+    query = {"run_id": parse_object_id(run_id)}
+    if after is not None:
+        query["seq"] = {"$gt": after}
+    return await cursor_response(request, run_logs_collection, query, [("seq", 1)], limit, cursor_field="seq")
+
+# Connection pool statistics endpoint
+@app.get("/pool/stats")
+async def pool_stats():
+    return pool_metrics.snapshot()
+
+@app.get("/writes/stats")
+async def write_stats():
+    return {collection_name: buffer.stats() for collection_name, buffer in insert_buffers.items()}
+
+# Prometheus metrics endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Route, MongoDB command and connection pool metrics in the Prometheus text format."""
+    return PlainTextResponse(
+        render_prometheus([route_metrics.prometheus(), command_metrics.prometheus(), pool_metrics.prometheus()]),
+        media_type="text/plain; version=0.0.4",
+    )
+
+# Export/import endpoints
+EXPORT_MODELS = {"chats": Chat, "messages": Message, "runs": Run}
+
+@app.get("/export/{collection_name}")
+async def export_documents(collection_name: Literal["chats", "messages", "runs"], codec: str = "gzip", before: Optional[datetime] = None):
+    """
+    Stream a collection (documents created before `before`, if given) as
+    gzip- or zstd-compressed NDJSON in `_id` order, reading the cursor in batches.
+    Archived chat messages are not included.
+    """
+    try:
+        check_codec(codec)
+    except UnsupportedCodec as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query = {"created_at": {"$lt": before}} if before else {}
+    cursor = database[collection_name].for_lists.find(query).sort([("_id", 1)]).batch_size(NDJSON_BATCH_SIZE)
+    filename = f"{collection_name}.ndjson{EXTENSIONS[codec]}"
+    return StreamingResponse(
+        compress_stream(stream_ndjson(cursor), codec),
+        media_type=MEDIA_TYPES[codec],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.post("/import/{collection_name}")
+async def import_documents(request: Request, collection_name: Literal["chats", "messages", "runs"], codec: str = "gzip"):
+    """
+    Insert documents from a compressed NDJSON request body (as written by
+    /export) in unordered batches of MAX_BULK_SIZE, validated like the bulk
+    endpoints. Existing `_id`s are reported as errors; `errors` lists the
+    first MAX_IMPORT_ERRORS failures by line number.
+    """
+    try:
+        check_codec(codec)
+    except UnsupportedCodec as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    model = EXPORT_MODELS[collection_name]
+    collection = database[collection_name]
+    # Imported messages are not new: they are indexed but not published to live subscribers.
+    on_insert = (lambda doc: index_semantic("messages", doc)) if collection_name == "messages" else None
+    count, failed, errors = 0, 0, []
+    batch: List[Dict[str, Any]] = []
+    batch_lines: List[int] = []
+    line = 0
+
+    async def insert_batch():
+        nonlocal count, failed
+        result = await bulk_insert(collection, model, batch, on_insert=on_insert)
+        count += result["count"]
+        failed += result["failed"]
+        for item in result["results"]:
+            if "error" in item and len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({"line": batch_lines[item["index"]], "error": item["error"]})
+
+    try:
+        async for raw in decompress_lines(request.stream(), codec):
+            line += 1
+            try:
+                doc = orjson.loads(raw)
+            except orjson.JSONDecodeError as e:
+                failed += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append({"line": line, "error": f"Invalid JSON: {e}"})
+                continue
+            if collection_name == "chats" and isinstance(doc, dict):
+                # The archives of exported chats stay behind; imported chats start unarchived.
+                doc.pop("archived_at", None)
+            batch.append(doc)
+            batch_lines.append(line)
+            if len(batch) >= MAX_BULK_SIZE:
+                await insert_batch()
+                batch, batch_lines = [], []
+        if batch:
+            await insert_batch()
+    except CorruptData as e:
+        raise HTTPException(status_code=400, detail=f"Invalid {codec} data after line {line}: {e}")
+    return {"count": count, "failed": failed, "errors": errors}
+
+# Cache statistics endpoint
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        **document_cache.stats(),
+        "sessions": {**session_cache.stats(), "activity": session_activity.stats()},
+        "archive": chat_archiver.stats(),
+        "overviews": overview_cache.stats(),
+    }
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -409,6 +1615,7 @@ async def root():
             "integrations": "/integrations",
             "runs": "/runs",
             "health": "/health",
+            "metrics": "/metrics",
             "docs": "/docs",
             "redoc": "/redoc"
         }
@@ -0,0 +1,171 @@
+"""
+Cold archival of idle chats.
+
+`ChatArchiver` moves the messages of chats without activity since a cutoff
+into one compressed NDJSON file per chat (MongoDB Extended JSON, so types
+survive the round trip) and marks the chat with `archived_at`. The chat
+document itself stays, so listings and ownership checks are unaffected.
+`restore` puts the messages back when an archived chat is read.
+
+Each step can be repeated after a crash: the file is renamed into place
+before the chat is marked, messages are deleted only after that, and
+restoring skips messages that still exist. Archives are local files, so
+every API process must see the same `directory`, and only one archiver
+should run at a time.
+"""
+
+from typing import Any, Dict, Hashable, List, Optional
+from datetime import datetime, timedelta
+from pathlib import Path
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+import asyncio
+import logging
+import os
+
+from compression import CODECS, EXTENSIONS, check_codec, compressor, decompress_lines, read_file
+
+logger = logging.getLogger(__name__)
+
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+DUPLICATE_KEY = 11000
+
+class ArchiveMissing(RuntimeError):
+    pass
+
+class ChatArchiver:
+    def __init__(self, chats, messages, directory: Path, codec: str = "gzip", idle_days: float = 0, batch_size: int = 1000):
+        check_codec(codec)
+        self.chats = chats
+        self.messages = messages
+        self.directory = Path(directory)
+        self.codec = codec
+        self.idle_days = idle_days
+        self.batch_size = batch_size
+        self.archived = 0
+        self.restored = 0
+        self._restoring: Dict[Hashable, asyncio.Future] = {}
+
+    def path(self, chat_id: ObjectId, codec: Optional[str] = None) -> Path:
+        return self.directory / f"{chat_id}.ndjson{EXTENSIONS[codec or self.codec]}"
+
+    def find(self, chat_id: ObjectId) -> Optional[Path]:
+        """The archive file of `chat_id`, whichever codec it was written with."""
+        for codec in (self.codec, *CODECS):
+            path = self.path(chat_id, codec)
+            if path.exists():
+                return path
+        return None
+
+    async def archive_idle(self, cutoff: Optional[datetime] = None) -> int:
+        """Archive every chat idle since `cutoff` (default: `idle_days` ago); returns the chats archived."""
+        cutoff = cutoff or datetime.utcnow() - timedelta(days=self.idle_days)
+        archived = 0
+        candidates = self.chats.find({"archived_at": None, "updated_at": {"$lt": cutoff}}, {"_id": 1}).batch_size(self.batch_size)
+        async for chat in candidates:
+            try:
+                if await self.archive(chat["_id"], cutoff):
+                    archived += 1
+            except Exception as e:
+                logger.warning("Archiving chat %s failed: %s", chat["_id"], e)
+        return archived
+
+    async def archive(self, chat_id: ObjectId, cutoff: datetime) -> int:
+        """Move the messages of `chat_id` to its archive file unless it had messages since `cutoff`."""
+        latest = await self.messages.find_one({"chat_id": chat_id}, {"created_at": 1}, sort=[("created_at", -1)])
+        if latest is None:
+            return 0
+        if latest["created_at"] >= cutoff:
+            # Message inserts leave the chat's `updated_at` alone; catch it up so
+            # the chat is not picked again until it has really been idle.
+            await self.chats.update_one(
+                {"_id": chat_id, "updated_at": {"$lt": latest["created_at"]}},
+                {"$set": {"updated_at": latest["created_at"]}},
+            )
+            return 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(chat_id)
+        partial = path.with_name(path.name + ".partial")
+        message_ids: List[ObjectId] = []
+        cursor = self.messages.find({"chat_id": chat_id}).sort([("created_at", 1), ("_id", 1)]).batch_size(self.batch_size)
+        stream = compressor(self.codec)
+        with open(partial, "wb") as f:
+            lines = []
+            async for message in cursor:
+                message_ids.append(message["_id"])
+                lines.append(json_util.dumps(message, json_options=JSON_OPTIONS))
+                if len(lines) >= self.batch_size:
+                    await asyncio.to_thread(f.write, stream.compress(("\n".join(lines) + "\n").encode("utf-8")))
+                    lines = []
+            tail = ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+            await asyncio.to_thread(f.write, stream.compress(tail) + stream.flush())
+            await asyncio.to_thread(os.fsync, f.fileno())
+        os.replace(partial, path)
+
+        marked = await self.chats.update_one({"_id": chat_id, "archived_at": None}, {"$set": {"archived_at": datetime.utcnow()}})
+        if not marked.matched_count:
+            # Deleted or archived meanwhile; leave its messages alone.
+            path.unlink(missing_ok=True)
+            return 0
+        for start in range(0, len(message_ids), self.batch_size):
+            await self.messages.delete_many({"_id": {"$in": message_ids[start:start + self.batch_size]}})
+        self.archived += 1
+        return len(message_ids)
+
+    async def restore(self, chat_id: ObjectId) -> int:
+        """Bring back the archived messages of `chat_id`; concurrent calls share one restore."""
+        task = self._restoring.get(chat_id)
+        if task is None:
+            task = self._restoring[chat_id] = asyncio.ensure_future(self._restore(chat_id))
+            task.add_done_callback(lambda _: self._restoring.pop(chat_id, None))
+        return await asyncio.shield(task)
+
+    async def _restore(self, chat_id: ObjectId) -> int:
+        chat = await self.chats.find_one({"_id": chat_id}, {"archived_at": 1})
+        if chat is None or chat.get("archived_at") is None:
+            return 0
+        path = self.find(chat_id)
+        if path is None:
+            raise ArchiveMissing(f"Archive of chat {chat_id} not found in {self.directory}")
+        codec = next(codec for codec in CODECS if path.name.endswith(EXTENSIONS[codec]))
+        restored = 0
+        batch: List[Dict[str, Any]] = []
+        async for line in decompress_lines(read_file(path), codec):
+            batch.append(json_util.loads(line, json_options=JSON_OPTIONS))
+            if len(batch) >= self.batch_size:
+                restored += await self._insert(batch)
+                batch = []
+        if batch:
+            restored += await self._insert(batch)
+        await self.chats.update_one({"_id": chat_id}, {"$unset": {"archived_at": ""}})
+        path.unlink(missing_ok=True)
+        self.restored += 1
+        return restored
+
+    async def _insert(self, messages: List[Dict[str, Any]]) -> int:
+        try:
+            result = await self.messages.insert_many(messages, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            # Messages still present after an interrupted archive are skipped.
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY for error in errors):
+                raise
+            return e.details.get("nInserted", 0)
+
+    def discard(self, chat_id: ObjectId) -> None:
+        for codec in CODECS:
+            self.path(chat_id, codec).unlink(missing_ok=True)
+
+    async def run(self, interval: float) -> None:
+        while True:
+            try:
+                archived = await self.archive_idle()
+                if archived:
+                    logger.info("Archived %d idle chats", archived)
+            except Exception as e:
+                logger.warning("Archiving idle chats failed: %s", e)
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, int]:
+        return {"archived": self.archived, "restored": self.restored, "restoring": len(self._restoring)}
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Load test for the Alpha Database API.
+
+Seeds a dedicated database with Users, Sessions, Chats, Messages, Apps,
+Plans, Agents, Flows, Integrations, Runs and States shaped like the models
+in model.py, then drives every route concurrently through an in-process
+ASGI client and reports throughput and p50/p95/p99 latency per route.
+
+The benchmark database (default `alpha_bench`) is dropped and re-seeded on
+every run. `--in-process` swaps MongoDB for mongomock-motor so the harness
+runs without a server; its numbers only measure the API layer.
+
+Results are written as JSON; `--compare old.json` prints the change per
+route and exits non-zero when a route's p95 regressed beyond `--threshold`.
+
+Usage:
+    pip install -r requirements-dev.txt
+    MONGODB_URI=mongodb://localhost:27017 python benchmarks/bench_api.py --output results.json
+    python benchmarks/bench_api.py --compare baseline.json --output results.json
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from bson import ObjectId
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from pathlib import Path
+
+DB_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(DB_DIR))
+
+SEED_BATCH_SIZE = 1000
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+class Dataset:
+    """Ids of the seeded documents, used to build request paths."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.ids: Dict[str, List[ObjectId]] = {}
+        self.session_tokens: List[str] = []
+
+    def pick(self, name: str) -> str:
+        return str(self.rng.choice(self.ids[name]))
+
+async def insert_all(collection, docs: List[Dict[str, Any]]) -> None:
+    for start in range(0, len(docs), SEED_BATCH_SIZE):
+        await collection.insert_many(docs[start:start + SEED_BATCH_SIZE], ordered=False)
+
+async def seed(api, scale: int, rng: random.Random) -> Dataset:
+    from model import (
+        User, Session, Chat, Message, State, App, Plan, Agent, Flow, Integration, Run,
+        MessageRole, StateType, AgentType, RunStatus,
+    )
+    dataset = Dataset(rng)
+    now = datetime.utcnow()
+
+    def build(model, **fields) -> Dict[str, Any]:
+        return model.model_construct(**fields).model_dump(by_alias=True)
+
+    users = [build(User, user_id=f"user-{i}", email=f"user{i}@example.com", name=f"User {i}") for i in range(50 * scale)]
+    sessions = [build(Session, user_id=user["_id"], session_token=str(ObjectId())) for user in users]
+    chats = [build(Chat, user_id=user["_id"], session_id=session["_id"], title=f"Chat {i}")
+             for user, session in zip(users, sessions) for i in range(4)]
+    messages = [
+        build(Message, chat_id=chat["_id"], role=rng.choice(list(MessageRole)),
+              text="Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * rng.randint(1, 20),
+              created_at=now + timedelta(milliseconds=i))
+        for chat in chats for i in range(50)
+    ]
+    apps = [build(App, name=f"app-{i}", label=f"App {i}", description="Generated app " * 10) for i in range(10 * scale)]
+    tool = {"name": "search", "description": "Search the web " * 5,
+            "parameters": {"type": "object", "properties": {f"arg_{j}": {"type": "string"} for j in range(8)}}}
+    agents = [
+        build(Agent, app_id=app["_id"], name=f"agent-{i}", type=rng.choice(list(AgentType)),
+              system_message="You are a helpful agent. " * 40, tools=[tool] * 20,
+              input_schema={"type": "object", "properties": {f"f{j}": {"type": "string"} for j in range(30)}},
+              capabilities=["search", "code"])
+        for app in apps for i in range(8)
+    ]
+    flows = [
+        build(Flow, app_id=app["_id"], name=f"flow-{i}", description="Generated flow", entry_point="node_0",
+              nodes=[{"id": f"node_{j}", "type": "worker", "config": {"retries": 3}} for j in range(100)],
+              edges=[{"source": f"node_{j}", "target": f"node_{j + 1}"} for j in range(99)])
+        for app in apps for i in range(4)
+    ]
+    plans = [
+        build(Plan, app_id=app["_id"], name=f"plan-{i}", description="Generated plan",
+              tasks=[{"id": f"task_{j}", "name": f"Task {j}"} for j in range(20)],
+              dependencies={f"task_{j}": [f"task_{j - 1}"] for j in range(1, 20)})
+        for app in apps for i in range(5)
+    ]
+    runs = [
+        build(Run, plan_id=plan["_id"], flow_id=rng.choice(flows)["_id"], status=rng.choice(list(RunStatus)),
+              input_data={"query": "x" * 200}, created_at=now + timedelta(milliseconds=i))
+        for plan in plans for i in range(40)
+    ]
+    integrations = [build(Integration, name=f"integration-{i}", type="http", config={"url": "https://example.com"})
+                    for i in range(20)]
+    states = [build(State, type=StateType.CHAT, reference_id=chat["_id"], state_data={"summary": "s" * 500})
+              for chat in chats]
+
+    collections = {
+        "users": users, "sessions": sessions, "chats": chats, "messages": messages, "apps": apps,
+        "agents": agents, "flows": flows, "plans": plans, "runs": runs, "integrations": integrations,
+        "states": states,
+    }
+    for name, docs in collections.items():
+        await insert_all(api.database[name], docs)
+        dataset.ids[name] = [doc["_id"] for doc in docs]
+    dataset.session_tokens = [session["session_token"] for session in sessions]
+    print("seeded " + ", ".join(f"{len(docs)} {name}" for name, docs in collections.items()))
+    return dataset
+
+Request = Tuple[str, str, Optional[Any], Dict[str, str]]
+
+def routes(data: Dataset) -> Dict[str, Callable[[], Request]]:
+    """Route name -> factory of (method, path, json body, headers)."""
+    ndjson = {"Accept": "application/x-ndjson"}
+
+    def message() -> Dict[str, Any]:
+        return {"chat_id": data.pick("chats"), "role": "assistant", "text": "Generated reply " * 10}
+
+    def run() -> Dict[str, Any]:
+        return {"plan_id": data.pick("plans"), "flow_id": data.pick("flows")}
+
+    return {
+        "GET /health": lambda: ("GET", "/health", None, {}),
+        "GET /users": lambda: ("GET", "/users", None, {}),
+        "GET /users/{id}": lambda: ("GET", f"/users/{data.pick('users')}", None, {}),
+        "GET /sessions?user_id": lambda: ("GET", f"/sessions?user_id={data.pick('users')}", None, {}),
+        "GET /sessions/{id}": lambda: ("GET", f"/sessions/{data.pick('sessions')}", None, {}),
+        "GET /sessions/by-token/{token}": lambda: ("GET", f"/sessions/by-token/{data.rng.choice(data.session_tokens)}", None, {}),
+        "GET /chats?user_id": lambda: ("GET", f"/chats?user_id={data.pick('users')}", None, {}),
+        "GET /chats/{id}": lambda: ("GET", f"/chats/{data.pick('chats')}", None, {}),
+        "GET /chats/{id}/context": lambda: ("GET", f"/chats/{data.pick('chats')}/context?budget=4000", None, {}),
+        "GET /messages?chat_id": lambda: ("GET", f"/messages?chat_id={data.pick('chats')}", None, {}),
+        "GET /messages?chat_id (ndjson)": lambda: ("GET", f"/messages?chat_id={data.pick('chats')}", None, ndjson),
+        "GET /messages/search": lambda: ("GET", f"/messages/search?q=consectetur&user_id={data.pick('users')}", None, {}),
+        "GET /search/semantic": lambda: ("GET", "/search/semantic?q=consectetur+adipiscing&k=10", None, {}),
+        "POST /messages": lambda: ("POST", "/messages", message(), {}),
+        "POST /messages/bulk": lambda: ("POST", "/messages/bulk", [message() for _ in range(50)], {}),
+        "GET /states/{reference_id}": lambda: ("GET", f"/states/{data.pick('chats')}?state_type=chat", None, {}),
+        "PUT /states/bulk": lambda: ("PUT", "/states/bulk", [
+            {"type": "chat", "reference_id": data.pick("chats"), "state_data": {"step": 1}} for _ in range(20)
+        ], {}),
+        "PATCH /states/{id}": lambda: ("PATCH", f"/states/{data.pick('states')}", {"inc": {"step": 1}, "push": {"log": "step"}}, {}),
+        "GET /apps": lambda: ("GET", "/apps", None, {}),
+        "GET /apps/{id}": lambda: ("GET", f"/apps/{data.pick('apps')}", None, {}),
+        "GET /apps/{id}/overview": lambda: ("GET", f"/apps/{data.pick('apps')}/overview", None, {}),
+        "GET /plans?app_id": lambda: ("GET", f"/plans?app_id={data.pick('apps')}", None, {}),
+        "GET /plans/{id}": lambda: ("GET", f"/plans/{data.pick('plans')}", None, {}),
+        "GET /plans/{id}/ready": lambda: ("GET", f"/plans/{data.pick('plans')}/ready", None, {}),
+        "GET /agents?app_id": lambda: ("GET", f"/agents?app_id={data.pick('apps')}", None, {}),
+        "GET /agents?app_id&view=full": lambda: ("GET", f"/agents?app_id={data.pick('apps')}&view=full", None, {}),
+        "GET /agents/{id}": lambda: ("GET", f"/agents/{data.pick('agents')}", None, {}),
+        "GET /agents?ids": lambda: ("GET", "/agents?view=full&ids=" + ",".join(data.pick("agents") for _ in range(10)), None, {}),
+        "GET /flows?app_id": lambda: ("GET", f"/flows?app_id={data.pick('apps')}", None, {}),
+        "GET /flows/{id}": lambda: ("GET", f"/flows/{data.pick('flows')}", None, {}),
+        "GET /integrations": lambda: ("GET", "/integrations", None, {}),
+        "GET /integrations/{id}": lambda: ("GET", f"/integrations/{data.pick('integrations')}", None, {}),
+        "GET /runs?plan_id": lambda: ("GET", f"/runs?plan_id={data.pick('plans')}", None, {}),
+        "GET /runs/{id}": lambda: ("GET", f"/runs/{data.pick('runs')}", None, {}),
+        "POST /runs": lambda: ("POST", "/runs", run(), {}),
+        "POST /runs/bulk": lambda: ("POST", "/runs/bulk", [run() for _ in range(50)], {}),
+        "POST /runs/{id}/log": lambda: ("POST", f"/runs/{data.pick('runs')}/log", [{"event": "step", "n": i} for i in range(10)], {}),
+        "GET /runs/{id}/log": lambda: ("GET", f"/runs/{data.pick('runs')}/log", None, {}),
+    }
+
+async def drive(client, make_request: Callable[[], Request], requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, path, body, headers = make_request()
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body, headers=headers)
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    """Print per-route p95 changes; return the number of routes that regressed beyond `threshold`."""
+    regressions = 0
+    print(f"\n{'route':<36}{'base p95':>10}{'p95':>10}{'change':>9}")
+    for route, stats in current["routes"].items():
+        base = baseline.get("routes", {}).get(route)
+        if not base or not base["p95_ms"]:
+            continue
+        change = stats["p95_ms"] / base["p95_ms"] - 1
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{route:<36}{base['p95_ms']:>10.2f}{stats['p95_ms']:>10.2f}{change:>+9.1%}{flag}")
+    return regressions
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    import httpx
+    import api
+
+    rng = random.Random(args.seed)
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mongodb": "mongomock" if args.in_process else os.environ["MONGODB_URI"],
+            "scale": args.scale,
+            "requests_per_route": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "routes": {},
+    }
+    async with api.lifespan(api.app):
+        await api.database.client.drop_database(args.database)
+        await api.ensure_indexes()
+        dataset = await seed(api, args.scale, rng)
+        transport = httpx.ASGITransport(app=api.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            selected = routes(dataset)
+            if args.routes:
+                selected = {name: make for name, make in selected.items() if any(part in name for part in args.routes)}
+            print(f"\n{'route':<36}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+            for name, make_request in selected.items():
+                # Warm up connections and caches before measuring.
+                await drive(client, make_request, min(args.concurrency, args.requests), args.concurrency)
+                stats = await drive(client, make_request, args.requests, args.concurrency)
+                results["routes"][name] = stats
+                print(f"{name:<36}{stats['throughput_rps']:>9.0f}{stats['p50_ms']:>9.2f}"
+                      f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['errors']:>8}")
+    return results
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongodb-uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default="alpha_bench", help="Database to drop and seed")
+    parser.add_argument("--in-process", action="store_true", help="Use mongomock-motor instead of a server")
+    parser.add_argument("--scale", type=int, default=1, help="Multiplier for seeded volumes")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per route")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent requests per route")
+    parser.add_argument("--routes", nargs="*", help="Only run routes whose name contains one of these")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for data and request ids")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p95 regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # api.py reads its configuration at import time.
+    os.environ["MONGODB_URI"] = args.mongodb_uri
+    os.environ["MONGODB_DATABASE"] = args.database
+    if args.in_process:
+        from mongomock_motor import AsyncMongoMockClient
+        import motor.motor_asyncio
+
+        class InProcessClient(AsyncMongoMockClient):
+            def __init__(self, uri=None, **options):
+                super().__init__()
+
+        motor.motor_asyncio.AsyncIOMotorClient = InProcessClient
+        os.environ["MONGODB_LIST_READ_PREFERENCE"] = "primary"
+
+    results = asyncio.run(run_benchmark(args))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"\nwrote {args.output}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(baseline, results, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
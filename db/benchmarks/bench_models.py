@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Model validation micro-benchmark.
+
+Measures, for every model in model.py, the cost per document of
+`model_validate` on a JSON-decoded request payload, of validating a batch
+through the cached `list_adapter` (the bulk endpoints' path), and of
+`model_dump(by_alias=True)` one by one and as a batch.
+
+Results are written as JSON; `--compare old.json` prints the change per
+model and exits non-zero when a measurement slowed down beyond `--threshold`.
+
+Usage:
+    python benchmarks/bench_models.py [--batch 1000] --output models.json
+    python benchmarks/bench_models.py --compare models.json
+"""
+
+from typing import Any, Callable, Dict
+from datetime import datetime
+from bson import ObjectId
+import argparse
+import json
+import platform
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import model as models
+from model import list_adapter
+
+MEASUREMENTS = ("validate", "validate_batch", "dump", "dump_batch")
+
+def oid() -> str:
+    return str(ObjectId())
+
+def now() -> str:
+    return datetime.utcnow().isoformat()
+
+# Model -> request body as FastAPI hands it over (ids and timestamps as strings).
+PAYLOADS: Dict[type, Callable[[], Dict[str, Any]]] = {
+    models.MessageContent: lambda: {"type": "text", "data": "Some text content. " * 5},
+    models.CodeRef: lambda: {"sha256": "0" * 64, "size": 1024},
+    models.User: lambda: {"user_id": "user-1", "email": "user@example.com", "name": "User", "preferences": {"theme": "dark"}},
+    models.Session: lambda: {"user_id": oid(), "session_token": oid(), "ip_address": "10.0.0.1", "expires_at": now()},
+    models.Chat: lambda: {"user_id": oid(), "session_id": oid(), "app_id": oid(), "title": "Chat", "metadata": {"source": "web"}},
+    models.Message: lambda: {
+        "chat_id": oid(), "role": "assistant", "text": "Here is the answer. " * 30,
+        "content": [{"type": "text", "data": "Details. " * 10}, {"type": "json", "data": {"rows": list(range(10))}}],
+        "metadata": {"model": "local", "tokens": 120}, "created_at": now(),
+    },
+    models.State: lambda: {"type": "chat", "reference_id": oid(), "state_data": {"step": 3, "memory": ["a", "b", "c"]}},
+    models.App: lambda: {"name": "app", "label": "App", "description": "An application", "user_id": oid()},
+    models.PlanGraph: lambda: {"order": ["a", "b", "c"], "levels": [["a"], ["b", "c"]], "critical_path": ["a", "b"]},
+    models.Plan: lambda: {
+        "app_id": oid(), "name": "plan", "description": "A plan",
+        "tasks": [{"id": f"t{i}", "status": "pending", "estimated_duration": 5} for i in range(20)],
+        "dependencies": {f"t{i}": [f"t{i - 1}"] for i in range(1, 20)},
+    },
+    models.Agent: lambda: {
+        "app_id": oid(), "name": "worker", "type": "worker", "system_message": "You are a worker agent. " * 20,
+        "tools": [{"name": f"tool_{i}", "parameters": {"type": "object"}} for i in range(10)],
+        "capabilities": ["search", "summarize"],
+    },
+    models.Flow: lambda: {
+        "app_id": oid(), "name": "flow", "description": "A flow", "entry_point": "node_0",
+        "nodes": [{"id": f"node_{i}", "agent_id": oid()} for i in range(30)],
+        "edges": [{"source": f"node_{i}", "target": f"node_{i + 1}"} for i in range(29)],
+    },
+    models.Integration: lambda: {"name": "github", "type": "oauth", "config": {"scopes": ["repo"]}},
+    models.Run: lambda: {"plan_id": oid(), "flow_id": oid(), "input_data": {"query": "hello"}, "status": "pending"},
+    models.RunLease: lambda: {"worker": "host:1", "lease_seconds": 60},
+    models.RunFinish: lambda: {"worker": "host:1", "status": "completed", "output_data": {"answer": 42}},
+    models.RunLogEntry: lambda: {"run_id": oid(), "seq": 1, "data": {"event": "step", "n": 1}},
+}
+
+def measure(model: type, batch: int, number: int, repeat: int) -> Dict[str, float]:
+    """Best microseconds per document for each measurement."""
+    payloads = [PAYLOADS[model]() for _ in range(batch)]
+    instances = [model.model_validate(payload) for payload in payloads]
+    adapter = list_adapter(model)
+    cases = {
+        "validate": lambda: [model.model_validate(payload) for payload in payloads],
+        "validate_batch": lambda: adapter.validate_python(payloads),
+        "dump": lambda: [instance.model_dump(by_alias=True) for instance in instances],
+        "dump_batch": lambda: adapter.dump_python(instances, by_alias=True),
+    }
+    return {
+        name: min(timeit.repeat(case, number=number, repeat=repeat)) / (number * batch) * 1e6
+        for name, case in cases.items()
+    }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    """Print per-model changes; return the number of measurements that slowed down beyond `threshold`."""
+    regressions = 0
+    print(f"\n{'model':<16}{'measurement':<16}{'base us':>10}{'us':>10}{'change':>9}")
+    for name, results in current["models"].items():
+        for measurement, value in results.items():
+            base = baseline.get("models", {}).get(name, {}).get(measurement)
+            if not base:
+                continue
+            change = value / base - 1
+            flag = ""
+            if change > threshold:
+                regressions += 1
+                flag = "  REGRESSION"
+            print(f"{name:<16}{measurement:<16}{base:>10.2f}{value:>10.2f}{change:>+9.1%}{flag}")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=1000, help="Documents per measurement")
+    parser.add_argument("--number", type=int, default=3, help="Runs per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="Measurements per case (best is reported)")
+    parser.add_argument("--models", nargs="*", help="Only run these models")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "batch": args.batch,
+        },
+        "models": {},
+    }
+    print(f"{'model':<16}" + "".join(f"{name + ' us':>18}" for name in MEASUREMENTS) + f"{'validate/s':>14}")
+    for model in PAYLOADS:
+        if args.models and model.__name__ not in args.models:
+            continue
+        stats = measure(model, args.batch, args.number, args.repeat)
+        results["models"][model.__name__] = stats
+        print(f"{model.__name__:<16}" + "".join(f"{stats[name]:>18.2f}" for name in MEASUREMENTS)
+              + f"{1e6 / stats['validate_batch']:>14.0f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"\nwrote {args.output}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(baseline, results, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
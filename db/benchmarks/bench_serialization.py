@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Serialization micro-benchmark.
+
+Compares FastAPI's default path (`jsonable_encoder` + `JSONResponse`) with
+`BSONResponse` (orjson with native ObjectId/datetime handling) on documents
+shaped like the Agent, Flow and Message models.
+
+Usage:
+    python benchmarks/bench_serialization.py [--number 200]
+"""
+
+from datetime import datetime
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from model import Agent, AgentType, Flow, Message, MessageRole
+from serialization import BSONResponse
+
+def make_agent() -> dict:
+    tools = [
+        {
+            "name": f"tool_{i}",
+            "description": "Looks up records in an external system. " * 4,
+            "parameters": {
+                "type": "object",
+                "properties": {f"arg_{j}": {"type": "string", "description": f"Argument {j}"} for j in range(8)},
+                "required": [f"arg_{j}" for j in range(3)],
+            },
+        }
+        for i in range(40)
+    ]
+    schema = {"type": "object", "properties": {f"field_{i}": {"type": "string"} for i in range(50)}}
+    return Agent.model_construct(
+        app_id=ObjectId(), name="worker", type=AgentType.WORKER,
+        system_message="You are a helpful worker agent. " * 40,
+        input_schema=schema, output_schema=schema, tools=tools,
+        capabilities=["search", "summarize", "code"], code="print('hello')\n" * 500,
+    ).model_dump(by_alias=True)
+
+def make_flow() -> dict:
+    nodes = [
+        {"id": f"node_{i}", "agent_id": ObjectId(), "type": "worker", "config": {"retries": 3, "timeout": 30},
+         "position": {"x": i * 10, "y": i * 5}, "created_at": datetime.utcnow()}
+        for i in range(300)
+    ]
+    edges = [{"source": f"node_{i}", "target": f"node_{i + 1}", "condition": None} for i in range(299)]
+    return Flow.model_construct(
+        app_id=ObjectId(), name="pipeline", description="A long pipeline", nodes=nodes, edges=edges,
+        entry_point="node_0",
+    ).model_dump(by_alias=True)
+
+def make_messages() -> list:
+    chat_id = ObjectId()
+    return [
+        Message.model_construct(chat_id=chat_id, role=MessageRole.ASSISTANT, text="Here is the answer. " * 30,
+                metadata={"tokens": 120, "model": "local"}).model_dump(by_alias=True)
+        for _ in range(100)
+    ]
+
+def current_path(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content, custom_encoder={ObjectId: str})).body
+
+def orjson_path(content) -> bytes:
+    return BSONResponse(content).body
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=200, help="Renders per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="Measurements per case (best is reported)")
+    args = parser.parse_args()
+
+    cases = {"agent": make_agent(), "flow": make_flow(), "100 messages": make_messages()}
+    print(f"{'payload':<14}{'bytes':>10}{'jsonable_encoder':>20}{'orjson':>12}{'speedup':>10}")
+    for name, content in cases.items():
+        size = len(orjson_path(content))
+        current = min(timeit.repeat(lambda: current_path(content), number=args.number, repeat=args.repeat))
+        fast = min(timeit.repeat(lambda: orjson_path(content), number=args.number, repeat=args.repeat))
+        per_call = lambda total: f"{total / args.number * 1e6:.0f} us"
+        print(f"{name:<14}{size:>10}{per_call(current):>20}{per_call(fast):>12}{current / fast:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
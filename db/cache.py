@@ -0,0 +1,136 @@
+"""
+In-process read-through cache for rarely changing configuration documents
+(apps, agents, flows, integrations).
+
+Entries are bounded per collection (LRU) and expire after a per-collection
+TTL. Writers invalidate entries explicitly; `watch_invalidations` can also
+follow a MongoDB change stream so writes from other processes evict stale
+entries.
+"""
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire `ttl` seconds after insertion."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Cache `value` for `ttl` seconds (default: the cache's TTL)."""
+        ttl = self.ttl if ttl is None else ttl
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+class DocumentCache:
+    """One TTLCache per collection name, keyed by document `_id`."""
+
+    def __init__(self, ttls: Dict[str, float], max_entries: int):
+        self.caches = {name: TTLCache(max_entries, ttl) for name, ttl in ttls.items()}
+
+    def __contains__(self, collection_name: str) -> bool:
+        return collection_name in self.caches
+
+    async def get(self, collection_name: str, key: Hashable, load: Callable[[], Awaitable[Optional[Any]]]):
+        """Return the cached document or call `load` and cache a non-None result."""
+        cache = self.caches[collection_name]
+        value = cache.get(key)
+        if value is None:
+            value = await load()
+            if value is not None:
+                cache.set(key, value)
+        return value
+
+    def lookup(self, collection_name: str, key: Hashable) -> Optional[Any]:
+        return self.caches[collection_name].get(key)
+
+    def store(self, collection_name: str, key: Hashable, value: Any) -> None:
+        self.caches[collection_name].set(key, value)
+
+    def invalidate(self, collection_name: str, key: Hashable) -> None:
+        if collection_name in self.caches:
+            self.caches[collection_name].invalidate(key)
+
+    def clear(self) -> None:
+        for cache in self.caches.values():
+            cache.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: cache.stats() for name, cache in self.caches.items()}
+
+async def watch_invalidations(db, document_cache: DocumentCache, collection_names: Iterable[str]):
+    """
+    Evict cached documents changed by any writer, using a database change stream.
+
+    Change streams need a replica set or sharded cluster; on a standalone
+    server the listener logs a warning and exits, leaving TTL expiry and
+    explicit invalidation in charge.
+    """
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": list(collection_names)},
+        "operationType": {"$in": ["update", "replace", "delete"]},
+    }}]
+    while True:
+        try:
+            async with db.watch(pipeline) as stream:
+                async for change in stream:
+                    document_cache.invalidate(change["ns"]["coll"], change["documentKey"]["_id"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Entries written while the stream was down may be stale.
+            document_cache.clear()
+            if getattr(e, "code", None) == 40573:
+                logger.warning("Change streams unavailable, cache invalidation is local only: %s", e)
+                return
+            logger.warning("Cache change stream failed, reconnecting: %s", e)
+            await asyncio.sleep(1)
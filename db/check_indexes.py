@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Index checker for the Alpha Database API.
+
+Applies the index registry from model.py, then runs `explain()` on every
+query shape served by api.py and exits non-zero if any of them would scan
+a whole collection (COLLSCAN, or a full `_id` index walk with an
+unindexed filter).
+
+Usage:
+    MONGODB_URI=mongodb://localhost:27017 python check_indexes.py
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+from bson import ObjectId
+from pymongo import MongoClient
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from model import INDEXES
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGODB_DATABASE = os.getenv("MONGODB_DATABASE", "alpha")
+
+ID = ObjectId()
+NOW = datetime.utcnow()
+BY_ID = [("_id", 1)]
+BY_CREATED_AT = [("created_at", 1), ("_id", 1)]
+
+# (endpoint, collection, filter, sort) for each query the API issues.
+# Add a shape here whenever an endpoint gains a new filter.
+QUERY_SHAPES: List[Tuple[str, str, Dict[str, Any], Optional[list]]] = [
+    ("list_sessions", "sessions", {"user_id": ID}, BY_ID),
+    ("list_sessions", "sessions", {"user_id": ID, "is_active": True}, BY_ID),
+    ("list_sessions", "sessions", {"is_active": True}, BY_ID),
+    ("get_session_by_token", "sessions", {"session_token": "token"}, None),
+    ("list_chats", "chats", {"user_id": ID}, BY_ID),
+    ("list_chats", "chats", {"session_id": ID}, BY_ID),
+    ("list_chats", "chats", {"app_id": ID}, BY_ID),
+    ("list_chats", "chats", {"agent_id": ID}, BY_ID),
+    ("list_chats", "chats", {"flow_id": ID}, BY_ID),
+    ("list_messages", "messages", {"chat_id": ID}, BY_CREATED_AT),
+    ("get_chat_context", "messages", {"chat_id": ID}, [("created_at", -1), ("_id", -1)]),
+    ("get_state", "states", {"reference_id": ID, "type": "chat"}, None),
+    ("list_apps", "apps", {"app_parent_id": ID}, BY_ID),
+    ("list_plans", "plans", {"app_id": ID}, BY_ID),
+    ("list_agents", "agents", {"app_id": ID}, BY_ID),
+    ("list_agents", "agents", {"app_id": ID, "type": "worker"}, BY_ID),
+    ("list_agents", "agents", {"type": "worker"}, BY_ID),
+    ("list_flows", "flows", {"app_id": ID}, BY_ID),
+    ("list_runs", "runs", {"plan_id": ID}, BY_CREATED_AT),
+    ("list_runs", "runs", {}, BY_CREATED_AT),
+    ("get_app_overview", "plans", {"app_id": ID}, [("_id", -1)]),
+    ("get_app_overview", "runs", {"plan_id": ID, "status": "pending"}, None),
+    ("claim_run", "runs", {"$or": [
+        {"status": "pending"},
+        {"status": "running", "lease_expires_at": {"$lt": NOW}, "attempts": {"$lt": 3}},
+    ]}, BY_CREATED_AT),
+    ("claim_run", "runs", {"status": "pending"}, BY_CREATED_AT),
+    ("claim_run", "runs", {"status": "running", "lease_expires_at": {"$lt": NOW}, "attempts": {"$lt": 3}}, BY_CREATED_AT),
+    ("reclaim_expired", "runs", {"status": "running", "lease_expires_at": {"$lt": NOW}}, None),
+    ("archive_idle", "chats", {"archived_at": None, "updated_at": {"$lt": NOW}}, None),
+    ("search_messages", "messages", {"$text": {"$search": "deploy"}}, [("score", {"$meta": "textScore"}), ("_id", 1)]),
+    ("search_messages", "messages", {"$text": {"$search": "deploy"}, "chat_id": ID}, [("score", {"$meta": "textScore"}), ("_id", 1)]),
+    ("get_run_log", "run_logs", {"run_id": ID}, [("seq", 1)]),
+    ("export_documents", "chats", {"created_at": {"$lt": NOW}}, BY_ID),
+    ("export_documents", "messages", {"created_at": {"$lt": NOW}}, BY_ID),
+    ("export_documents", "runs", {"created_at": {"$lt": NOW}}, BY_ID),
+]
+
+def plan_stages(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    stages = [plan]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages.extend(plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(plan_stages(child))
+    return stages
+
+def find_problem(query: Dict[str, Any], explain: Dict[str, Any]) -> Optional[str]:
+    stages = plan_stages(explain["queryPlanner"]["winningPlan"])
+    names = [stage.get("stage") for stage in stages]
+    if "COLLSCAN" in names:
+        return "COLLSCAN"
+    index_names = [stage.get("indexName") for stage in stages if stage.get("stage") == "IXSCAN"]
+    if query and "_id" not in query and index_names and set(index_names) == {"_id_"}:
+        return "full _id index scan with unindexed filter"
+    return None
+
+def check(db) -> List[str]:
+    failures = []
+    for endpoint, collection_name, query, sort in QUERY_SHAPES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        problem = find_problem(query, cursor.explain())
+        if problem:
+            failures.append(f"{endpoint}: {collection_name}.find({query!r}) -> {problem}")
+    return failures
+
+def main() -> int:
+    db = MongoClient(MONGODB_URI)[MONGODB_DATABASE]
+    for collection_name, indexes in INDEXES.items():
+        db[collection_name].create_indexes(indexes)
+    failures = check(db)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"{len(QUERY_SHAPES) - len(failures)}/{len(QUERY_SHAPES)} query shapes use an index")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
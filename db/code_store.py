@@ -0,0 +1,85 @@
+"""
+Content-addressed storage for App/Agent/Flow code in GridFS.
+
+Code is stored once per SHA-256 digest (the GridFS file `_id`), so documents
+sharing the same program share one blob. Documents keep a small `code_ref`
+({"sha256", "size"}) instead of the inline string.
+"""
+
+from typing import AsyncIterator, Dict, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo.errors import DuplicateKeyError
+import hashlib
+import re
+
+CHUNK_SIZE = 255 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class InvalidRange(ValueError):
+    pass
+
+class CodeStore:
+    def __init__(self, db, bucket_name: str = "code"):
+        self.db = db
+        self.bucket_name = bucket_name
+        self._bucket = None
+
+    @property
+    def files(self):
+        return self.db[f"{self.bucket_name}.files"]
+
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(self.db, bucket_name=self.bucket_name, chunk_size_bytes=CHUNK_SIZE)
+        return self._bucket
+
+    async def put(self, code: str) -> Dict[str, object]:
+        """Store `code` unless a blob with the same digest exists, and return its reference."""
+        data = code.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        if await self.files.find_one({"_id": digest}, {"_id": 1}) is None:
+            try:
+                await self.bucket.upload_from_stream_with_id(digest, digest, data)
+            except DuplicateKeyError:
+                # Stored concurrently by another writer.
+                pass
+        return {"sha256": digest, "size": len(data)}
+
+    async def read(self, digest: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield bytes `start`..`end` (inclusive) of a stored blob, one GridFS chunk at a time."""
+        stream = await self.bucket.open_download_stream(digest)
+        end = stream.length - 1 if end is None else end
+        stream.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await stream.read(min(remaining, CHUNK_SIZE))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `Range: bytes=...` header into an inclusive (start, end).
+
+    Returns None when the header is absent or not a byte range, and raises
+    InvalidRange when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        raise InvalidRange(header)
+    if not first:
+        # Suffix range: the last N bytes.
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise InvalidRange(header)
+    return start, end
@@ -0,0 +1,147 @@
+"""
+Streaming gzip/zstd compression of NDJSON, and Content-Encoding of
+single response bodies.
+
+Both streaming directions work on async iterators of byte chunks, so
+exports, imports and chat archives only hold one chunk and one pending line
+in memory. zstd needs the optional `zstandard` package, brotli response
+encoding the optional `brotli` package.
+"""
+
+from typing import AsyncIterator, Iterator, Optional
+from pathlib import Path
+import asyncio
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DECOMPRESSION_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+CODECS = ("gzip", "zstd")
+MEDIA_TYPES = {"gzip": "application/gzip", "zstd": "application/zstd"}
+EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+FLUSH_BYTES = 1 << 16
+READ_BYTES = 1 << 20
+
+# Response Content-Encodings in order of preference
+BODY_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+class UnsupportedCodec(ValueError):
+    pass
+
+class CorruptData(ValueError):
+    pass
+
+def check_codec(codec: str) -> None:
+    if codec not in CODECS:
+        raise UnsupportedCodec(f"Unknown codec: {codec}")
+    if codec == "zstd" and zstandard is None:
+        raise UnsupportedCodec("zstd requires the zstandard package")
+
+def compressor(codec: str):
+    check_codec(codec)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    return zlib.compressobj(6, zlib.DEFLATED, 31)
+
+class GzipDecompressor:
+    """zlib decompressor that also reads concatenated gzip members."""
+
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(31)
+
+    def decompress(self, data: bytes) -> bytes:
+        output = []
+        while data:
+            output.append(self._decompressor.decompress(data))
+            data = self._decompressor.unused_data
+            if data:
+                self._decompressor = zlib.decompressobj(31)
+        return b"".join(output)
+
+def decompressor(codec: str):
+    check_codec(codec)
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj()
+    return GzipDecompressor()
+
+async def compress_stream(chunks: AsyncIterator[bytes], codec: str) -> AsyncIterator[bytes]:
+    """Compress `chunks`, yielding output roughly every FLUSH_BYTES of input."""
+    stream = compressor(codec)
+    pending = []
+    size = 0
+    async for chunk in chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        if size >= FLUSH_BYTES:
+            output = stream.compress(b"".join(pending))
+            pending, size = [], 0
+            if output:
+                yield output
+    yield stream.compress(b"".join(pending)) + stream.flush()
+
+async def decompress_lines(chunks: AsyncIterator[bytes], codec: str) -> AsyncIterator[bytes]:
+    """Decompress `chunks` and yield the non-empty lines they contain."""
+    stream = decompressor(codec)
+    partial = b""
+    async for chunk in chunks:
+        try:
+            data = stream.decompress(chunk)
+        except DECOMPRESSION_ERRORS as e:
+            raise CorruptData(str(e))
+        lines = (partial + data).split(b"\n")
+        partial = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if partial.strip():
+        yield partial
+
+def _read_chunks(path: Path) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_BYTES):
+            yield chunk
+
+async def read_file(path: Path) -> AsyncIterator[bytes]:
+    """Read `path` in chunks without blocking the event loop."""
+    chunks = _read_chunks(path)
+    try:
+        while chunk := await asyncio.to_thread(next, chunks, b""):
+            yield chunk
+    finally:
+        chunks.close()
+
+def accepted_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The preferred BODY_ENCODINGS entry allowed by an Accept-Encoding header, if any."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+    for encoding in BODY_ENCODINGS:
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def encode_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return zlib.compress(body, 6, 31)
@@ -0,0 +1,60 @@
+"""
+Conditional GET validators for configuration documents.
+
+The ETag of a document is derived from its `updated_at`, which every write
+to these collections sets, so revalidating a client's copy needs that one
+field rather than the document. ETags are weak, as the same representation
+may be sent compressed or not, and include the projection since `?fields=`
+changes the body. Documents without `updated_at` fall back to a hash of
+the serialized body.
+"""
+
+from typing import Dict, Optional
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
+
+from serialization import dumps
+
+def projection_key(projection: Optional[Dict[str, int]]) -> str:
+    if not projection:
+        return "full"
+    return hashlib.blake2b(dumps(sorted(projection.items())), digest_size=6).hexdigest()
+
+def version_tag(updated_at: Optional[datetime], projection: Optional[Dict[str, int]]) -> Optional[str]:
+    """ETag of the `projection` of a document last written at `updated_at`."""
+    if not isinstance(updated_at, datetime):
+        return None
+    millis = int(updated_at.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return f'W/"{millis:x}-{projection_key(projection)}"'
+
+def content_tag(body: bytes) -> str:
+    return f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+def validator_headers(etag: str, updated_at: Optional[datetime]) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if isinstance(updated_at, datetime):
+        headers["Last-Modified"] = format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def not_modified(if_none_match: Optional[str], if_modified_since: Optional[str], etag: str, updated_at: Optional[datetime]) -> bool:
+    """
+    Whether the client's copy is current. If-None-Match uses weak
+    comparison and, when present, If-Modified-Since is ignored (RFC 9110).
+    """
+    if if_none_match is not None:
+        tags = [tag for tag in if_none_match.split(",") if tag.strip()]
+        return any(tag.strip() == "*" or _opaque(tag) == _opaque(etag) for tag in tags)
+    if if_modified_since is not None and isinstance(updated_at, datetime):
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return updated_at.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
@@ -0,0 +1,78 @@
+"""
+Process-local MongoDB connection for the Alpha Database API.
+
+The Motor client is created by the API lifespan (after any worker fork)
+rather than at import time. Handlers hold `CollectionRef`s, which resolve
+to the live collection on use; `for_lists` gives the same collection with
+the read preference configured for list endpoints, while writes and
+single-document reads stay on the primary.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+class Database:
+    def __init__(self, uri: str, name: str, list_read_preference: str = "primary", **client_options: Any):
+        if list_read_preference not in READ_PREFERENCES:
+            raise ValueError(f"Unknown read preference: {list_read_preference}")
+        self.uri = uri
+        self.name = name
+        self.list_read_preference = READ_PREFERENCES[list_read_preference]
+        self.client_options = client_options
+        self.client: Optional[AsyncIOMotorClient] = None
+        self._db = None
+        self._collections: Dict[Tuple[str, bool], Any] = {}
+
+    def connect(self, **extra_options: Any) -> None:
+        self.client = AsyncIOMotorClient(self.uri, **self.client_options, **extra_options)
+        self._db = self.client[self.name]
+        self._collections.clear()
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self._db = None
+        self._collections.clear()
+
+    @property
+    def db(self):
+        if self._db is None:
+            raise RuntimeError("MongoDB client is not connected; it is opened by the API lifespan")
+        return self._db
+
+    def collection(self, name: str, for_lists: bool = False):
+        key = (name, for_lists)
+        collection = self._collections.get(key)
+        if collection is None:
+            collection = self.db[name]
+            if for_lists and self.list_read_preference != ReadPreference.PRIMARY:
+                collection = collection.with_options(read_preference=self.list_read_preference)
+            self._collections[key] = collection
+        return collection
+
+    def __getitem__(self, name: str) -> "CollectionRef":
+        return CollectionRef(self, name)
+
+class CollectionRef:
+    """Stand-in for a Motor collection that resolves against the connected client on use."""
+
+    def __init__(self, database: Database, name: str):
+        self.database = database
+        self.name = name
+
+    @property
+    def for_lists(self):
+        return self.database.collection(self.name, for_lists=True)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.database.collection(self.name), attr)
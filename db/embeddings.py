@@ -0,0 +1,80 @@
+"""
+Text embedders for semantic search.
+
+An embedder has a `dim` and an `embed(texts)` method returning a float32
+array of shape (len(texts), dim) with L2-normalized rows, so the dot
+product of two vectors is their cosine similarity.
+
+`HashingEmbedder` needs no model download and is the default; it captures
+shared words and word pairs rather than meaning. `SentenceTransformerEmbedder`
+runs a sentence-transformers model locally (`pip install sentence-transformers`),
+and `load_embedder` accepts any other implementation as `module:attribute`.
+"""
+
+from typing import List, Protocol
+import importlib
+import re
+import zlib
+
+import numpy as np
+
+DEFAULT_HASHING_DIM = 512
+DEFAULT_SENTENCE_TRANSFORMER = "all-MiniLM-L6-v2"
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+class Embedder(Protocol):
+    dim: int
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        ...
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32, copy=False)
+
+class HashingEmbedder:
+    """Signed feature hashing of lowercased words and word bigrams."""
+
+    def __init__(self, dim: int = DEFAULT_HASHING_DIM):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = TOKEN_PATTERN.findall(text.lower())
+            features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+            if not features:
+                continue
+            hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.uint32, count=len(features))
+            # The top bit picks the sign so that colliding features tend to cancel out.
+            signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+            np.add.at(vectors[row], hashes % self.dim, signs)
+        return normalize(vectors)
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name: str = DEFAULT_SENTENCE_TRANSFORMER, batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32, copy=False)
+
+def load_embedder(spec: str) -> Embedder:
+    """
+    `hashing[:<dim>]`, `sentence-transformers[:<model>]`, or `module:attribute`
+    naming an embedder or a no-argument factory of one.
+    """
+    name, _, argument = spec.partition(":")
+    if name == "hashing":
+        return HashingEmbedder(int(argument) if argument else DEFAULT_HASHING_DIM)
+    if name == "sentence-transformers":
+        return SentenceTransformerEmbedder(argument or DEFAULT_SENTENCE_TRANSFORMER)
+    if not argument:
+        raise ValueError(f"Unknown embedder {spec!r}; custom embedders are given as module:attribute")
+    target = getattr(importlib.import_module(name), argument)
+    return target() if isinstance(target, type) or not hasattr(target, "embed") else target
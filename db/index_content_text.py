@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Backfill `content_text` on messages written before it existed.
+
+The API fills `content_text` (the text-typed content entries, see
+model.Message) on every insert; older messages lack the field and are
+only found by message search through their `text`. This sets it on every
+message that has no `content_text` yet, in unordered `bulk_write` batches,
+so the `messages_text` index picks their content up. Messages without text
+content get `null` and are not read again. It is safe to run while the API
+is serving and to re-run, e.g. after restoring older archives.
+
+Usage:
+    MONGODB_URI=mongodb://localhost:27017 python index_content_text.py
+"""
+
+from pathlib import Path
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+from pymongo import UpdateOne
+
+sys.path.append(str(Path(__file__).parent))
+
+from database import Database
+from model import join_text_content
+
+logger = logging.getLogger(__name__)
+
+async def backfill(collection, batch_size: int) -> int:
+    updates, updated = [], 0
+    query = {"content_text": {"$exists": False}}
+    async for doc in collection.find(query, {"content": 1}).batch_size(batch_size):
+        text = join_text_content((part.get("type"), part.get("data")) for part in doc.get("content") or [] if isinstance(part, dict))
+        updates.append(UpdateOne({"_id": doc["_id"], **query}, {"$set": {"content_text": text}}))
+        if len(updates) >= batch_size:
+            updated += (await collection.bulk_write(updates, ordered=False)).modified_count
+            updates = []
+    if updates:
+        updated += (await collection.bulk_write(updates, ordered=False)).modified_count
+    return updated
+
+async def main(args) -> None:
+    database = Database(os.getenv("MONGODB_URI", "mongodb://localhost:27017"), os.getenv("MONGODB_DATABASE", "alpha"))
+    database.connect()
+    try:
+        updated = await backfill(database["messages"], args.batch_size)
+        logger.info("messages: set content_text on %d messages", updated)
+    finally:
+        database.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Backfill the semantic search indexes and partition them for IVF search.
+
+Embeds every message and agent that is not in its index yet, then, with
+`--lists N`, trains N IVF lists per index. The API writer process
+(SEMANTIC_INDEX_WRITER) also catches up on its own when it starts, so this
+is mainly needed to train the lists. An index directory has a single
+writer: run this while no API process has SEMANTIC_INDEX_WRITER set. API
+processes reading the index pick up the new rows on their next search.
+
+Usage:
+    MONGODB_URI=mongodb://localhost:27017 python index_vectors.py --lists 1024
+"""
+
+from pathlib import Path
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+sys.path.append(str(Path(__file__).parent))
+
+from database import Database
+from embeddings import load_embedder
+from vector_index import SEMANTIC_SOURCES, VectorIndex
+
+logger = logging.getLogger(__name__)
+
+async def backfill(collection, index: VectorIndex, embedder, text_of, fields, batch_size: int) -> int:
+    ids, texts, added = [], [], 0
+    async for doc in collection.find({}, {field: 1 for field in fields}).batch_size(batch_size):
+        text = text_of(doc)
+        if not text or doc["_id"] in index:
+            continue
+        ids.append(doc["_id"])
+        texts.append(text)
+        if len(ids) >= batch_size:
+            index.add(ids, embedder.embed(texts))
+            added += len(ids)
+            ids, texts = [], []
+    if ids:
+        index.add(ids, embedder.embed(texts))
+        added += len(ids)
+    return added
+
+async def main(args) -> None:
+    database = Database(os.getenv("MONGODB_URI", "mongodb://localhost:27017"), os.getenv("MONGODB_DATABASE", "alpha"))
+    database.connect()
+    embedder = load_embedder(args.embedder)
+    try:
+        for name in args.collections:
+            text_of, fields = SEMANTIC_SOURCES[name]
+            index = VectorIndex(Path(args.directory) / name, embedder.dim)
+            added = await backfill(database[name], index, embedder, text_of, fields, args.batch_size)
+            logger.info("%s: added %d vectors, %d in total", name, added, len(index))
+            if args.lists and len(index):
+                index.train_ivf(args.lists)
+                logger.info("%s: partitioned into %d lists", name, len(index.centroids))
+    finally:
+        database.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--directory", default=os.getenv("SEMANTIC_INDEX_DIR") or "vectors")
+    parser.add_argument("--embedder", default=os.getenv("SEMANTIC_EMBEDDER", "hashing"))
+    parser.add_argument("--collections", nargs="+", choices=sorted(SEMANTIC_SOURCES), default=sorted(SEMANTIC_SOURCES))
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--lists", type=int, default=0, help="Train this many IVF lists per index (0: exact search only)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main(parser.parse_args()))
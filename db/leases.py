@@ -0,0 +1,100 @@
+"""
+Run leases: exactly-once dispatch of PENDING runs across workers.
+
+A worker claims a run with one `find_one_and_update`, which moves it to
+RUNNING and records `lease_owner` and `lease_expires_at`. The owner renews
+the lease while it works and finishes the run under the same owner check.
+A run whose lease expired (crashed or stalled worker) can be claimed again
+until it has been attempted `max_attempts` times; `reclaim_expired` then
+marks it FAILED.
+"""
+
+from typing import Any, Dict, Optional
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from model import RunStatus
+
+# Runs are returned without the legacy embedded execution log.
+CLAIM_PROJECTION = {"execution_log": 0}
+
+async def claim_run(collection, worker: str, lease_seconds: float, max_attempts: int) -> Optional[Dict[str, Any]]:
+    """Lease the oldest claimable run to `worker`, or return None when there is none."""
+    now = datetime.utcnow()
+    return await collection.find_one_and_update(
+        {"$or": [
+            {"status": RunStatus.PENDING},
+            {"status": RunStatus.RUNNING, "lease_expires_at": {"$lt": now}, "attempts": {"$lt": max_attempts}},
+        ]},
+        {
+            "$set": {
+                "status": RunStatus.RUNNING,
+                "lease_owner": worker,
+                "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                "started_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1), ("_id", 1)],
+        projection=CLAIM_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+
+def owned(run_id: ObjectId, worker: str) -> Dict[str, Any]:
+    return {"_id": run_id, "status": RunStatus.RUNNING, "lease_owner": worker}
+
+async def renew_lease(collection, run_id: ObjectId, worker: str, lease_seconds: float) -> Optional[datetime]:
+    """Extend `worker`'s lease; None when the run is no longer leased to it."""
+    expires_at = datetime.utcnow() + timedelta(seconds=lease_seconds)
+    result = await collection.update_one(owned(run_id, worker), {"$set": {"lease_expires_at": expires_at}})
+    return expires_at if result.matched_count else None
+
+async def finish_run(
+    collection,
+    run_id: ObjectId,
+    worker: str,
+    status: RunStatus,
+    output_data: Optional[Dict[str, Any]] = None,
+    error_message: Optional[str] = None,
+) -> bool:
+    """Record the outcome of a leased run; False when the lease was lost."""
+    update = {"status": status, "completed_at": datetime.utcnow(), "lease_expires_at": None}
+    if output_data is not None:
+        update["output_data"] = output_data
+    if error_message is not None:
+        update["error_message"] = error_message
+    result = await collection.update_one(owned(run_id, worker), {"$set": update})
+    return result.matched_count > 0
+
+async def release_run(collection, run_id: ObjectId, worker: str) -> bool:
+    """Hand a leased run back to the queue without counting the attempt."""
+    result = await collection.update_one(
+        owned(run_id, worker),
+        {
+            "$set": {"status": RunStatus.PENDING, "lease_owner": None, "lease_expires_at": None},
+            "$inc": {"attempts": -1},
+        },
+    )
+    return result.matched_count > 0
+
+async def reclaim_expired(collection, max_attempts: int) -> Dict[str, int]:
+    """
+    Return expired leases to PENDING, or mark them FAILED once they have
+    used up `max_attempts`.
+    """
+    now = datetime.utcnow()
+    expired = {"status": RunStatus.RUNNING, "lease_expires_at": {"$lt": now}}
+    failed = await collection.update_many(
+        {**expired, "attempts": {"$gte": max_attempts}},
+        {"$set": {
+            "status": RunStatus.FAILED,
+            "error_message": f"Lease expired after {max_attempts} attempts",
+            "completed_at": now,
+            "lease_expires_at": None,
+        }},
+    )
+    requeued = await collection.update_many(
+        {**expired, "attempts": {"$lt": max_attempts}},
+        {"$set": {"status": RunStatus.PENDING, "lease_owner": None, "lease_expires_at": None}},
+    )
+    return {"requeued": requeued.modified_count, "failed": failed.modified_count}
@@ -0,0 +1,77 @@
+"""
+Request-scoped batch loading of documents by `_id`.
+
+`DocumentLoader.load` queues an id and returns once its batch is fetched;
+every id requested for the same collection and projection before the event
+loop next runs the dispatch callback is fetched with one `$in` query.
+Repeated ids are loaded once per request. Documents of cached collections
+are served from, and stored in, the `DocumentCache` when no projection is
+given.
+"""
+
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+from bson import ObjectId
+import asyncio
+
+BatchKey = Tuple[str, Hashable]
+
+def projection_key(projection: Optional[Dict[str, int]]) -> Hashable:
+    return tuple(sorted(projection.items())) if projection else None
+
+class DocumentLoader:
+    def __init__(self, database, cache=None):
+        self.database = database
+        self.cache = cache
+        self.queries = 0
+        self._futures: Dict[Tuple[BatchKey, ObjectId], asyncio.Future] = {}
+        self._queued: Dict[BatchKey, Dict[ObjectId, asyncio.Future]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _cached(self, collection_name: str, projection: Optional[Dict[str, int]]) -> bool:
+        return self.cache is not None and not projection and collection_name in self.cache
+
+    async def load(self, collection_name: str, object_id: ObjectId, projection: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+        batch_key = (collection_name, projection_key(projection))
+        future = self._futures.get((batch_key, object_id))
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[(batch_key, object_id)] = loop.create_future()
+            cached = self.cache.lookup(collection_name, object_id) if self._cached(collection_name, projection) else None
+            if cached is not None:
+                future.set_result(cached)
+            else:
+                queue = self._queued.get(batch_key)
+                if queue is None:
+                    queue = self._queued[batch_key] = {}
+                    loop.call_soon(self._dispatch, batch_key, projection)
+                queue[object_id] = future
+        # Shielded so one caller being cancelled does not fail the others.
+        return await asyncio.shield(future)
+
+    async def load_many(self, collection_name: str, object_ids: List[ObjectId], projection: Optional[Dict[str, int]] = None) -> List[Optional[Dict[str, Any]]]:
+        """Documents in the order of `object_ids`, None where a document does not exist."""
+        return list(await asyncio.gather(*(self.load(collection_name, object_id, projection) for object_id in object_ids)))
+
+    def _dispatch(self, batch_key: BatchKey, projection: Optional[Dict[str, int]]) -> None:
+        queue = self._queued.pop(batch_key)
+        task = asyncio.ensure_future(self._fetch(batch_key[0], queue, projection))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, collection_name: str, queue: Dict[ObjectId, asyncio.Future], projection: Optional[Dict[str, int]]) -> None:
+        self.queries += 1
+        try:
+            docs = await self.database[collection_name].find({"_id": {"$in": list(queue)}}, projection).to_list(length=None)
+        except Exception as e:
+            for future in queue.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        found = {doc["_id"]: doc for doc in docs}
+        cache = self._cached(collection_name, projection)
+        for object_id, future in queue.items():
+            doc = found.get(object_id)
+            if cache and doc is not None:
+                self.cache.store(collection_name, object_id, doc)
+            if not future.done():
+                future.set_result(doc)
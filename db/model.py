@@ -1,14 +1,32 @@
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any, Union
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, model_validator
+from pydantic_core import core_schema
+from typing import Iterable, List, Literal, Optional, Dict, Any, Tuple, Union
 from datetime import datetime
 from enum import Enum
 from bson import ObjectId
+from pymongo import ASCENDING, TEXT, IndexModel
+import functools
+import json
+import math
 
 # Pydantic v2 compatible ObjectId
 class PyObjectId(ObjectId):
     @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        # ObjectId instances pass an isinstance check without a Python call; strings are parsed.
+        from_str = core_schema.chain_schema([
+            core_schema.str_schema(),
+            core_schema.no_info_plain_validator_function(cls.validate),
+        ])
+        return core_schema.json_or_python_schema(
+            json_schema=from_str,
+            python_schema=core_schema.union_schema(
+                [core_schema.is_instance_schema(ObjectId), from_str],
+                custom_error_type="object_id",
+                custom_error_message="Invalid ObjectId",
+            ),
+            serialization=core_schema.plain_serializer_function_ser_schema(str, when_used="json"),
+        )
 
     @classmethod
     def validate(cls, v):
@@ -48,6 +66,12 @@ class MessageContent(BaseModel):
     """Base content structure for different message types"""
     type: MessageContentType
     data: Union[str, Dict[str, Any], List[Any]]
+
+class CodeRef(BaseModel):
+    """Reference to code stored in GridFS, addressed by the SHA-256 of its UTF-8 bytes"""
+    sha256: str
+    size: int
+
 class StateType(str, Enum):
     CHAT = "chat"
     APP = "app"
@@ -114,9 +138,27 @@ class Chat(BaseModel):
     title: str
     description: Optional[str] = None
     metadata: Dict[str, Any] = Field(default_factory=dict)
+    # Set while the chat's messages are moved out to an archive file (see archive.py).
+    archived_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+# Characters per token used to estimate `Message.token_count`.
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: Optional[str], content: List[MessageContent]) -> int:
+    """Approximate token count of a message; at least 1 for the role/turn overhead."""
+    chars = len(text or "")
+    for part in content:
+        data = part.data if isinstance(part.data, str) else json.dumps(part.data, separators=(",", ":"), default=str)
+        chars += len(data)
+    return max(1, math.ceil(chars / CHARS_PER_TOKEN))
+
+def join_text_content(parts: Iterable[Tuple[Any, Any]]) -> Optional[str]:
+    """The string data of the text-typed `(type, data)` content entries, one per line."""
+    texts = [data for type_, data in parts if type_ == MessageContentType.TEXT and isinstance(data, str)]
+    return "\n".join(texts) or None
+
 class Message(BaseModel):
     model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True, json_encoders={ObjectId: str})
     id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
@@ -125,14 +167,31 @@ class Message(BaseModel):
     content: List[MessageContent] = Field(default_factory=list)
     text: Optional[str] = None
     metadata: Dict[str, Any] = Field(default_factory=dict)
+    # Computed on insert unless the client sends a count from its own tokenizer.
+    token_count: Optional[int] = Field(default=None, ge=0)
+    # The text-typed content entries, joined for the full-text index.
+    content_text: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    @model_validator(mode="after")
+    def fill_token_count(self):
+        if self.token_count is None:
+            self.token_count = estimate_tokens(self.text, self.content)
+        return self
+
+    @model_validator(mode="after")
+    def fill_content_text(self):
+        self.content_text = join_text_content((part.type, part.data) for part in self.content)
+        return self
+
 class State(BaseModel):
     model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True, json_encoders={ObjectId: str})
     id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
     type: StateType
     reference_id: PyObjectId
     state_data: Dict[str, Any] = Field(default_factory=dict)
+    # Incremented by every write; PATCH /states/{id} checks it against If-Match.
+    version: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -148,6 +207,7 @@ class App(BaseModel):
     deployment_url: Optional[str] = None
     repository_url: Optional[str] = None
     code: Optional[str] = None
+    code_ref: Optional[CodeRef] = None
     language: Optional[str] = None
     entry_point: Optional[str] = None
     dependencies: List[str] = Field(default_factory=list)
@@ -158,6 +218,13 @@ class App(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class PlanGraph(BaseModel):
+    """Compiled form of Plan.dependencies (see plan_graph.py)"""
+    order: List[str] = Field(default_factory=list)
+    levels: List[List[str]] = Field(default_factory=list)
+    critical_path: List[str] = Field(default_factory=list)
+    critical_path_duration: float = 0
+
 class Plan(BaseModel):
     model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True, json_encoders={ObjectId: str})
     id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
@@ -168,6 +235,7 @@ class Plan(BaseModel):
     tasks: List[Dict[str, Any]] = Field(default_factory=list)
     dependencies: Dict[str, List[str]] = Field(default_factory=dict)
     estimated_duration: Optional[int] = None
+    graph: Optional[PlanGraph] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -184,6 +252,7 @@ class Agent(BaseModel):
     integrations: List[str] = Field(default_factory=list)
     capabilities: List[str] = Field(default_factory=list)
     code: Optional[str] = None
+    code_ref: Optional[CodeRef] = None
     language: Optional[str] = None
     entry_point: Optional[str] = None
     dependencies: List[str] = Field(default_factory=list)
@@ -206,6 +275,7 @@ class Flow(BaseModel):
     edges: List[Dict[str, Any]] = Field(default_factory=list)
     entry_point: str
     code: Optional[str] = None
+    code_ref: Optional[CodeRef] = None
     language: Optional[str] = None
     entry_point_code: Optional[str] = None
     dependencies: List[str] = Field(default_factory=list)
@@ -238,7 +308,106 @@ class Run(BaseModel):
     input_data: Dict[str, Any] = Field(default_factory=dict)
     output_data: Dict[str, Any] = Field(default_factory=dict)
     execution_log: List[Dict[str, Any]] = Field(default_factory=list)
+    log_count: int = 0
+    log_tail: List[Dict[str, Any]] = Field(default_factory=list)
     error_message: Optional[str] = None
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow) 
\ No newline at end of file
+    # Set while a worker holds the run (see leases.py).
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    attempts: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class RunLease(BaseModel):
+    """Claim or heartbeat request of a run worker"""
+    worker: str = Field(min_length=1)
+    lease_seconds: Optional[float] = Field(default=None, gt=0)
+
+class RunFinish(BaseModel):
+    """Outcome reported by the worker holding a run's lease"""
+    worker: str = Field(min_length=1)
+    status: Literal[RunStatus.COMPLETED, RunStatus.FAILED]
+    output_data: Optional[Dict[str, Any]] = None
+    error_message: Optional[str] = None
+
+class RunLogEntry(BaseModel):
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True, json_encoders={ObjectId: str})
+    id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
+    run_id: PyObjectId
+    seq: int
+    data: Dict[str, Any] = Field(default_factory=dict)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+@functools.lru_cache(maxsize=None)
+def list_adapter(model: type) -> TypeAdapter:
+    """Validator/serializer for a list of `model`, built once per model."""
+    return TypeAdapter(List[model])
+
+# Indexes backing the query shapes served by api.py, keyed by collection name.
+# List endpoints page by `_id` (or `created_at`, `_id`), so each filter index
+# ends with the sort keys.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "sessions": [
+        IndexModel([("user_id", ASCENDING), ("is_active", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("is_active", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("session_token", ASCENDING)], unique=True),
+        # TTL: MongoDB deletes sessions once `expires_at` has passed (sessions without it are kept).
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "chats": [
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("session_id", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("app_id", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("agent_id", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("flow_id", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("archived_at", ASCENDING), ("updated_at", ASCENDING)]),
+        # GET /export?before= reads in `_id` order and filters `created_at` from the index keys.
+        IndexModel([("_id", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    "messages": [
+        IndexModel([("chat_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+        # A collection has at most one text index; GET /messages/search filters chats after it.
+        IndexModel([("text", TEXT), ("content_text", TEXT)], name="messages_text"),
+        # GET /export?before= reads in `_id` order and filters `created_at` from the index keys.
+        IndexModel([("_id", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    "states": [
+        # One state per (reference_id, type): concurrent bulk upserts of a key cannot both insert.
+        IndexModel([("reference_id", ASCENDING), ("type", ASCENDING)], unique=True),
+    ],
+    "apps": [
+        IndexModel([("app_parent_id", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "plans": [
+        IndexModel([("app_id", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "agents": [
+        IndexModel([("app_id", ASCENDING), ("type", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("type", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "flows": [
+        IndexModel([("app_id", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "runs": [
+        IndexModel([("plan_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+        # Covers the run counts by status of /apps/{app_id}/overview.
+        IndexModel([("plan_id", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)]),
+        # GET /export?before= reads in `_id` order and filters `created_at` from the index keys.
+        IndexModel([("_id", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    "run_logs": [
+        IndexModel([("run_id", ASCENDING), ("seq", ASCENDING)], unique=True),
+    ],
+}
+
+# Blob fields left out of "summary" views (?view=summary), keyed by collection name.
+SUMMARY_EXCLUDES: Dict[str, List[str]] = {
+    "apps": ["code"],
+    "agents": ["code", "tools", "input_schema", "output_schema"],
+    "flows": ["code", "nodes", "edges"],
+    "runs": ["execution_log"],
+}
@@ -0,0 +1,376 @@
+"""
+Instrumentation for the Alpha Database API.
+
+- `PoolMetrics` is a CMAP (connection pool) event listener tracking, per
+  server, open and in-use connections and how long requests wait to check
+  one out.
+- `CommandMetrics` is a command listener recording per-collection,
+  per-command durations and document counts, and logging slow commands
+  with the shape of their filter.
+- `RouteMetricsMiddleware` is an ASGI middleware recording per-route
+  latency and request/response sizes.
+
+Each exposes `prometheus()`, the lines served by `/metrics` in the
+Prometheus text exposition format.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from bisect import bisect_left
+from pymongo import monitoring
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the checkout wait histogram buckets.
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+# Upper bounds (seconds) of the request and command latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds (bytes) of the payload size histogram buckets.
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], self.counts))
+
+    def prometheus(self, name: str, labels: Dict[str, str]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip([str(bound) for bound in self.buckets] + ["+Inf"], self.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels({**labels, 'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(labels)} {self.sum}")
+        lines.append(f"{name}_count{format_labels(labels)} {self.count}")
+        return lines
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        '%s="%s"' % (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+def metric_header(name: str, kind: str, help_text: str) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+class PoolStats:
+    def __init__(self):
+        self.open = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait = Histogram(WAIT_BUCKETS)
+
+    def record_wait(self, seconds: float) -> None:
+        self.wait.observe(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "open": self.open,
+            "in_use": self.in_use,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "wait_seconds_total": self.wait.sum,
+            "wait_seconds_max": self.wait.max,
+            "wait_buckets": self.wait.snapshot(),
+        }
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Connection pool listener. Events fire on driver threads: a checkout's
+    started and finished events arrive on the same thread, so the start
+    time is kept in a thread-local.
+    """
+
+    def __init__(self):
+        self.pools: Dict[str, PoolStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stats(self, address) -> PoolStats:
+        key = "%s:%s" % address
+        stats = self.pools.get(key)
+        if stats is None:
+            stats = self.pools.setdefault(key, PoolStats())
+        return stats
+
+    def _wait(self) -> float:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def pool_created(self, event):
+        with self._lock:
+            self._stats(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools.pop("%s:%s" % event.address, None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._stats(event.address).open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.open = max(stats.open - 1, 0)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        wait = self._wait()
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.checkout_failures += 1
+            stats.record_wait(wait)
+
+    def connection_checked_out(self, event):
+        wait = self._wait()
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.checkouts += 1
+            stats.in_use += 1
+            stats.record_wait(wait)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.in_use = max(stats.in_use - 1, 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {address: stats.snapshot() for address, stats in self.pools.items()}
+
+    def prometheus(self) -> List[str]:
+        connections = metric_header("alpha_mongodb_pool_connections", "gauge", "Pooled connections by state.")
+        failures = metric_header("alpha_mongodb_pool_checkout_failures_total", "counter", "Failed connection checkouts.")
+        waits = metric_header("alpha_mongodb_pool_checkout_wait_seconds", "histogram", "Time spent waiting for a pooled connection.")
+        with self._lock:
+            for address, stats in self.pools.items():
+                connections.append(f"alpha_mongodb_pool_connections{format_labels({'address': address, 'state': 'open'})} {stats.open}")
+                connections.append(f"alpha_mongodb_pool_connections{format_labels({'address': address, 'state': 'in_use'})} {stats.in_use}")
+                failures.append(f"alpha_mongodb_pool_checkout_failures_total{format_labels({'address': address})} {stats.checkout_failures}")
+                waits.extend(stats.wait.prometheus("alpha_mongodb_pool_checkout_wait_seconds", {"address": address}))
+        return connections + failures + waits
+
+# Arguments holding the filter of each command, for slow query logging.
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "delete": "deletes",
+    "update": "updates",
+}
+
+def query_shape(value: Any) -> Any:
+    """The structure of a filter with its values replaced by their type names."""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = query_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return type(value).__name__
+
+def command_filter(command_name: str, command: Dict[str, Any]) -> Any:
+    if command_name == "aggregate":
+        return [stage for stage in command.get("pipeline", []) if "$match" in stage]
+    field = FILTER_FIELDS.get(command_name)
+    if field is None:
+        return None
+    value = command.get(field)
+    if command_name in ("delete", "update") and value:
+        return value[0].get("q")
+    return value
+
+def reply_documents(command_name: str, reply: Dict[str, Any]) -> int:
+    """Number of documents returned or written by a command."""
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    if command_name == "findAndModify":
+        return 0 if reply.get("value") is None else 1
+    n = reply.get("n")
+    return n if isinstance(n, int) else 0
+
+class CommandStats:
+    def __init__(self):
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.documents = 0
+        self.failures = 0
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Command listener. Durations come from the driver's events; commands
+    slower than `slow_query_ms` are logged with their filter shape.
+    """
+
+    def __init__(self, slow_query_ms: Optional[float] = None):
+        self.slow_query_seconds = slow_query_ms / 1000 if slow_query_ms else None
+        self.commands: Dict[Tuple[str, str], CommandStats] = {}
+        self._pending: Dict[Tuple[Any, int], Tuple[str, str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _collection(command_name: str, command: Dict[str, Any]) -> str:
+        if command_name == "getMore":
+            return command.get("collection", "")
+        target = command.get(command_name)
+        return target if isinstance(target, str) else ""
+
+    def _finish(self, event, documents: int, failed: bool) -> None:
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        database_name, collection, command = pending
+        seconds = event.duration_micros / 1e6
+        with self._lock:
+            stats = self.commands.get((collection, event.command_name))
+            if stats is None:
+                stats = self.commands.setdefault((collection, event.command_name), CommandStats())
+            stats.duration.observe(seconds)
+            stats.documents += documents
+            stats.failures += failed
+        if self.slow_query_seconds is not None and seconds >= self.slow_query_seconds:
+            logger.warning(
+                "Slow MongoDB %s on %s.%s: %.1f ms, filter %s",
+                event.command_name, database_name, collection, seconds * 1000,
+                query_shape(command_filter(event.command_name, command)),
+            )
+
+    def started(self, event):
+        self._pending[(event.connection_id, event.request_id)] = (
+            event.database_name, self._collection(event.command_name, event.command), event.command,
+        )
+
+    def succeeded(self, event):
+        self._finish(event, reply_documents(event.command_name, event.reply), failed=False)
+
+    def failed(self, event):
+        self._finish(event, 0, failed=True)
+
+    def prometheus(self) -> List[str]:
+        durations = metric_header("alpha_mongodb_command_duration_seconds", "histogram", "MongoDB command duration.")
+        documents = metric_header("alpha_mongodb_command_documents_total", "counter", "Documents returned or written by MongoDB commands.")
+        failures = metric_header("alpha_mongodb_command_failures_total", "counter", "Failed MongoDB commands.")
+        with self._lock:
+            for (collection, command_name), stats in sorted(self.commands.items()):
+                labels = {"collection": collection, "command": command_name}
+                durations.extend(stats.duration.prometheus("alpha_mongodb_command_duration_seconds", labels))
+                documents.append(f"alpha_mongodb_command_documents_total{format_labels(labels)} {stats.documents}")
+                failures.append(f"alpha_mongodb_command_failures_total{format_labels(labels)} {stats.failures}")
+        return durations + documents + failures
+
+class RouteStats:
+    def __init__(self):
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.request_size = Histogram(SIZE_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.statuses: Dict[int, int] = {}
+
+class RouteMetrics:
+    """
+    Latency, payload sizes and status codes per route template
+    (`/users/{user_id}`), so ids do not create new series. Requests that
+    match no route are grouped under "unmatched". Updated on the event loop.
+    """
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteStats] = {}
+
+    def record(self, method: str, path: str, status: int, seconds: float, request_size: int, response_size: int) -> None:
+        stats = self.routes.get((method, path))
+        if stats is None:
+            stats = self.routes[(method, path)] = RouteStats()
+        stats.duration.observe(seconds)
+        stats.request_size.observe(request_size)
+        stats.response_size.observe(response_size)
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def prometheus(self) -> List[str]:
+        requests = metric_header("alpha_http_requests_total", "counter", "HTTP requests by route and status.")
+        durations = metric_header("alpha_http_request_duration_seconds", "histogram", "HTTP request latency.")
+        request_sizes = metric_header("alpha_http_request_size_bytes", "histogram", "HTTP request body size.")
+        response_sizes = metric_header("alpha_http_response_size_bytes", "histogram", "HTTP response body size.")
+        for (method, path), stats in sorted(self.routes.items()):
+            labels = {"method": method, "route": path}
+            for status, count in sorted(stats.statuses.items()):
+                requests.append(f"alpha_http_requests_total{format_labels({**labels, 'status': str(status)})} {count}")
+            durations.extend(stats.duration.prometheus("alpha_http_request_duration_seconds", labels))
+            request_sizes.extend(stats.request_size.prometheus("alpha_http_request_size_bytes", labels))
+            response_sizes.extend(stats.response_size.prometheus("alpha_http_response_size_bytes", labels))
+        return requests + durations + request_sizes + response_sizes
+
+class RouteMetricsMiddleware:
+    """ASGI middleware feeding `RouteMetrics`; body sizes are counted as the messages pass through."""
+
+    def __init__(self, app, metrics: RouteMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        request_size = 0
+        response_size = 0
+        status = 500
+
+        async def counting_receive():
+            nonlocal request_size
+            message = await receive()
+            request_size += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal response_size, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            route = scope.get("route")
+            self.metrics.record(
+                scope["method"], getattr(route, "path", "unmatched"), status,
+                time.perf_counter() - started, request_size, response_size,
+            )
+
+def render_prometheus(sections: Iterable[List[str]]) -> str:
+    return "\n".join(line for section in sections for line in section) + "\n"
@@ -0,0 +1,82 @@
+"""
+App overview in one aggregation.
+
+`overview_pipeline` starts from the app document and pulls in the newest
+plans, agents and flows with `$lookup` sub-pipelines, each served by the
+`app_id` index of its collection, plus the per-collection counts (agents by
+type, from the covering `(app_id, type, _id)` index). Run counts by status
+are grouped in the same pipeline for the returned plans only, through the
+`(plan_id, status)` index, so the cost does not grow with the number of
+plans an app has.
+
+`$facet` is not used: its sub-pipelines cannot use indexes, so every list
+and count is its own `$lookup`.
+"""
+
+from typing import Any, Dict, List
+from bson import ObjectId
+
+from model import RunStatus, SUMMARY_EXCLUDES
+
+PLAN_FIELDS = {"name": 1, "status": 1, "estimated_duration": 1, "task_count": {"$size": {"$ifNull": ["$tasks", []]}}, "created_at": 1, "updated_at": 1}
+AGENT_FIELDS = {"name": 1, "type": 1, "capabilities": 1, "created_at": 1, "updated_at": 1}
+FLOW_FIELDS = {"name": 1, "description": 1, "entry_point": 1, "created_at": 1, "updated_at": 1}
+
+def _newest(collection_name: str, fields: Dict[str, Any], limit: int, field: str) -> Dict[str, Any]:
+    return {"$lookup": {
+        "from": collection_name, "localField": "_id", "foreignField": "app_id",
+        "pipeline": [{"$sort": {"_id": -1}}, {"$limit": limit}, {"$project": fields}],
+        "as": field,
+    }}
+
+def _counted(collection_name: str, group_by: Any, field: str) -> Dict[str, Any]:
+    return {"$lookup": {
+        "from": collection_name, "localField": "_id", "foreignField": "app_id",
+        "pipeline": [{"$group": {"_id": group_by, "count": {"$sum": 1}}}],
+        "as": field,
+    }}
+
+def overview_pipeline(app_id: ObjectId, limit: int) -> List[Dict[str, Any]]:
+    """Pipeline over `apps` returning the app with up to `limit` plans, agents and flows."""
+    return [
+        {"$match": {"_id": app_id}},
+        {"$project": {field: 0 for field in SUMMARY_EXCLUDES["apps"]}},
+        _newest("plans", PLAN_FIELDS, limit, "plans"),
+        _newest("agents", AGENT_FIELDS, limit, "agents"),
+        _newest("flows", FLOW_FIELDS, limit, "flows"),
+        _counted("plans", None, "plan_counts"),
+        _counted("agents", "$type", "agent_counts"),
+        _counted("flows", None, "flow_counts"),
+        {"$lookup": {
+            "from": "runs", "localField": "plans._id", "foreignField": "plan_id",
+            "pipeline": [{"$group": {"_id": {"plan_id": "$plan_id", "status": "$status"}, "count": {"$sum": 1}}}],
+            "as": "run_counts",
+        }},
+    ]
+
+def status_counts() -> Dict[str, int]:
+    return {status.value: 0 for status in RunStatus}
+
+def shape_overview(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn the pipeline output into the /apps/{app_id}/overview response."""
+    plans, agents, flows = doc.pop("plans"), doc.pop("agents"), doc.pop("flows")
+    plan_counts, agent_counts, flow_counts = doc.pop("plan_counts"), doc.pop("agent_counts"), doc.pop("flow_counts")
+    runs_by_plan: Dict[ObjectId, Dict[str, int]] = {plan["_id"]: status_counts() for plan in plans}
+    run_totals = status_counts()
+    for group in doc.pop("run_counts"):
+        plan_id, status = group["_id"]["plan_id"], group["_id"]["status"]
+        counts = runs_by_plan.get(plan_id)
+        if counts is None:
+            continue
+        counts[status] = counts.get(status, 0) + group["count"]
+        run_totals[status] = run_totals.get(status, 0) + group["count"]
+    for plan in plans:
+        plan["runs"] = runs_by_plan[plan["_id"]]
+    by_type = {group["_id"]: group["count"] for group in agent_counts if group["_id"] is not None}
+    return {
+        "app": doc,
+        "plans": {"total": plan_counts[0]["count"] if plan_counts else 0, "items": plans},
+        "agents": {"total": sum(group["count"] for group in agent_counts), "by_type": by_type, "items": agents},
+        "flows": {"total": flow_counts[0]["count"] if flow_counts else 0, "items": flows},
+        "runs": run_totals,
+    }
@@ -0,0 +1,148 @@
+"""
+Compilation of a Plan's task dependency graph.
+
+`Plan.dependencies` maps a task id to the ids of the tasks it waits for.
+`compile_plan` checks the graph and derives what schedulers need on every
+tick: a topological order, the parallel levels and the critical path
+weighted by each task's `estimated_duration`. The result is stored on the
+plan as `graph`, so ready-task queries only compare task statuses.
+"""
+
+from typing import Any, Dict, List, Optional
+from collections import deque
+from model import RunStatus
+import math
+
+class PlanGraphError(ValueError):
+    pass
+
+def task_ids(tasks: List[Dict[str, Any]]) -> List[str]:
+    ids = []
+    seen = set()
+    for index, task in enumerate(tasks):
+        task_id = task.get("id") if isinstance(task, dict) else None
+        if not isinstance(task_id, str) or not task_id:
+            raise PlanGraphError(f"Task {index} has no id")
+        if task_id in seen:
+            raise PlanGraphError(f"Duplicate task id: {task_id}")
+        seen.add(task_id)
+        ids.append(task_id)
+    return ids
+
+def task_duration(task_id: str, task: Dict[str, Any]) -> float:
+    value = task.get("estimated_duration")
+    if value is None:
+        return 0.0
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        duration = float(value)
+    except (TypeError, ValueError):
+        raise PlanGraphError(f"Task {task_id} has a non-numeric estimated_duration: {value!r}")
+    if not math.isfinite(duration) or duration < 0:
+        raise PlanGraphError(f"Task {task_id} has an invalid estimated_duration: {value!r}")
+    return duration
+
+STATUSES = {status.value for status in RunStatus}
+
+def check_status(task_id: str, task: Dict[str, Any]) -> None:
+    status = task.get("status")
+    if status is not None and (not isinstance(status, str) or status not in STATUSES):
+        raise PlanGraphError(f"Task {task_id} has an invalid status: {status!r}")
+
+def find_cycle(remaining: Dict[str, List[str]]) -> List[str]:
+    """A cycle among tasks left over by Kahn's algorithm, as a closed path."""
+    path: List[str] = []
+    position: Dict[str, int] = {}
+    node = next(iter(remaining))
+    # Every remaining task waits on another remaining task, so this walk must revisit one.
+    while node not in position:
+        position[node] = len(path)
+        path.append(node)
+        node = next(dep for dep in remaining[node] if dep in remaining)
+    return path[position[node]:] + [node]
+
+def compile_plan(tasks: List[Dict[str, Any]], dependencies: Dict[str, List[str]]) -> Dict[str, Any]:
+    """
+    Return {"order", "levels", "critical_path", "critical_path_duration"},
+    raising PlanGraphError for unknown task ids, dependency cycles, statuses
+    that are not RunStatus values and durations that are not non-negative
+    numbers.
+    """
+    ids = task_ids(tasks)
+    known = set(ids)
+    if not isinstance(dependencies, dict):
+        raise PlanGraphError("dependencies must map task ids to lists of task ids")
+    waits_on: Dict[str, List[str]] = {task_id: [] for task_id in ids}
+    for task_id, deps in dependencies.items():
+        if task_id not in known:
+            raise PlanGraphError(f"Dependencies given for unknown task: {task_id}")
+        if not isinstance(deps, list):
+            raise PlanGraphError(f"Dependencies of task {task_id} must be a list of task ids")
+        for dep in deps:
+            if not isinstance(dep, str) or dep not in known:
+                raise PlanGraphError(f"Task {task_id} depends on unknown task: {dep}")
+        # Repeated dependencies would be counted twice below.
+        waits_on[task_id] = list(dict.fromkeys(deps))
+
+    dependents: Dict[str, List[str]] = {task_id: [] for task_id in ids}
+    pending = {task_id: len(deps) for task_id, deps in waits_on.items()}
+    for task_id, deps in waits_on.items():
+        for dep in deps:
+            dependents[dep].append(task_id)
+
+    for task_id, task in zip(ids, tasks):
+        check_status(task_id, task)
+    duration = {task_id: task_duration(task_id, task) for task_id, task in zip(ids, tasks)}
+    level: Dict[str, int] = {}
+    finish: Dict[str, float] = {}
+    critical_parent: Dict[str, Optional[str]] = {}
+    order: List[str] = []
+    queue = deque(task_id for task_id in ids if pending[task_id] == 0)
+    while queue:
+        task_id = queue.popleft()
+        order.append(task_id)
+        deps = waits_on[task_id]
+        level[task_id] = 1 + max((level[dep] for dep in deps), default=-1)
+        parent = max(deps, key=lambda dep: finish[dep], default=None)
+        critical_parent[task_id] = parent
+        finish[task_id] = duration[task_id] + (finish[parent] if parent is not None else 0)
+        for child in dependents[task_id]:
+            pending[child] -= 1
+            if pending[child] == 0:
+                queue.append(child)
+
+    if len(order) < len(ids):
+        cycle = find_cycle({task_id: waits_on[task_id] for task_id in ids if pending[task_id] > 0})
+        raise PlanGraphError("Dependency cycle: " + " -> ".join(cycle))
+
+    levels: List[List[str]] = [[] for _ in range(max(level.values(), default=-1) + 1)]
+    for task_id in order:
+        levels[level[task_id]].append(task_id)
+
+    critical_path: List[str] = []
+    # On ties, end at the task latest in topological order, keeping zero-duration successors.
+    node = max(reversed(order), key=lambda task_id: finish[task_id], default=None)
+    while node is not None:
+        critical_path.append(node)
+        node = critical_parent[node]
+    critical_path.reverse()
+
+    return {
+        "order": order,
+        "levels": levels,
+        "critical_path": critical_path,
+        "critical_path_duration": finish[critical_path[-1]] if critical_path else 0,
+    }
+
+def ready_tasks(tasks: List[Dict[str, Any]], dependencies: Dict[str, List[str]], order: List[str]) -> List[Dict[str, Any]]:
+    """Pending tasks, in topological order, whose dependencies have all completed."""
+    by_id = {task["id"]: task for task in tasks if "id" in task}
+    completed = {task_id for task_id, task in by_id.items() if task.get("status") == RunStatus.COMPLETED}
+    return [
+        by_id[task_id]
+        for task_id in order
+        if task_id in by_id
+        and by_id[task_id].get("status", RunStatus.PENDING) == RunStatus.PENDING
+        and all(dep in completed for dep in dependencies.get(task_id, ()))
+    ]
@@ -12,7 +12,7 @@ echo "✅ Virtual environment activated"
 
 # Install dependencies
 echo "Installing dependencies..."
-pip install fastapi motor pymongo "uvicorn[standard]" python-dotenv pydantic
+pip install fastapi motor pymongo "uvicorn[standard]" python-dotenv pydantic orjson numpy
 
 # Copy environment variables if needed
 [ ! -f ".env" ] && grep "MONGODB" ../.env > .env 2>/dev/null
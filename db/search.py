@@ -0,0 +1,119 @@
+"""
+Full-text message search.
+
+Messages are matched through the `messages_text` index on `text` and
+`content_text` (the text-typed content entries, see model.Message), so a
+search reads index entries for its terms instead of scanning `messages`.
+Results are ranked by `textScore` with `_id` as tie-breaker and paged by a
+`<score>:<_id>` keyset cursor. Only a short snippet around the first
+matching term is returned for each message, cut by the pipeline itself.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+import re
+
+SNIPPET_CHARS = 160
+
+TERM_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+
+class InvalidCursor(ValueError):
+    pass
+
+def search_terms(q: str) -> List[str]:
+    """Phrases and words of a `$text` search string, without negated terms."""
+    terms = []
+    for phrase, word in TERM_PATTERN.findall(q):
+        if phrase:
+            terms.append(phrase)
+        elif not word.startswith("-"):
+            terms.append(word.strip('"'))
+    return [term for term in terms if term]
+
+def encode_cursor(score: float, object_id: ObjectId) -> str:
+    return f"{score!r}:{object_id}"
+
+def decode_cursor(cursor: str) -> Tuple[float, ObjectId]:
+    score, _, object_id = cursor.partition(":")
+    try:
+        return float(score), ObjectId(object_id)
+    except Exception:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+def search_pipeline(
+    query: Dict[str, Any], after: Optional[Tuple[float, ObjectId]], limit: int, terms: List[str], user_id: Optional[ObjectId] = None,
+) -> List[Dict[str, Any]]:
+    """
+    `query` must contain the `$text` condition. With `user_id`, hits are
+    kept only if their chat belongs to the user, by `_id` lookups of the
+    matching messages' chats. The snippet is cut on the server after
+    `$limit`, so only `_id`, the ranking score and SNIPPET_CHARS of text per
+    hit leave it.
+    """
+    pipeline: List[Dict[str, Any]] = [{"$match": query}]
+    if user_id is not None:
+        pipeline += [
+            {"$lookup": {
+                "from": "chats", "localField": "chat_id", "foreignField": "_id",
+                "pipeline": [{"$match": {"user_id": user_id}}, {"$project": {"_id": 1}}],
+                "as": "owned",
+            }},
+            {"$match": {"owned": {"$ne": []}}},
+        ]
+    pipeline += [
+        {"$project": {
+            "chat_id": 1,
+            "role": 1,
+            "created_at": 1,
+            "text": 1,
+            "content_text": 1,
+            "score": {"$meta": "textScore"},
+        }},
+    ]
+    if after is not None:
+        score, object_id = after
+        pipeline.append({"$match": {"$or": [
+            {"score": {"$lt": score}},
+            {"score": score, "_id": {"$gt": object_id}},
+        ]}})
+    pipeline += [
+        {"$sort": {"score": -1, "_id": 1}},
+        {"$limit": limit},
+        {"$set": {"snippet": snippet_expression(terms)}},
+        {"$unset": ["text", "content_text"]},
+    ]
+    return pipeline
+
+def snippet_expression(terms: List[str], size: int = SNIPPET_CHARS) -> Dict[str, Any]:
+    """Up to `size` characters of the message text around the earliest term, with ellipses where cut."""
+    # The index stems words, so a term may only match as a prefix ("deploys" -> "deploy").
+    needles = [term.lower() for term in terms] + [term.lower()[:-1] for term in terms if len(term) > 4]
+    source = {"$trim": {"input": {"$concat": [
+        {"$ifNull": ["$text", ""]}, " ", {"$ifNull": ["$content_text", ""]},
+    ]}}}
+    return {"$let": {
+        "vars": {"source": source},
+        "in": {"$let": {
+            "vars": {
+                "length": {"$strLenCP": "$$source"},
+                "found": {"$min": {"$filter": {
+                    "input": [{"$indexOfCP": [{"$toLower": "$$source"}, {"$literal": needle}]} for needle in needles],
+                    "cond": {"$gte": ["$$this", 0]},
+                }}},
+            },
+            "in": {"$let": {
+                "vars": {"end": {"$min": [
+                    "$$length",
+                    {"$add": [{"$max": [0, {"$subtract": [{"$ifNull": ["$$found", 0]}, size // 4]}]}, size]},
+                ]}},
+                "in": {"$let": {
+                    "vars": {"start": {"$max": [0, {"$subtract": ["$$end", size]}]}},
+                    "in": {"$concat": [
+                        {"$cond": [{"$gt": ["$$start", 0]}, "…", ""]},
+                        {"$trim": {"input": {"$substrCP": ["$$source", "$$start", {"$subtract": ["$$end", "$$start"]}]}}},
+                        {"$cond": [{"$lt": ["$$end", "$$length"]}, "…", ""]},
+                    ]},
+                }},
+            }},
+        }},
+    }}
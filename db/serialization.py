@@ -0,0 +1,63 @@
+"""
+orjson serialization for raw MongoDB documents.
+
+Handlers return Motor dicts holding BSON types (ObjectId, datetime, ...).
+`BSONResponse` renders them directly with orjson, and `BSONRoute` hands
+handler results to it without running FastAPI's `jsonable_encoder` first.
+"""
+
+from typing import Any, Callable
+from base64 import b64encode
+from decimal import Decimal
+from uuid import UUID
+from bson import Binary, Decimal128, ObjectId
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+import functools
+import inspect
+import orjson
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+def bson_default(value: Any) -> Any:
+    """orjson `default` hook for the types orjson does not serialize natively."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(by_alias=True)
+    if isinstance(value, (Decimal128, Decimal)):
+        return str(value)
+    if isinstance(value, (Binary, bytes)):
+        return b64encode(value).decode("ascii")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value: Any, option: int = 0) -> bytes:
+    return orjson.dumps(value, default=bson_default, option=ORJSON_OPTIONS | option)
+
+class BSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class BSONRoute(APIRoute):
+    """Route that wraps plain handler results in a BSONResponse, skipping jsonable_encoder."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        if inspect.iscoroutinefunction(endpoint):
+            original = endpoint
+            status_code = kwargs.get("status_code") or 200
+
+            @functools.wraps(original)
+            async def endpoint(*args: Any, **kw: Any) -> Any:
+                result = await original(*args, **kw)
+                if isinstance(result, Response):
+                    return result
+                return BSONResponse(result, status_code=status_code)
+
+        super().__init__(path, endpoint, **kwargs)
@@ -0,0 +1,105 @@
+"""
+Session token validation fast path.
+
+`SessionCache` keeps recently validated sessions by token in a bounded
+TTLCache; an entry never outlives the session's `expires_at`. Updates and
+deletes made through the API evict entries by session id, and other
+writers are seen within the cache TTL.
+
+`ActivityBuffer` coalesces `last_activity` bumps in memory and writes the
+latest timestamp per session in one unordered `bulk_write` per flush,
+instead of one write per authenticated request.
+"""
+
+from typing import Any, Dict, Hashable, Optional
+from datetime import datetime
+from pymongo import UpdateOne
+from cache import TTLCache
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+def session_valid(session: Dict[str, Any], now: datetime) -> bool:
+    expires_at = session.get("expires_at")
+    return session.get("is_active", True) and (expires_at is None or expires_at > now)
+
+class SessionCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.cache = TTLCache(max_entries, ttl)
+        self._tokens: Dict[Hashable, str] = {}
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        session = self.cache.get(token)
+        if session is not None and not session_valid(session, datetime.utcnow()):
+            self.invalidate(session["_id"])
+            return None
+        return session
+
+    def set(self, session: Dict[str, Any]) -> None:
+        ttl = self.cache.ttl
+        if session.get("expires_at") is not None:
+            ttl = min(ttl, (session["expires_at"] - datetime.utcnow()).total_seconds())
+        token = session["session_token"]
+        self.cache.set(token, session, ttl)
+        if token in self.cache:
+            self._tokens[session["_id"]] = token
+        # Evicted tokens leave stale ids behind; drop them once the index outgrows the cache.
+        if len(self._tokens) > 2 * max(self.cache.max_entries, 1):
+            self._tokens = {session_id: token for session_id, token in self._tokens.items() if token in self.cache}
+
+    def invalidate(self, session_id: Hashable) -> None:
+        token = self._tokens.pop(session_id, None)
+        if token is not None:
+            self.cache.invalidate(token)
+
+    def clear(self) -> None:
+        self.cache.clear()
+        self._tokens.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+class ActivityBuffer:
+    def __init__(self, collection, max_pending: int = 10000):
+        self.collection = collection
+        self.max_pending = max_pending
+        self.flushes = 0
+        self.writes = 0
+        self._pending: Dict[Hashable, datetime] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def touch(self, session_id: Hashable, at: datetime) -> None:
+        previous = self._pending.get(session_id)
+        if previous is None or at > previous:
+            self._pending[session_id] = at
+        if len(self._pending) >= self.max_pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> int:
+        """Write buffered timestamps; `$max` keeps newer values written by other processes."""
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        operations = [
+            UpdateOne({"_id": session_id}, {"$max": {"last_activity": at}})
+            for session_id, at in pending.items()
+        ]
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.warning("Flushing %d session activity updates failed, retrying later: %s", len(pending), e)
+            for session_id, at in pending.items():
+                self.touch(session_id, at)
+            return 0
+        self.flushes += 1
+        self.writes += len(operations)
+        return len(operations)
+
+    async def run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": len(self._pending), "flushes": self.flushes, "writes": self.writes}
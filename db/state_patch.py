@@ -0,0 +1,120 @@
+"""
+Translation of State patches into targeted MongoDB updates.
+
+Two input forms are accepted, both addressing paths inside `state_data`:
+
+- JSON Patch (RFC 6902) operations: `add`, `replace`, `remove` and `test`.
+  Appending to an array uses the `-` index; inserting at or removing an
+  array index, `move` and `copy` would need the current document and are
+  rejected.
+- Dotted-path operations: `{"set": {"a.b": 1}, "unset": ["c"],
+  "push": {"log": {...}}, "inc": {"count": 1}}`.
+
+Both are normalized to a list of `{"op", "path", "value"}` deltas (stored
+as the state's history) plus `test` conditions, then turned into one
+update document.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+DOTTED_OPS = ("set", "unset", "push", "inc")
+
+class PatchError(ValueError):
+    pass
+
+def check_segments(segments: List[str], path: Any) -> None:
+    for segment in segments:
+        if not segment or segment.startswith("$") or "." in segment:
+            raise PatchError(f"Unsupported path: {path}")
+
+def pointer_segments(pointer: Any) -> List[str]:
+    """Split a JSON Pointer into unescaped segments."""
+    if not isinstance(pointer, str) or not pointer.startswith("/"):
+        raise PatchError(f"Invalid JSON Pointer: {pointer}")
+    return [segment.replace("~1", "/").replace("~0", "~") for segment in pointer[1:].split("/")]
+
+def parse_json_patch(operations: List[Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    deltas, tests = [], []
+    for operation in operations:
+        if not isinstance(operation, dict) or "op" not in operation or "path" not in operation:
+            raise PatchError("JSON Patch operations need `op` and `path`")
+        op = operation["op"]
+        segments = pointer_segments(operation["path"])
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise PatchError(f"`{op}` needs a value")
+        if op == "add" and segments[-1] == "-" and len(segments) > 1:
+            check_segments(segments[:-1], operation["path"])
+            deltas.append({"op": "push", "path": ".".join(segments[:-1]), "value": operation["value"]})
+            continue
+        check_segments(segments, operation["path"])
+        path = ".".join(segments)
+        if op in ("add", "remove") and segments[-1].isdigit():
+            raise PatchError(f"`{op}` at an array index is not supported: {operation['path']}")
+        if op in ("add", "replace"):
+            deltas.append({"op": "set", "path": path, "value": operation["value"]})
+        elif op == "remove":
+            deltas.append({"op": "unset", "path": path})
+        elif op == "test":
+            tests.append({"path": path, "value": operation["value"]})
+        else:
+            raise PatchError(f"Unsupported JSON Patch operation: {op}")
+    return deltas, tests
+
+def parse_dotted(operations: Dict[str, Any]) -> List[Dict[str, Any]]:
+    unknown = set(operations) - set(DOTTED_OPS)
+    if unknown:
+        raise PatchError(f"Unsupported operations: {', '.join(sorted(unknown))}")
+    deltas = []
+    for op in DOTTED_OPS:
+        if op not in operations:
+            continue
+        if op == "unset":
+            paths = operations[op]
+            if not isinstance(paths, list):
+                raise PatchError("`unset` takes a list of paths")
+            items = [(path, None) for path in paths]
+        else:
+            if not isinstance(operations[op], dict):
+                raise PatchError(f"`{op}` takes an object of path: value")
+            items = list(operations[op].items())
+        for path, value in items:
+            if not isinstance(path, str):
+                raise PatchError(f"Invalid path: {path}")
+            check_segments(path.split("."), path)
+            if op == "inc" and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+                raise PatchError(f"`inc` needs a number: {path}")
+            delta = {"op": op, "path": path}
+            if op != "unset":
+                delta["value"] = value
+            deltas.append(delta)
+    return deltas
+
+def parse_patch(patch: Any) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Normalize a JSON Patch list or dotted-path object into (deltas, tests)."""
+    if isinstance(patch, list):
+        deltas, tests = parse_json_patch(patch)
+    elif isinstance(patch, dict):
+        deltas, tests = parse_dotted(patch), []
+    else:
+        raise PatchError("Expected a JSON Patch array or an operations object")
+    if not deltas:
+        raise PatchError("No changes given")
+    return deltas, tests
+
+def to_update(deltas: List[Dict[str, Any]], root: str = "state_data") -> Dict[str, Dict[str, Any]]:
+    update: Dict[str, Dict[str, Any]] = {}
+    for delta in deltas:
+        path = f"{root}.{delta['path']}"
+        operator = "$" + delta["op"]
+        value = "" if delta["op"] == "unset" else delta.get("value")
+        targets = update.setdefault(operator, {})
+        if delta["op"] == "push":
+            # Several appends to the same array become one $each.
+            targets.setdefault(path, {"$each": []})["$each"].append(value)
+        else:
+            targets[path] = value
+    return update
+
+def to_conditions(tests: List[Dict[str, Any]], root: str = "state_data") -> Dict[str, Any]:
+    # $eq so that test values are never read as query operators.
+    return {f"{root}.{test['path']}": {"$eq": test["value"]} for test in tests}
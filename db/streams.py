@@ -0,0 +1,156 @@
+"""
+Live message tailing for chats.
+
+Subscribers of a chat are served by the in-process `MessageBroker`. When
+the deployment supports change streams, `MessageTail.follow` feeds it from
+a single change stream on `messages` per process, so writes from every API
+process reach every subscriber; otherwise the API's message writers publish
+to it directly. Each yielded event carries an id that can be passed back
+as `last_event_id` to resume without replaying history: a change stream
+resume token, replayed through a short-lived change stream of the chat, or
+the `_id` of the last delivered message, replayed from `messages`.
+"""
+
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+from bson import ObjectId
+from contextlib import aclosing
+from datetime import timedelta
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    def __init__(self, max_queue: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+class MessageBroker:
+    """In-process pub/sub of inserted messages, keyed by chat_id."""
+
+    def __init__(self, max_queue: int = 1000):
+        self.max_queue = max_queue
+        self.subscribers: Dict[ObjectId, Set[Subscription]] = {}
+
+    def subscribe(self, chat_id: ObjectId) -> Subscription:
+        subscription = Subscription(self.max_queue)
+        self.subscribers.setdefault(chat_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, chat_id: ObjectId, subscription: Subscription) -> None:
+        subscribers = self.subscribers.get(chat_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[chat_id]
+
+    def publish(self, message: Dict[str, Any], event_id: Optional[str] = None) -> None:
+        """Queue `message` for its chat's subscribers; `event_id` defaults to the message `_id`."""
+        event = (event_id or str(message["_id"]), message)
+        for subscription in list(self.subscribers.get(message["chat_id"], ())):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumer: end its stream so it reconnects and catches up from the database.
+                subscription.overflowed = True
+                self.unsubscribe(message["chat_id"], subscription)
+
+class MessageTail:
+    """
+    Subscriptions to the new messages of a chat, all served by the broker.
+
+    `follow` feeds the broker from one change stream per process; until it
+    is running, or where change streams are unavailable, the API's own
+    message writers publish to the broker (see `local_publish`).
+    """
+
+    def __init__(self, collection, broker: MessageBroker, heartbeat: float = 15.0, catch_up_ms: int = 200, replay_age: float = 300):
+        self.collection = collection
+        self.broker = broker
+        self.heartbeat = heartbeat
+        self.catch_up_ms = catch_up_ms
+        self.replay_age = timedelta(seconds=replay_age)
+        self.change_streams: Optional[bool] = None
+
+    @property
+    def local_publish(self) -> bool:
+        """Whether writers must publish their own inserts, as no change stream does."""
+        return self.change_streams is not True
+
+    async def follow(self) -> None:
+        """
+        Publish every new message insert to the broker, with its change
+        stream resume token as event id; messages whose `_id` is older than
+        `replay_age` are restored or imported ones and are skipped. Exits when
+        change streams are unavailable.
+        """
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        resume_token = None
+        while True:
+            try:
+                async with self.collection.watch(pipeline, resume_after=resume_token) as stream:
+                    self.change_streams = True
+                    async for change in stream:
+                        resume_token = change["_id"]
+                        message = change["fullDocument"]
+                        # Archive restores and imports re-insert messages under their original `_id`s.
+                        if change["clusterTime"].as_datetime() - message["_id"].generation_time > self.replay_age:
+                            continue
+                        self.broker.publish(message, change["_id"]["_data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if getattr(e, "code", None) == 40573:
+                    logger.info("Change streams unavailable, tailing messages in process: %s", e)
+                    self.change_streams = False
+                    return
+                # Writers publish locally until the stream is back.
+                self.change_streams = None
+                logger.warning("Message change stream failed, reconnecting: %s", e)
+                await asyncio.sleep(1)
+
+    async def __call__(self, chat_id: ObjectId, last_event_id: Optional[str] = None) -> AsyncIterator[Tuple[Optional[str], Optional[Dict[str, Any]]]]:
+        """
+        Yield (event_id, message) for messages inserted into `chat_id` from now
+        on, or after `last_event_id` (a resume token or message `_id`).
+
+        (None, None) is yielded every `heartbeat` seconds while idle.
+        """
+        # Subscribe first so that nothing written during the catch-up is missed.
+        subscription = self.broker.subscribe(chat_id)
+        try:
+            caught_up: Set[ObjectId] = set()
+            if last_event_id:
+                async with aclosing(self._catch_up(chat_id, last_event_id)) as events:
+                    async for event_id, message in events:
+                        caught_up.add(message["_id"])
+                        yield event_id, message
+            while True:
+                if subscription.overflowed and subscription.queue.empty():
+                    return
+                try:
+                    event_id, message = await asyncio.wait_for(subscription.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield None, None
+                    continue
+                if message["_id"] in caught_up:
+                    continue
+                yield event_id, message
+        finally:
+            self.broker.unsubscribe(chat_id, subscription)
+
+    async def _catch_up(self, chat_id: ObjectId, last_event_id: str):
+        """Messages written after `last_event_id` up to now."""
+        if ObjectId.is_valid(last_event_id):
+            cursor = self.collection.find({"chat_id": chat_id, "_id": {"$gt": ObjectId(last_event_id)}}).sort("_id", 1)
+            async for message in cursor:
+                yield str(message["_id"]), message
+            return
+        # A short-lived change stream replays the chat's inserts since the token.
+        pipeline = [{"$match": {"operationType": "insert", "fullDocument.chat_id": chat_id}}]
+        async with self.collection.watch(pipeline, resume_after={"_data": last_event_id}, max_await_time_ms=self.catch_up_ms) as stream:
+            while stream.alive:
+                change = await stream.try_next()
+                if change is None:
+                    return
+                yield change["_id"]["_data"], change["fullDocument"]
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Modules in db/ import each other by name, as when api.py is run from here.
+sys.path.append(str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,25 @@
+import pytest
+
+from code_store import InvalidRange, parse_range
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("items=0-10", None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=5-", (5, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=100-200", "bytes=20-10", "bytes=-"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(InvalidRange):
+        parse_range(header, 100)
+
+def test_any_range_of_an_empty_body_is_unsatisfiable():
+    with pytest.raises(InvalidRange):
+        parse_range("bytes=-10", 0)
@@ -0,0 +1,44 @@
+import asyncio
+import gzip
+
+import pytest
+
+import compression
+from compression import CorruptData, UnsupportedCodec, check_codec, compress_stream, decompress_lines
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+def collect(stream):
+    async def run():
+        return [item async for item in stream]
+    return asyncio.run(run())
+
+def test_gzip_round_trip():
+    lines = [b'{"n": %d}' % n for n in range(20000)]
+    body = b"".join(line + b"\n" for line in lines)
+    compressed = b"".join(collect(compress_stream(chunks(body[:1000], body[1000:]), "gzip")))
+    assert gzip.decompress(compressed) == body
+    # Split mid-line and mid-member, as a request body arrives.
+    pieces = [compressed[i:i + 777] for i in range(0, len(compressed), 777)]
+    assert collect(decompress_lines(chunks(*pieces), "gzip")) == lines
+
+def test_concatenated_gzip_members_and_blank_lines():
+    data = gzip.compress(b"a\n\n") + gzip.compress(b"b")
+    assert collect(decompress_lines(chunks(data), "gzip")) == [b"a", b"b"]
+
+def test_corrupt_gzip():
+    with pytest.raises(CorruptData):
+        collect(decompress_lines(chunks(b"not gzip"), "gzip"))
+
+def test_zstd_without_zstandard(monkeypatch):
+    monkeypatch.setattr(compression, "zstandard", None)
+    with pytest.raises(UnsupportedCodec, match="zstandard"):
+        check_codec("zstd")
+    with pytest.raises(UnsupportedCodec):
+        collect(compress_stream(chunks(b"x"), "zstd"))
+
+def test_unknown_codec():
+    with pytest.raises(UnsupportedCodec):
+        check_codec("lz4")
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from conditional import content_tag, not_modified, validator_headers, version_tag
+
+UPDATED_AT = datetime(2024, 5, 1, 12, 30, 15, 250000)
+LAST_MODIFIED = "Wed, 01 May 2024 12:30:15 GMT"
+
+def test_version_tag_is_weak_and_depends_on_the_projection():
+    full = version_tag(UPDATED_AT, None)
+    assert full.startswith('W/"') and full == version_tag(UPDATED_AT, {})
+    assert version_tag(UPDATED_AT, {"code": 0}) != full
+    assert version_tag(None, None) is None
+    assert content_tag(b"a") != content_tag(b"b")
+
+def test_if_none_match_uses_weak_comparison():
+    etag = version_tag(UPDATED_AT, None)
+    strong = etag[2:]
+    assert not_modified(etag, None, etag, UPDATED_AT)
+    assert not_modified(strong, None, etag, UPDATED_AT)
+    assert not_modified(f'"other", {strong}', None, etag, UPDATED_AT)
+    assert not_modified("*", None, etag, UPDATED_AT)
+    assert not not_modified('W/"other"', None, etag, UPDATED_AT)
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    etag = version_tag(UPDATED_AT, None)
+    assert not not_modified('W/"other"', LAST_MODIFIED, etag, UPDATED_AT)
+    assert not_modified(etag, "Mon, 01 Jan 2024 00:00:00 GMT", etag, UPDATED_AT)
+
+def test_if_modified_since_compares_whole_seconds():
+    etag = version_tag(UPDATED_AT, None)
+    assert validator_headers(etag, UPDATED_AT)["Last-Modified"] == LAST_MODIFIED
+    assert not_modified(None, LAST_MODIFIED, etag, UPDATED_AT)
+    assert not not_modified(None, "Wed, 01 May 2024 12:30:14 GMT", etag, UPDATED_AT)
+    assert not not_modified(None, "not a date", etag, UPDATED_AT)
+    assert not not_modified(None, LAST_MODIFIED, etag, None)
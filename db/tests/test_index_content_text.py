@@ -0,0 +1,27 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from index_content_text import backfill
+from model import Message
+
+def test_backfill_sets_content_text_like_inserts():
+    messages = [
+        {"_id": 1, "content": [{"type": "text", "data": "deploy"}, {"type": "json", "data": {"a": 1}}, {"type": "text", "data": "now"}]},
+        {"_id": 2, "content": [{"type": "image", "data": "https://example.com/a.png"}]},
+        {"_id": 3, "text": "old"},
+        {"_id": 4, "content": [{"type": "text", "data": "kept"}], "content_text": "kept"},
+    ]
+
+    async def run():
+        collection = AsyncMongoMockClient()["alpha"]["messages"]
+        await collection.insert_many(messages)
+        first = await backfill(collection, 2)
+        again = await backfill(collection, 2)
+        return first, again, {doc["_id"]: doc async for doc in collection.find({})}
+
+    first, again, docs = asyncio.run(run())
+    assert (first, again) == (3, 0)
+    assert docs[1]["content_text"] == Message(chat_id="0" * 24, role="user", content=messages[0]["content"]).content_text == "deploy\nnow"
+    assert docs[2]["content_text"] is None and docs[3]["content_text"] is None
+    assert docs[4]["content_text"] == "kept"
@@ -0,0 +1,172 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from leases import claim_run, finish_run, reclaim_expired, release_run, renew_lease
+from model import RunStatus
+from worker import RunWorkerPool
+
+async def seeded(count):
+    """A runs collection with `count` PENDING runs, oldest first, and their ids."""
+    collection = AsyncMongoMockClient()["alpha"]["runs"]
+    start = datetime.utcnow() - timedelta(minutes=count)
+    ids = [ObjectId() for _ in range(count)]
+    for index, run_id in enumerate(ids):
+        await collection.insert_one({"_id": run_id, "status": RunStatus.PENDING, "attempts": 0, "created_at": start + timedelta(minutes=index)})
+    return collection, ids
+
+async def expire(collection, run_id):
+    await collection.update_one({"_id": run_id}, {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+def test_claims_oldest_pending_run_once():
+    async def run():
+        collection, ids = await seeded(2)
+        first = await claim_run(collection, "a", 60, 3)
+        second = await claim_run(collection, "b", 60, 3)
+        third = await claim_run(collection, "c", 60, 3)
+        return ids, first, second, third
+    ids, first, second, third = asyncio.run(run())
+    assert [first["_id"], second["_id"]] == ids
+    assert first["status"] == RunStatus.RUNNING
+    assert first["lease_owner"] == "a" and first["attempts"] == 1
+    assert first["lease_expires_at"] > datetime.utcnow()
+    assert third is None
+
+def test_only_the_owner_renews_and_finishes():
+    async def run():
+        collection, [run_id] = await seeded(1)
+        await claim_run(collection, "a", 60, 3)
+        renewed = await renew_lease(collection, run_id, "a", 120)
+        stolen = await renew_lease(collection, run_id, "b", 120)
+        finished_by_other = await finish_run(collection, run_id, "b", RunStatus.COMPLETED)
+        finished = await finish_run(collection, run_id, "a", RunStatus.COMPLETED, output_data={"ok": True})
+        renewed_after = await renew_lease(collection, run_id, "a", 120)
+        return renewed, stolen, finished_by_other, finished, renewed_after, await collection.find_one({"_id": run_id})
+    renewed, stolen, finished_by_other, finished, renewed_after, doc = asyncio.run(run())
+    assert renewed is not None and renewed > datetime.utcnow() + timedelta(seconds=60)
+    assert stolen is None
+    assert finished_by_other is False
+    assert finished is True
+    assert renewed_after is None
+    assert doc["status"] == RunStatus.COMPLETED and doc["output_data"] == {"ok": True}
+    assert doc["lease_expires_at"] is None
+
+def test_expired_lease_is_claimed_again_until_attempts_run_out():
+    async def run():
+        collection, [run_id] = await seeded(1)
+        await claim_run(collection, "a", 60, 2)
+        live = await claim_run(collection, "b", 60, 2)
+        await expire(collection, run_id)
+        retried = await claim_run(collection, "b", 60, 2)
+        lost = await finish_run(collection, run_id, "a", RunStatus.COMPLETED)
+        await expire(collection, run_id)
+        exhausted = await claim_run(collection, "c", 60, 2)
+        swept = await reclaim_expired(collection, 2)
+        return live, retried, lost, exhausted, swept, await collection.find_one({"_id": run_id})
+    live, retried, lost, exhausted, swept, doc = asyncio.run(run())
+    assert live is None
+    assert retried["lease_owner"] == "b" and retried["attempts"] == 2
+    assert lost is False
+    assert exhausted is None
+    assert swept == {"requeued": 0, "failed": 1}
+    assert doc["status"] == RunStatus.FAILED
+
+def test_reclaim_requeues_expired_leases_with_attempts_left():
+    async def run():
+        collection, [run_id] = await seeded(1)
+        await claim_run(collection, "a", 60, 3)
+        await expire(collection, run_id)
+        swept = await reclaim_expired(collection, 3)
+        return swept, await collection.find_one({"_id": run_id})
+    swept, doc = asyncio.run(run())
+    assert swept == {"requeued": 1, "failed": 0}
+    assert doc["status"] == RunStatus.PENDING and doc["lease_owner"] is None and doc["attempts"] == 1
+
+def test_release_does_not_count_the_attempt():
+    async def run():
+        collection, [run_id] = await seeded(1)
+        await claim_run(collection, "a", 60, 3)
+        released = await release_run(collection, run_id, "a")
+        return released, await collection.find_one({"_id": run_id})
+    released, doc = asyncio.run(run())
+    assert released is True
+    assert doc["status"] == RunStatus.PENDING and doc["attempts"] == 0
+
+def test_worker_pool_executes_every_run():
+    async def handler(run):
+        if run["_id"] == ids[1]:
+            raise RuntimeError("boom")
+        return {"run": str(run["_id"])}
+
+    async def run():
+        collection, seeded_ids = await seeded(3)
+        ids.extend(seeded_ids)
+        pool = RunWorkerPool(collection, handler, worker_id="w", concurrency=2, poll_interval=0.01)
+        worker = asyncio.create_task(pool.run())
+        while pool.completed + pool.failed < 3:
+            await asyncio.sleep(0.01)
+        pool.stop()
+        await worker
+        return pool, {doc["_id"]: doc async for doc in collection.find({})}
+
+    ids = []
+    pool, docs = asyncio.run(run())
+    assert (pool.completed, pool.failed, pool.lost) == (2, 1, 0)
+    assert docs[ids[0]]["status"] == RunStatus.COMPLETED
+    assert docs[ids[0]]["output_data"] == {"run": str(ids[0])}
+    assert docs[ids[1]]["status"] == RunStatus.FAILED and docs[ids[1]]["error_message"] == "boom"
+
+def test_worker_pool_drains_then_requeues_unfinished_runs():
+    async def run():
+        collection, ids = await seeded(2)
+        release = asyncio.Event()
+
+        async def handler(run):
+            if run["_id"] == ids[0]:
+                await release.wait()
+                return {"done": True}
+            await asyncio.Event().wait()
+
+        pool = RunWorkerPool(collection, handler, worker_id="w", concurrency=2, poll_interval=0.01, drain_seconds=0.2)
+        worker = asyncio.create_task(pool.run())
+        while pool.active < 2:
+            await asyncio.sleep(0.01)
+        pool.stop()
+        # A handler that finishes within drain_seconds still completes its run.
+        release.set()
+        await worker
+        return ids, pool, {doc["_id"]: doc async for doc in collection.find({})}
+
+    ids, pool, docs = asyncio.run(run())
+    assert pool.active == 0
+    assert docs[ids[0]]["status"] == RunStatus.COMPLETED
+    assert docs[ids[1]]["status"] == RunStatus.PENDING
+    assert docs[ids[1]]["lease_owner"] is None and docs[ids[1]]["attempts"] == 0
+
+def test_worker_pool_cancels_a_run_whose_lease_was_lost():
+    async def run():
+        collection, [run_id] = await seeded(1)
+        cancelled = asyncio.Event()
+
+        async def handler(run):
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        pool = RunWorkerPool(collection, handler, worker_id="w", lease_seconds=0.09, poll_interval=0.01)
+        worker = asyncio.create_task(pool.run())
+        while pool.active < 1:
+            await asyncio.sleep(0.01)
+        await collection.update_one({"_id": run_id}, {"$set": {"lease_owner": "other"}})
+        await asyncio.wait_for(cancelled.wait(), 1)
+        pool.stop()
+        await worker
+        return pool, await collection.find_one({"_id": run_id})
+
+    pool, doc = asyncio.run(run())
+    assert pool.lost == 1 and pool.completed + pool.failed == 0
+    assert doc["status"] == RunStatus.RUNNING and doc["lease_owner"] == "other"
@@ -0,0 +1,82 @@
+import pytest
+
+from plan_graph import PlanGraphError, compile_plan, ready_tasks
+
+def tasks(*specs):
+    return [{"id": task_id, "estimated_duration": duration} for task_id, duration in specs]
+
+def test_order_levels_and_critical_path():
+    graph = compile_plan(
+        tasks(("fetch", 2), ("parse", 1), ("index", 5), ("report", 1)),
+        {"parse": ["fetch"], "index": ["fetch"], "report": ["parse", "index"]},
+    )
+    assert graph["order"] == ["fetch", "parse", "index", "report"]
+    assert graph["levels"] == [["fetch"], ["parse", "index"], ["report"]]
+    assert graph["critical_path"] == ["fetch", "index", "report"]
+    assert graph["critical_path_duration"] == 8
+
+def test_independent_tasks_share_the_first_level():
+    graph = compile_plan(tasks(("a", None), ("b", 3)), {})
+    assert graph["levels"] == [["a", "b"]]
+    assert graph["critical_path"] == ["b"]
+
+def test_empty_plan():
+    assert compile_plan([], {}) == {"order": [], "levels": [], "critical_path": [], "critical_path_duration": 0}
+
+def test_repeated_dependencies_count_once():
+    graph = compile_plan(tasks(("a", 1), ("b", 1)), {"b": ["a", "a"]})
+    assert graph["order"] == ["a", "b"]
+
+def test_cycle_is_reported_as_a_path():
+    with pytest.raises(PlanGraphError, match="Dependency cycle: (a -> c -> b -> a|b -> a -> c -> b|c -> b -> a -> c)"):
+        compile_plan(tasks(("a", 1), ("b", 1), ("c", 1), ("d", 1)), {"a": ["c"], "c": ["b"], "b": ["a"], "d": ["a"]})
+
+def test_self_dependency_is_a_cycle():
+    with pytest.raises(PlanGraphError, match="Dependency cycle: a -> a"):
+        compile_plan(tasks(("a", 1)), {"a": ["a"]})
+
+@pytest.mark.parametrize("dependencies, message", [
+    ({"x": []}, "unknown task: x"),
+    ({"a": ["x"]}, "depends on unknown task: x"),
+    ({"a": "b"}, "must be a list"),
+    (["a"], "must map task ids"),
+])
+def test_invalid_dependencies(dependencies, message):
+    with pytest.raises(PlanGraphError, match=message):
+        compile_plan(tasks(("a", 1), ("b", 1)), dependencies)
+
+@pytest.mark.parametrize("task_list, message", [
+    ([{"estimated_duration": 1}], "Task 0 has no id"),
+    ([{"id": "a"}, {"id": "a"}], "Duplicate task id: a"),
+    (["a"], "Task 0 has no id"),
+])
+def test_invalid_task_ids(task_list, message):
+    with pytest.raises(PlanGraphError, match=message):
+        compile_plan(task_list, {})
+
+@pytest.mark.parametrize("duration", ["soon", [1], True, -1, float("nan"), float("inf")])
+def test_invalid_duration(duration):
+    with pytest.raises(PlanGraphError, match="estimated_duration"):
+        compile_plan(tasks(("a", duration)), {})
+
+@pytest.mark.parametrize("status", [{"x": 1}, ["pending"], 1, "done"])
+def test_invalid_status(status):
+    with pytest.raises(PlanGraphError, match="invalid status"):
+        compile_plan([{"id": "a", "status": status}], {})
+
+def test_numeric_string_duration_is_accepted():
+    assert compile_plan(tasks(("a", "2.5")), {})["critical_path_duration"] == 2.5
+
+def test_ready_tasks_wait_for_completed_dependencies():
+    plan_tasks = [
+        {"id": "a", "status": "completed"},
+        {"id": "b", "status": "running"},
+        {"id": "c"},
+        {"id": "d", "status": "pending"},
+        {"id": "e", "status": "pending"},
+    ]
+    dependencies = {"c": ["a"], "d": ["b"], "e": ["a", "c"]}
+    order = compile_plan(plan_tasks, dependencies)["order"]
+    assert [task["id"] for task in ready_tasks(plan_tasks, dependencies, order)] == ["c"]
+    plan_tasks[2]["status"] = "completed"
+    assert [task["id"] for task in ready_tasks(plan_tasks, dependencies, order)] == ["e"]
@@ -0,0 +1,66 @@
+import pytest
+
+from state_patch import PatchError, parse_json_patch, parse_patch, to_conditions, to_update
+
+def test_pointer_escapes_are_unescaped():
+    deltas, _ = parse_json_patch([
+        {"op": "replace", "path": "/a~1b", "value": 1},
+        {"op": "add", "path": "/c~0d", "value": 2},
+        {"op": "remove", "path": "/e~01"},
+    ])
+    assert deltas == [
+        {"op": "set", "path": "a/b", "value": 1},
+        {"op": "set", "path": "c~d", "value": 2},
+        {"op": "unset", "path": "e~1"},
+    ]
+
+def test_append_with_dash_becomes_one_push():
+    deltas, _ = parse_json_patch([
+        {"op": "add", "path": "/log/-", "value": {"n": 1}},
+        {"op": "add", "path": "/log/-", "value": {"n": 2}},
+    ])
+    assert deltas == [
+        {"op": "push", "path": "log", "value": {"n": 1}},
+        {"op": "push", "path": "log", "value": {"n": 2}},
+    ]
+    assert to_update(deltas) == {"$push": {"state_data.log": {"$each": [{"n": 1}, {"n": 2}]}}}
+
+def test_test_ops_become_eq_conditions():
+    deltas, tests = parse_json_patch([
+        {"op": "test", "path": "/step", "value": {"$gt": 1}},
+        {"op": "replace", "path": "/step", "value": 2},
+    ])
+    assert tests == [{"path": "step", "value": {"$gt": 1}}]
+    # An operator-looking test value is compared literally.
+    assert to_conditions(tests) == {"state_data.step": {"$eq": {"$gt": 1}}}
+    assert to_update(deltas) == {"$set": {"state_data.step": 2}}
+
+def test_to_update_groups_operators():
+    deltas, _ = parse_patch({"set": {"a.b": 1}, "unset": ["c"], "inc": {"n": 2}})
+    assert to_update(deltas) == {
+        "$set": {"state_data.a.b": 1},
+        "$unset": {"state_data.c": ""},
+        "$inc": {"state_data.n": 2},
+    }
+
+@pytest.mark.parametrize("operations", [
+    [{"op": "add", "path": "/items/0", "value": 1}],
+    [{"op": "remove", "path": "/items/2"}],
+    [{"op": "move", "from": "/a", "path": "/b"}],
+    [{"op": "replace", "path": "/a"}],
+    [{"op": "replace", "path": "a", "value": 1}],
+    [{"op": "replace", "path": "/$where", "value": 1}],
+    [{"op": "replace", "path": "/a.b", "value": 1}],
+    [{"path": "/a"}],
+])
+def test_rejected_json_patches(operations):
+    with pytest.raises(PatchError):
+        parse_json_patch(operations)
+
+def test_rejected_dotted_operations():
+    with pytest.raises(PatchError):
+        parse_patch({"rename": {"a": "b"}})
+    with pytest.raises(PatchError):
+        parse_patch({"inc": {"n": True}})
+    with pytest.raises(PatchError):
+        parse_patch([])
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteConcernError
+
+from write_buffer import InsertBuffer, parse_write_concern
+
+class FakeCollection:
+    """Records insert batches; documents whose `_id` is in `duplicates` fail like a unique index."""
+
+    name = "fake"
+
+    def __init__(self, duplicates=(), write_concern_error=None, failure=None):
+        self.duplicates = set(duplicates)
+        self.write_concern_error = write_concern_error
+        self.failure = failure
+        self.batches = []
+
+    async def insert_many(self, docs, ordered=True):
+        assert ordered is False
+        if self.failure is not None:
+            raise self.failure
+        self.batches.append(list(docs))
+        errors = [
+            {"index": index, "code": 11000, "errmsg": "E11000 duplicate key error", "op": doc}
+            for index, doc in enumerate(docs) if doc["_id"] in self.duplicates
+        ]
+        concern_errors = [self.write_concern_error] if self.write_concern_error else []
+        if errors or concern_errors:
+            raise BulkWriteError({
+                "writeErrors": errors, "writeConcernErrors": concern_errors,
+                "nInserted": len(docs) - len(errors),
+            })
+
+def insert_all(buffer, docs):
+    async def run():
+        return await asyncio.gather(*(buffer.insert(doc) for doc in docs), return_exceptions=True)
+    return asyncio.run(run())
+
+def test_concurrent_inserts_share_one_batch():
+    collection = FakeCollection()
+    buffer = InsertBuffer(collection, max_docs=100, max_delay=0.01)
+    docs = [{"_id": ObjectId()} for _ in range(10)]
+    assert insert_all(buffer, docs) == [doc["_id"] for doc in docs]
+    assert len(collection.batches) == 1
+    assert buffer.stats()["inserts"] == 10
+
+def test_batches_are_cut_at_max_docs():
+    collection = FakeCollection()
+    buffer = InsertBuffer(collection, max_docs=4, max_delay=10)
+    insert_all(buffer, [{"_id": ObjectId()} for _ in range(8)])
+    assert [len(batch) for batch in collection.batches] == [4, 4]
+
+def test_bad_document_fails_only_its_own_caller():
+    docs = [{"_id": ObjectId()} for _ in range(5)]
+    collection = FakeCollection(duplicates=[docs[2]["_id"]])
+    results = insert_all(InsertBuffer(collection, max_docs=100, max_delay=0.01), docs)
+    assert len(collection.batches) == 1
+    assert isinstance(results[2], DuplicateKeyError)
+    assert results[:2] + results[3:] == [doc["_id"] for doc in docs[:2] + docs[3:]]
+
+def test_write_concern_error_fails_the_whole_batch():
+    collection = FakeCollection(write_concern_error={"code": 64, "errmsg": "waiting for replication timed out"})
+    results = insert_all(InsertBuffer(collection, max_docs=100, max_delay=0.01), [{"_id": ObjectId()} for _ in range(3)])
+    assert all(isinstance(result, WriteConcernError) for result in results)
+
+def test_batch_failure_reaches_every_caller():
+    collection = FakeCollection(failure=ConnectionError("down"))
+    results = insert_all(InsertBuffer(collection, max_docs=100, max_delay=0.01), [{"_id": ObjectId()} for _ in range(3)])
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+def test_parse_write_concern():
+    assert parse_write_concern("") is None
+    assert parse_write_concern("majority").document == {"w": "majority"}
+    assert parse_write_concern("1,j").document == {"w": 1, "j": True}
+    with pytest.raises(ValueError):
+        parse_write_concern("majority,fsync")
@@ -0,0 +1,378 @@
+"""
+Memory-mapped vector index for semantic search.
+
+An index is a directory holding `vectors.f32`, a float32 matrix of
+L2-normalized rows memory-mapped from disk, and `ids.txt`, the document id
+of each row. Exact search scores the rows in fixed-size chunks and keeps a
+running top-k, so memory stays bounded however large the matrix grows.
+
+`train_ivf` partitions the rows with spherical k-means (`centroids.npy`,
+plus the list of each row in `lists.i32`); an IVF search only scores the
+rows of the `n_probe` lists whose centroids are closest to the query. Rows
+added after training are assigned to their nearest list.
+
+An index directory must be written by a single process. Other processes
+open it with `read_only=True` and call `refresh` to pick up the rows and
+IVF lists written since, including rows whose vector was replaced and
+moved to another list (logged to `replaced.i64`). `IndexUpdater` follows a
+collection for documents inserted by any process and embeds them off the
+event loop. Rows are never removed: callers drop hits whose documents no
+longer exist.
+"""
+
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from datetime import timedelta
+from pathlib import Path
+from bson import ObjectId
+import asyncio
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from embeddings import Embedder, normalize
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CHUNK_ROWS = 65536
+MIN_CAPACITY = 1024
+
+def message_text(doc: Dict[str, Any]) -> str:
+    return "\n".join(part for part in (doc.get("text"), doc.get("content_text")) if part)
+
+def agent_text(doc: Dict[str, Any]) -> str:
+    return "\n".join(part for part in (doc.get("system_message"), *doc.get("capabilities", ())) if part)
+
+# Collection name -> (text to embed, fields it is built from)
+SEMANTIC_SOURCES: Dict[str, Tuple[Callable[[Dict[str, Any]], str], List[str]]] = {
+    "messages": (message_text, ["text", "content_text"]),
+    "agents": (agent_text, ["system_message", "capabilities"]),
+}
+
+def top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The `k` best columns of each row of `scores` (and their `rows` labels), best first."""
+    if scores.shape[1] > k:
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, best, axis=1)
+        rows = np.take_along_axis(rows, best, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(rows, order, axis=1)
+
+class VectorIndex:
+    def __init__(self, directory: Path, dim: int, read_only: bool = False):
+        self.path = Path(directory)
+        self.read_only = read_only
+        if not read_only:
+            self.path.mkdir(parents=True, exist_ok=True)
+        meta_path = self.path / "meta.json"
+        if meta_path.exists():
+            stored = json.loads(meta_path.read_text())["dim"]
+            if stored != dim:
+                raise ValueError(f"{self.path} holds {stored}-dimensional vectors, the embedder produces {dim}; use a new directory")
+        elif not read_only:
+            meta_path.write_text(json.dumps({"dim": dim}))
+        self.dim = dim
+        self._lock = threading.Lock()
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._ids_size = 0
+        self._read_ids()
+        ids_path = self.path / "ids.txt"
+        if not read_only and ids_path.exists() and ids_path.stat().st_size > self._ids_size:
+            # Drop an id left half-written by a crash; its row is rewritten when the document is added again.
+            os.truncate(ids_path, self._ids_size)
+        self.vectors = self._map("vectors.f32", np.float32, len(self.ids), (dim,))
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: Optional[np.memmap] = None
+        self._centroids_mtime: Optional[int] = None
+        self._replaced_size = 0
+        self._load_lists()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return str(doc_id) in self._rows
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _read_ids(self) -> None:
+        """Append the complete lines of `ids.txt` past those already read."""
+        ids_path = self.path / "ids.txt"
+        if not ids_path.exists():
+            return
+        with open(ids_path, "rb") as f:
+            f.seek(self._ids_size)
+            data = f.read()
+        # A line without its newline is still being written.
+        complete = data[:data.rfind(b"\n") + 1]
+        self._ids_size += len(complete)
+        new_ids = complete.decode("utf-8").split()
+        self._rows.update({doc_id: len(self.ids) + offset for offset, doc_id in enumerate(new_ids)})
+        self.ids.extend(new_ids)
+
+    def _load_lists(self) -> None:
+        centroids_path = self.path / "centroids.npy"
+        if not centroids_path.exists():
+            return
+        self._centroids_mtime = centroids_path.stat().st_mtime_ns
+        self.centroids = np.load(centroids_path)
+        self.lists = self._map("lists.i32", np.int32, len(self.ids), ())
+        self._index_lists()
+        # The lists just read already place every replaced row.
+        self._replaced_size = self._file_size("replaced.i64")
+
+    def _file_size(self, name: str) -> int:
+        path = self.path / name
+        return path.stat().st_size if path.exists() else 0
+
+    def _read_replaced(self) -> List[int]:
+        """Rows replaced by the writer since the last call, from complete entries of `replaced.i64`."""
+        size = self._file_size("replaced.i64") // 8 * 8
+        if size <= self._replaced_size:
+            return []
+        with open(self.path / "replaced.i64", "rb") as f:
+            f.seek(self._replaced_size)
+            rows = np.frombuffer(f.read(size - self._replaced_size), dtype=np.int64)
+        self._replaced_size = size
+        return rows.tolist()
+
+    def refresh(self) -> None:
+        """Pick up the rows and IVF lists written by the index's writer since the last call."""
+        centroids_path = self.path / "centroids.npy"
+        ids_size = self._file_size("ids.txt")
+        centroids_mtime = centroids_path.stat().st_mtime_ns if centroids_path.exists() else None
+        replaced_size = self._file_size("replaced.i64") // 8 * 8
+        if ids_size == self._ids_size and centroids_mtime == self._centroids_mtime and replaced_size == self._replaced_size:
+            return
+        with self._lock:
+            start = len(self.ids)
+            self._read_ids()
+            self.vectors = self._map("vectors.f32", np.float32, len(self.ids), (self.dim,))
+            if centroids_mtime != self._centroids_mtime:
+                self._load_lists()
+            elif self.lists is not None:
+                self.lists = self._map("lists.i32", np.int32, len(self.ids), ())
+                # New rows, and replaced rows whose list may have changed, join their current list.
+                rows = list(range(start, len(self.ids))) + [row for row in self._read_replaced() if row < start]
+                for row in rows:
+                    self._added.setdefault(int(self.lists[row]), []).append(row)
+            else:
+                self._read_replaced()
+
+    def _map(self, name: str, dtype, rows: int, row_shape: tuple) -> np.memmap:
+        """Map `name`, growing the file to hold at least `rows` rows (read-only: as it is)."""
+        path = self.path / name
+        row_bytes = int(np.dtype(dtype).itemsize * np.prod(row_shape, dtype=np.int64))
+        if self.read_only:
+            capacity = path.stat().st_size // row_bytes if path.exists() else 0
+            if capacity == 0:
+                return np.empty((0, *row_shape), dtype=dtype)
+            return np.memmap(path, dtype=dtype, mode="r", shape=(capacity, *row_shape))
+        path.touch()
+        capacity = path.stat().st_size // row_bytes
+        if capacity < max(rows, MIN_CAPACITY):
+            capacity = max(rows, MIN_CAPACITY, 2 * capacity)
+            with open(path, "r+b") as f:
+                f.truncate(capacity * row_bytes)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=(capacity, *row_shape))
+
+    def _reserve(self, rows: int) -> None:
+        if rows > len(self.vectors):
+            self.vectors.flush()
+            self.vectors = self._map("vectors.f32", np.float32, rows, (self.dim,))
+        if self.lists is not None and rows > len(self.lists):
+            self.lists.flush()
+            self.lists = self._map("lists.i32", np.int32, rows, ())
+
+    def _index_lists(self) -> None:
+        assignments = np.asarray(self.lists[:len(self.ids)])
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(1, len(self.centroids)))
+        self._members: List[np.ndarray] = np.split(order, bounds)
+        self._added: Dict[int, List[int]] = {}
+
+    def _nearest_lists(self, vectors: np.ndarray, n: int) -> np.ndarray:
+        similarity = vectors @ self.centroids.T
+        if n >= similarity.shape[1]:
+            return np.argsort(-similarity, axis=1)
+        return np.argpartition(-similarity, n - 1, axis=1)[:, :n]
+
+    def add(self, ids: List[Hashable], vectors: np.ndarray) -> None:
+        """Insert or replace the vectors of `ids`."""
+        if self.read_only:
+            raise RuntimeError(f"{self.path} is opened read-only")
+        with self._lock:
+            rows, new_rows = [], {}
+            for doc_id in map(str, ids):
+                row = self._rows.get(doc_id, new_rows.get(doc_id))
+                if row is None:
+                    row = new_rows[doc_id] = len(self.ids) + len(new_rows)
+                rows.append(row)
+            self._reserve(len(self.ids) + len(new_rows))
+            self.vectors[rows] = vectors
+            self.vectors.flush()
+            if self.lists is not None:
+                assigned = self._nearest_lists(vectors, 1)[:, 0]
+                self.lists[rows] = assigned
+                self.lists.flush()
+                for row, list_id in zip(rows, assigned.tolist()):
+                    self._added.setdefault(list_id, []).append(row)
+                replaced = [row for row in rows if row < len(self.ids)]
+                if replaced:
+                    # Readers move these rows to their new lists on refresh.
+                    with open(self.path / "replaced.i64", "ab") as f:
+                        f.write(np.asarray(replaced, dtype=np.int64).tobytes())
+            # Ids are appended last: rows without an id are ignored after a crash.
+            with open(self.path / "ids.txt", "ab") as f:
+                line_bytes = "".join(f"{doc_id}\n" for doc_id in new_rows).encode("utf-8")
+                f.write(line_bytes)
+            self._ids_size += len(line_bytes)
+            self.ids.extend(new_rows)
+            self._rows.update(new_rows)
+
+    def search(self, queries: np.ndarray, k: int, n_probe: Optional[int] = None) -> List[List[Tuple[str, float]]]:
+        """Top-k (id, cosine similarity) per query; IVF when `n_probe` is given and the index is trained."""
+        with self._lock:
+            if n_probe and self.trained:
+                results = [self._search_ivf(query, k, n_probe) for query in queries]
+            else:
+                results = list(zip(*self._search_exact(queries, k)))
+            return [
+                [(self.ids[row], float(score)) for score, row in zip(scores.tolist(), rows.tolist())]
+                for scores, rows in results
+            ]
+
+    def _search_exact(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(self.ids), SEARCH_CHUNK_ROWS):
+            end = min(len(self.ids), start + SEARCH_CHUNK_ROWS)
+            scores = queries @ self.vectors[start:end].T
+            rows = np.broadcast_to(np.arange(start, end), scores.shape)
+            scores, rows = top_k(scores, rows, k)
+            best_scores, best_rows = top_k(np.hstack([best_scores, scores]), np.hstack([best_rows, rows]), k)
+        return best_scores, best_rows
+
+    def _search_ivf(self, query: np.ndarray, k: int, n_probe: int) -> Tuple[np.ndarray, np.ndarray]:
+        probes = self._nearest_lists(query[None], n_probe)[0]
+        candidates = [self._members[list_id] for list_id in probes.tolist()]
+        candidates += [np.asarray(self._added.get(list_id, ()), dtype=np.int64) for list_id in probes.tolist()]
+        rows = np.unique(np.concatenate(candidates))
+        # A replaced vector may have moved to another list since it was indexed.
+        rows = rows[np.isin(self.lists[rows], probes)]
+        scores = (self.vectors[rows] @ query)[None]
+        scores, rows = top_k(scores, rows[None], k)
+        return scores[0], rows[0]
+
+    def train_ivf(self, n_lists: int, iterations: int = 10, sample_size: int = 100_000, seed: int = 0) -> None:
+        """Partition the rows into `n_lists` lists with spherical k-means over a sample."""
+        if self.read_only:
+            raise RuntimeError(f"{self.path} is opened read-only")
+        with self._lock:
+            count = len(self.ids)
+            if count == 0:
+                raise ValueError("Cannot partition an empty index")
+            n_lists = min(n_lists, count)
+            rng = np.random.default_rng(seed)
+            sample = np.asarray(self.vectors[np.sort(rng.choice(count, min(count, sample_size), replace=False))])
+            centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+            for _ in range(iterations):
+                assignments = np.argmax(sample @ centroids.T, axis=1)
+                order = np.argsort(assignments, kind="stable")
+                counts = np.bincount(assignments, minlength=n_lists)
+                starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+                filled = counts > 0
+                # Lists left empty keep their previous centroid.
+                centroids[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+                centroids = normalize(centroids)
+
+            self.centroids = centroids
+            self.lists = self._map("lists.i32", np.int32, len(self.vectors), ())
+            for start in range(0, count, SEARCH_CHUNK_ROWS):
+                end = min(count, start + SEARCH_CHUNK_ROWS)
+                self.lists[start:end] = np.argmax(self.vectors[start:end] @ centroids.T, axis=1)
+            self.lists.flush()
+            # Readers reload the lists when centroids.npy changes, so it is replaced whole.
+            partial = self.path / "centroids.partial.npy"
+            np.save(partial, centroids)
+            os.replace(partial, self.path / "centroids.npy")
+            self._centroids_mtime = (self.path / "centroids.npy").stat().st_mtime_ns
+            self._index_lists()
+
+class IndexUpdater:
+    """Coalesces documents to embed and adds them to `index` in batches."""
+
+    def __init__(self, index: VectorIndex, embedder: Embedder, batch_size: int = 256):
+        self.index = index
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.indexed = 0
+        self._pending: Dict[str, str] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def enqueue(self, doc_id: Hashable, text: str) -> None:
+        if not text:
+            return
+        self._pending[str(doc_id)] = text
+        if len(self._pending) >= self.batch_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def _add(self, ids: List[str], texts: List[str]) -> None:
+        self.index.add(ids, self.embedder.embed(texts))
+
+    async def flush(self) -> int:
+        pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        added = 0
+        for start in range(0, len(items), self.batch_size):
+            ids, texts = zip(*items[start:start + self.batch_size])
+            try:
+                await asyncio.to_thread(self._add, list(ids), list(texts))
+            except Exception as e:
+                logger.warning("Embedding %d documents failed, retrying later: %s", len(items) - start, e)
+                for doc_id, text in items[start:]:
+                    self._pending.setdefault(doc_id, text)
+                break
+            added += len(ids)
+        self.indexed += added
+        return added
+
+    async def follow(self, collection, text_of: Callable[[Dict[str, Any]], str], fields: List[str], interval: float, lag: float = 60) -> None:
+        """
+        Embed the documents inserted into `collection` by any process, polling
+        every `interval` seconds for `_id`s past the newest one seen. `_id`s
+        are only roughly ordered across processes, so each poll re-reads the
+        last `lag` seconds and skips documents already in the index. The
+        position is kept in `followed.txt` next to the index.
+        """
+        position_path = self.index.path / "followed.txt"
+        last: Optional[ObjectId] = ObjectId(position_path.read_text().strip()) if position_path.exists() else None
+        projection = {field: 1 for field in fields}
+        while True:
+            try:
+                query = {}
+                if last is not None:
+                    query = {"_id": {"$gt": ObjectId.from_datetime(last.generation_time - timedelta(seconds=lag))}}
+                async for doc in collection.find(query, projection).sort("_id", 1).batch_size(self.batch_size):
+                    last = doc["_id"] if last is None else max(last, doc["_id"])
+                    text = text_of(doc)
+                    if text and doc["_id"] not in self.index:
+                        self._pending[str(doc["_id"])] = text
+                        if len(self._pending) >= self.batch_size:
+                            await self.flush()
+                await self.flush()
+                if last is not None:
+                    position_path.write_text(str(last))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Following %s for the semantic index failed: %s", collection.name, e)
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rows": len(self.index), "pending": len(self._pending), "indexed": self.indexed, "ivf": self.index.trained}
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Asyncio worker pool executing PENDING runs.
+
+Each pool claims runs through the leases in leases.py, so any number of
+pools (processes or hosts) can share the `runs` collection without
+executing a run twice. A pool only claims a run when one of its
+`concurrency` slots is free, backs off while the queue is empty, renews
+the lease of every run it executes and cancels a run whose lease was lost.
+On shutdown it stops claiming, lets running handlers finish for up to
+`drain_seconds` and hands the rest back to the queue.
+
+A handler is an async callable taking the run document and returning its
+`output_data` (or None); raising marks the run FAILED.
+
+Usage:
+    MONGODB_URI=mongodb://localhost:27017 python worker.py mypackage.tasks:execute_run --concurrency 8
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from bson import ObjectId
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import signal
+import socket
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from model import RunStatus
+from database import Database
+from leases import claim_run, finish_run, reclaim_expired, release_run, renew_lease
+
+logger = logging.getLogger(__name__)
+
+RunHandler = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+class RunWorkerPool:
+    def __init__(
+        self,
+        collection,
+        handler: RunHandler,
+        worker_id: Optional[str] = None,
+        concurrency: int = 4,
+        lease_seconds: float = 60,
+        max_attempts: int = 3,
+        poll_interval: float = 0.5,
+        max_poll_interval: float = 10,
+        drain_seconds: float = 30,
+    ):
+        self.collection = collection
+        self.handler = handler
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{ObjectId()}"
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.drain_seconds = drain_seconds
+        self.completed = 0
+        self.failed = 0
+        self.lost = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._stopping = asyncio.Event()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def active(self) -> int:
+        return len(self._tasks)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def _sleep(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self) -> None:
+        """Claim and execute runs until `stop()` is called, then drain."""
+        idle = self.poll_interval
+        sweeper = asyncio.create_task(self._sweep())
+        try:
+            while not self._stopping.is_set():
+                await self._slots.acquire()
+                if self._stopping.is_set():
+                    self._slots.release()
+                    break
+                try:
+                    run = await claim_run(self.collection, self.worker_id, self.lease_seconds, self.max_attempts)
+                except Exception as e:
+                    self._slots.release()
+                    logger.warning("Claiming a run failed: %s", e)
+                    await self._sleep(idle)
+                    idle = min(idle * 2, self.max_poll_interval)
+                    continue
+                if run is None:
+                    self._slots.release()
+                    await self._sleep(idle)
+                    idle = min(idle * 2, self.max_poll_interval)
+                    continue
+                idle = self.poll_interval
+                task = asyncio.create_task(self._execute(run))
+                self._tasks.add(task)
+                task.add_done_callback(self._done)
+        finally:
+            sweeper.cancel()
+            await self._drain()
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._slots.release()
+
+    async def _drain(self) -> None:
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_seconds)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _sweep(self) -> None:
+        """Periodically fail runs whose leases expired too often."""
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            try:
+                await reclaim_expired(self.collection, self.max_attempts)
+            except Exception as e:
+                logger.warning("Reclaiming expired leases failed: %s", e)
+
+    async def _heartbeat(self, run_id: ObjectId, execution: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await renew_lease(self.collection, run_id, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                # Transient errors are retried until the lease actually runs out.
+                logger.warning("Renewing the lease of run %s failed: %s", run_id, e)
+                continue
+            if renewed is None:
+                logger.warning("Lost the lease of run %s, cancelling it", run_id)
+                self.lost += 1
+                execution.cancel()
+                return
+
+    async def _execute(self, run: Dict[str, Any]) -> None:
+        run_id = run["_id"]
+        execution = asyncio.create_task(self.handler(run))
+        heartbeat = asyncio.create_task(self._heartbeat(run_id, execution))
+        try:
+            output = await asyncio.shield(execution)
+        except asyncio.CancelledError:
+            if not execution.done():
+                # The pool is shutting down: stop the handler and requeue the run.
+                execution.cancel()
+                await asyncio.gather(execution, return_exceptions=True)
+                await release_run(self.collection, run_id, self.worker_id)
+                raise
+            if heartbeat.done():
+                # Cancelled by _heartbeat: the lease was lost and the run may be executing elsewhere.
+                return
+            await self._finish(run_id, RunStatus.FAILED, error_message="Cancelled")
+            return
+        except Exception as e:
+            logger.exception("Run %s failed", run_id)
+            await self._finish(run_id, RunStatus.FAILED, error_message=str(e))
+            return
+        finally:
+            heartbeat.cancel()
+        await self._finish(run_id, RunStatus.COMPLETED, output_data=output or {})
+
+    async def _finish(self, run_id: ObjectId, status: RunStatus, **fields: Any) -> None:
+        if not await finish_run(self.collection, run_id, self.worker_id, status, **fields):
+            self.lost += 1
+        elif status == RunStatus.COMPLETED:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+def load_handler(path: str) -> RunHandler:
+    module_name, _, attribute = path.partition(":")
+    if not attribute:
+        raise ValueError("Handler must be given as module:function")
+    return getattr(importlib.import_module(module_name), attribute)
+
+async def main(args) -> None:
+    database = Database(os.getenv("MONGODB_URI", "mongodb://localhost:27017"), os.getenv("MONGODB_DATABASE", "alpha"))
+    database.connect()
+    pool = RunWorkerPool(
+        database["runs"],
+        load_handler(args.handler),
+        worker_id=args.worker_id,
+        concurrency=args.concurrency,
+        lease_seconds=args.lease_seconds,
+        max_attempts=args.max_attempts,
+        drain_seconds=args.drain_seconds,
+    )
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, pool.stop)
+    logger.info("Worker %s started with %d slots", pool.worker_id, pool.concurrency)
+    try:
+        await pool.run()
+    finally:
+        database.close()
+    logger.info("Worker %s stopped: %d completed, %d failed, %d lost", pool.worker_id, pool.completed, pool.failed, pool.lost)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("handler", help="Async run handler as module:function")
+    parser.add_argument("--worker-id", help="Lease owner name (default: host:pid:random)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("RUN_WORKER_CONCURRENCY", "4")))
+    parser.add_argument("--lease-seconds", type=float, default=float(os.getenv("RUN_LEASE_SECONDS", "60")))
+    parser.add_argument("--max-attempts", type=int, default=int(os.getenv("RUN_MAX_ATTEMPTS", "3")))
+    parser.add_argument("--drain-seconds", type=float, default=30)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,120 @@
+"""
+Group commit for single-document inserts.
+
+`InsertBuffer.insert` queues a document and waits for its batch: the
+buffer is written as one unordered `insert_many` once it holds `max_docs`
+documents or `max_delay` seconds after its first document arrived. Each
+caller is answered only after the batch was acknowledged with the buffer's
+write concern, and gets the write error of its own document (a
+DuplicateKeyError, say) rather than the batch's. With `max_delay` 0 every
+insert is written on its own.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteConcernError, WriteError
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+def parse_write_concern(value: str) -> Optional[WriteConcern]:
+    """`majority`, `1` or `0`, optionally followed by `,j` for journaled writes; empty for the server default."""
+    if not value:
+        return None
+    w, *options = [part.strip() for part in value.split(",")]
+    unknown = set(options) - {"j"}
+    if unknown:
+        raise ValueError(f"Unknown write concern option: {', '.join(sorted(unknown))}")
+    return WriteConcern(w=int(w) if w.isdigit() else w, j=True if "j" in options else None)
+
+def write_error(error: Dict[str, Any]) -> WriteError:
+    cls = DuplicateKeyError if error.get("code") == DUPLICATE_KEY else WriteError
+    return cls(error.get("errmsg", "Write failed"), error.get("code"), error)
+
+class InsertBuffer:
+    def __init__(self, collection, max_docs: int = 500, max_delay: float = 0, write_concern: Optional[WriteConcern] = None):
+        self.collection = collection
+        self.max_docs = max_docs
+        self.max_delay = max_delay
+        self.write_concern = write_concern
+        self.inserts = 0
+        self.batches = 0
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set = set()
+
+    def target(self):
+        """The collection with this buffer's write concern."""
+        if self.write_concern is None:
+            return self.collection
+        return self.collection.with_options(write_concern=self.write_concern)
+
+    async def insert(self, doc: Dict[str, Any]) -> Any:
+        """Insert `doc` and return its `_id` once its batch is acknowledged."""
+        if self.max_delay <= 0:
+            result = await self.target().insert_one(doc)
+            self.inserts += 1
+            self.batches += 1
+            return result.inserted_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((doc, future))
+        if len(self._pending) >= self.max_docs:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._start_flush)
+        return await future
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._write(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        errors: Dict[int, Exception] = {}
+        try:
+            await self.target().insert_many([doc for doc, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                errors[error["index"]] = write_error(error)
+            concern_errors = e.details.get("writeConcernErrors", [])
+            if concern_errors:
+                # The documents were written but not acknowledged as asked.
+                error = concern_errors[0]
+                failure = WriteConcernError(error.get("errmsg", "Write concern failed"), error.get("code"), error)
+                errors.update({index: failure for index in range(len(batch)) if index not in errors})
+        except Exception as e:
+            logger.warning("Inserting a batch of %d documents into %s failed: %s", len(batch), self.collection.name, e)
+            errors = {index: e for index in range(len(batch))}
+        self.batches += 1
+        self.inserts += len(batch) - len(errors)
+        for index, (doc, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(doc["_id"])
+
+    async def flush(self) -> None:
+        """Write the pending documents and wait for every batch in flight."""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "in_flight": len(self._flushes),
+            "inserts": self.inserts,
+            "batches": self.batches,
+            "docs_per_batch": round(self.inserts / self.batches, 2) if self.batches else 0,
+        }